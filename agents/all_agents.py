@@ -1,30 +1,50 @@
 # all_agent.py
 import asyncio, os
 from oxygent import MAS, oxy,Config,preset_tools
-import re
 from oxygent.schemas.oxy import OxyRequest, OxyResponse, OxyState
 import dotenv
 from pydantic import BaseModel, Field
 from typing import List, Union
 from oxygent.utils.llm_pydantic_parser import PydanticOutputParser # 导入解析器
+from oxygent.utils.common_utils import generate_uuid
+import logging
 import json
 import sys
 from typing import Any, List, Optional, Type, Union
+from agents.step_history import StepHistory
+from util.json_extract import extract_json_object
 
+logger = logging.getLogger(__name__)
 
 def extract_json_block(text: str) -> Optional[str]:
     """
     从可能包含额外字符的文本中提取第一个（最外层）JSON对象。
     """
-    # 寻找第一个 '{' 和最后一个 '}'
-    match = re.search(r"\{.*\S.*\}", text, re.DOTALL)
-    if match:
-        return match.group(0)
-    return None
+    # 一遍扫描平衡的括号，对象后面的说明文字不会被截进来
+    return extract_json_object(text or "")
+
+def get_ready_steps(plan: "Plan") -> List[int]:
+    """
+    返回当前计划中可以立即执行的步骤下标（不依赖计划内其他步骤）。
+    未给出 dependencies 时保持原来的顺序执行方式，只执行第一步。
+    """
+    if not plan.steps:
+        return []
+    if not plan.dependencies:
+        return [0]
+    ready = []
+    for i in range(len(plan.steps)):
+        # 没有声明依赖的后续步骤默认依赖上一步
+        deps = plan.dependencies[i] if i < len(plan.dependencies) else [i - 1]
+        deps = [d for d in deps if isinstance(d, int) and 0 <= d < i]
+        if not deps:
+            ready.append(i)
+    return ready
 
 async def plan_and_solve_workflow(oxy_request: OxyRequest) -> OxyResponse:
     """
     手动实现的规划-执行-反思工作流。
+    计划中互不依赖的步骤会并发交给 executor，每批步骤完成后只重规划一次。
     """
     original_query = oxy_request.get_query()
     max_replan_rounds = 5 # 限制循环次数
@@ -41,8 +61,7 @@ async def plan_and_solve_workflow(oxy_request: OxyRequest) -> OxyResponse:
         json_string = extract_json_block(planner_response.output)
         if not json_string:
             raise Exception("LLM 返回的响应中未找到 JSON。")
-        plan_data = plan_parser.parse(json_string)
-        plan_steps = plan_data.steps
+        plan = plan_parser.parse(json_string)
     except Exception as e:
         # 如果规划失败，直接返回错误
         return OxyResponse(
@@ -50,30 +69,40 @@ async def plan_and_solve_workflow(oxy_request: OxyRequest) -> OxyResponse:
             output=f"规划 Agent 返回格式错误或规划失败: {e}\n原始输出: {planner_response.output}"
         )
         
-    past_steps = ""
+    past_steps = StepHistory()
     
     # 步骤 2: 循环执行与重规划
     for current_round in range(max_replan_rounds):
-        if not plan_steps:
+        ready = get_ready_steps(plan)
+        if not ready:
             break 
             
-        task = plan_steps[0]
+        batch = [plan.steps[i] for i in ready]
+        remaining_steps = [step for i, step in enumerate(plan.steps) if i not in ready]
         
-        # 2.1 执行当前步骤 (调用 executor)
-        task_formatted = f"We have finished the following steps: {past_steps}\nThe current step to execute is: {task}"
-        executor_response = await oxy_request.call(
-            callee="executor", 
-            arguments={"query": task_formatted}
-        )
+        # 2.1 并发执行本批步骤 (调用 executor)
+        history_text = past_steps.render()
+        parallel_id = generate_uuid()
+        executor_responses = await asyncio.gather(*[
+            oxy_request.call(
+                callee="executor", 
+                arguments={"query": f"We have finished the following steps: {history_text}\nThe current step to execute is: {task}"},
+                parallel_id=parallel_id,
+            )
+            for task in batch
+        ])
         
         # 2.2 更新历史
-        past_steps += f"\nTask: {task}, Result: {executor_response.output}"
+        for task, executor_response in zip(batch, executor_responses):
+            past_steps.add(task, executor_response.output)
+        history_text = past_steps.record_round()
+        logger.info(f"task_solver round {current_round + 1}: history tokens {past_steps.round_tokens[-1]}")
         
         # 2.3 重规划/反思 (如果启用)
         replan_query = f"""
         The user's original objective was: {original_query}
-        The current step history is: {past_steps}
-        The remaining plan is: {plan_steps[1:]}
+        The current step history is: {history_text}
+        The remaining plan is: {remaining_steps}
 
         Please analyze the situation. If the task is completed, use the Response action. Otherwise, update the Plan.
         """
@@ -105,10 +134,10 @@ async def plan_and_solve_workflow(oxy_request: OxyRequest) -> OxyResponse:
                 )
         else:
             # 新计划
-            plan_steps = action_data.action.steps
+            plan = action_data.action
             
     # 步骤 3: 总结 (如果循环提前结束但没有返回答案)
-    summary_query = f"The task was: {original_query}. Final execution history:\n{past_steps}. Please provide the final, exact answer."
+    summary_query = f"The task was: {original_query}. Final execution history:\n{past_steps.render()}. Please provide the final, exact answer."
     summary_response = await oxy_request.call(
         callee=oxy_request.llm_model, 
         arguments={"query": summary_query}
@@ -121,6 +150,12 @@ class Plan(BaseModel):
     steps: List[str] = Field(
         description="different steps to follow, should be in sorted order"
     )
+    dependencies: List[List[int]] = Field(
+        default_factory=list,
+        description="Optional. dependencies[i] lists the 0-based indexes of earlier steps whose results step i needs. "
+        "Use [] for steps that can start right away, so independent steps (e.g. two separate searches) run in parallel. "
+        "Leave empty to run the steps one by one."
+    )
 
 class Response(BaseModel):
     """Response to user."""
@@ -211,14 +246,14 @@ PLANNER_PROMPT = """ You are an expert workflow planner. Your goal is to transla
     {format_instructions} """.format(format_instructions=PydanticOutputParser(output_cls=Plan).format_string)
 
 
-EXECUTOR_PROMPT = """ You are the Executor Agent. Your job is to execute one single task by calling the correct sub-agent.
+EXECUTOR_PROMPT = """ You are the Executor Agent. Your job is to execute one single task by calling the correct tool or sub-agent.
 
     ⚙️ Behavior Rules
     Read the task assigned to you.
 
-    Choose the one most appropriate agent from your available sub-agents.
+    If the task is a deterministic step that one of your function tools does exactly (arithmetic with calculate, power / pi, current time or timezone conversion, extracting emails / URLs, system info), call that function tool DIRECTLY with the arguments defined in its own schema. Do NOT route such steps through a sub-agent.
 
-    Pass the task instruction directly to that agent.
+    Otherwise (searching, web pages, HTTP requests, files, code execution, anything open-ended), choose the one most appropriate agent from your available sub-agents and pass the task instruction directly to that agent.
 
     Do NOT plan, modify the task, or execute multiple steps.
 
@@ -234,7 +269,20 @@ EXECUTOR_PROMPT = """ You are the Executor Agent. Your job is to execute one sin
             "query": "[Full instruction or query for the sub-agent]"
         }
     }
+    For a function tool, "tool_name" is the function name and "arguments" follow that tool's parameters instead of "query".
+
     ✅ Examples
+    User Task: "compute 384400/3562 and round up" Assistant:
+
+    JSON
+
+    {
+        "think": "I need to execute the task: compute 384400/3562 and round up. This is plain arithmetic, so I call calculate directly.",
+        "tool_name": "calculate",
+        "arguments": {
+            "expression": "ceil(384400 / 3562)"
+        }
+    }
     User Task: "find the fastest bird in the world" Assistant:
 
     JSON
@@ -311,15 +359,7 @@ math_agent = oxy.ReActAgent(
     name="math_agent",
     desc="用于执行精确的数学运算",
     desc_for_llm="Use this agent to perform precise or safe mathematical operations, like computing pi, doing element-wise list math, or evaluating math expressions.",
-    tools=["math_tools"],
-    llm_model=LLM_MODEL,
-)
-
-baidu_search_agent = oxy.ReActAgent(
-    name="baidu_search_agent",
-    desc="通过百度 API 执行网络搜索并返回相关内容",
-    desc_for_llm="Use this agent to search information on the web through Baidu API and retrieve online content or answers.",
-    tools=["baidu_search_tools"],
+    tools=["calc_tools", "math_tools"],
     llm_model=LLM_MODEL,
 )
 
@@ -449,6 +489,15 @@ executor_subagents_name = [
     "system_check_agent",
     "firecrawl_agent",
 ]
+# 确定性的单步操作由 executor 直接调用函数工具，省去叶子 agent 选工具、包装结果的两次 LLM 调用；
+# 叶子 agent 只用于搜索、网页、文件、代码等开放式任务
+executor_direct_tools = [
+    "calc_tools",
+    "math_tools",
+    "time_tools",
+    "string_tools",
+    "system_tools",
+]
 
 executor = oxy.ReActAgent(
     name="executor",
@@ -457,5 +506,5 @@ executor = oxy.ReActAgent(
     desc_for_llm="Executes a single step from the plan by selecting and calling the most appropriate tool agent.",
     sub_agents=executor_subagents_name,    # 声明可调用的子 agent
     prompt=EXECUTOR_PROMPT,
-    tools=[],
-)
\ No newline at end of file
+    tools=executor_direct_tools,    # 直接调用的函数工具
+)
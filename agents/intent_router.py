@@ -0,0 +1,162 @@
+"""
+本地意图路由
+在 master 之前按规则判断查询应交给哪个 agent（executor / task_solver / multimodal_agent），
+置信度足够时直接调用目标 agent，省去 master → analyser 的两次 LLM 路由和结果回传时的转述；
+置信度不足时仍走原来的 master → analyser 流程。每次决策都写入 jsonl 日志，便于统计路由准确率。
+
+用法:
+    router = IntentRouter(log_path=os.path.join("cache_dir", "router_decisions.jsonl"))
+    enable_intent_router(master, router)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+from oxygent.schemas import OxyRequest, OxyResponse
+
+logger = logging.getLogger(__name__)
+
+ROUTE_EXECUTOR = "executor"
+ROUTE_TASK_SOLVER = "task_solver"
+ROUTE_MULTIMODAL = "multimodal_agent"
+ROUTE_LLM = "analyser"  # 置信度不足，交回 LLM 路由
+
+MEDIA_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp",
+    ".mp3", ".wav", ".m4a", ".flac", ".aac",
+    ".mp4", ".mov", ".avi", ".mkv", ".webm",
+    ".pdf",
+}
+
+GREETING_PATTERN = re.compile(r"^\s*(hi|hello|hey|你好|您好|嗨|哈喽)[\s!！。,.，?？]*$", re.IGNORECASE)
+URL_PATTERN = re.compile(r"https?://\S+")
+
+# 多步任务的线索：先后顺序、比较、隐含的中间实体（“某年”“某位”）、多跳推理
+MULTI_STEP_CUES = [
+    "然后", "之后", "并且", "分别", "比较", "对比", "结合", "同时",
+    "某年", "某位", "某座", "某张", "某种", "某一", "该年", "那么",
+    "first", "then", "compare",
+]
+# 单步任务的线索：直接取数、计算、时间
+SINGLE_STEP_CUES = [
+    "计算", "几点", "时间", "商品编号", "多少钱", "仅输出数字", "仅输出数值",
+    "等于", "=？", "=?",
+]
+
+
+class RouteDecision(BaseModel):
+    route: str
+    confidence: float
+    reason: str
+
+
+def _extension(path: str) -> str:
+    path = str(path).lower().rstrip("/")
+    if "," in os.path.basename(path) and "." not in os.path.basename(path):
+        # 兼容 "辣妹子辣,mp3" 这类把 . 写成 , 的文件名
+        return "." + path.rsplit(",", 1)[-1]
+    return os.path.splitext(path)[1]
+
+
+class IntentRouter:
+    """基于关键词与附件的规则路由，可选挂接本地分类器"""
+
+    def __init__(
+        self,
+        min_confidence: float = 0.75,
+        classifier: Optional[Callable[[str], Tuple[str, float]]] = None,
+        log_path: Optional[str] = None,
+    ):
+        self.min_confidence = min_confidence
+        self.classifier = classifier
+        self.log_path = log_path
+        self._log_lock = threading.Lock()
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def decide(self, query: str, attachments: Optional[List[str]] = None) -> RouteDecision:
+        query = str(query or "")
+        attachments = [a for a in (attachments or []) if a]
+
+        if GREETING_PATTERN.match(query):
+            return RouteDecision(route=ROUTE_LLM, confidence=0.0, reason="greeting")
+
+        if attachments:
+            media = [a for a in attachments if _extension(a) in MEDIA_EXTENSIONS]
+            if media:
+                return RouteDecision(route=ROUTE_MULTIMODAL, confidence=0.95, reason=f"media attachment: {media[0]}")
+            # 文件夹、表格等非多媒体附件交给 executor 调用文件 / shell / python 工具
+            return RouteDecision(route=ROUTE_EXECUTOR, confidence=0.8, reason=f"file attachment: {attachments[0]}")
+
+        if self.classifier:
+            route, confidence = self.classifier(query)
+            return RouteDecision(route=route, confidence=confidence, reason="classifier")
+
+        text = query.lower()
+        multi = [cue for cue in MULTI_STEP_CUES if cue in text]
+        single = [cue for cue in SINGLE_STEP_CUES if cue in text]
+        sentences = len([s for s in re.split(r"[。；;？?！!]", query) if s.strip()])
+
+        # 短查询才按单步处理，长查询往往隐含多跳
+        multi_score = len(multi) + max(sentences - 2, 0)
+        if multi_score >= 2:
+            return RouteDecision(route=ROUTE_TASK_SOLVER, confidence=min(0.6 + 0.1 * multi_score, 0.95),
+                                 reason=f"multi-step cues: {multi}")
+        if not multi and (single or len(URL_PATTERN.findall(query)) == 1) and len(query) <= 60:
+            return RouteDecision(route=ROUTE_EXECUTOR, confidence=0.8, reason=f"single-step cues: {single or 'url'}")
+        return RouteDecision(route=ROUTE_LLM, confidence=0.0, reason=f"ambiguous: multi={multi} single={single}")
+
+    def log(self, oxy_request: OxyRequest, query: str, decision: RouteDecision, applied: bool):
+        logger.info(
+            f"intent router: {decision.route} ({decision.confidence:.2f}, {decision.reason}) applied={applied}",
+            extra={"trace_id": oxy_request.current_trace_id, "node_id": oxy_request.node_id},
+        )
+        if not self.log_path:
+            return
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "trace_id": oxy_request.current_trace_id,
+            "query": query[:200],
+            "route": decision.route,
+            "confidence": decision.confidence,
+            "reason": decision.reason,
+            "applied": applied,
+        }
+        with self._log_lock, open(self.log_path, "a", encoding="utf-8") as fout:
+            fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _query_text(query) -> str:
+    """query 可能是带附件的 parts 列表，只取其中的文本"""
+    if isinstance(query, list):
+        return "\n".join(
+            str(p.get("part", {}).get("data", "")) for p in query
+            if str(p.get("part", {}).get("content_type", "text")).startswith("text")
+        )
+    return str(query or "")
+
+
+def enable_intent_router(master, router: IntentRouter):
+    """通过 func_execute 钩子在 master 前挂上本地路由，低置信度时调用原有的执行函数"""
+    inner_execute = master.func_execute or master._execute
+    routes = [ROUTE_EXECUTOR, ROUTE_TASK_SOLVER, ROUTE_MULTIMODAL]
+    master.extra_permitted_tool_name_list.extend(r for r in routes if r not in master.extra_permitted_tool_name_list)
+
+    async def routed_execute(oxy_request: OxyRequest) -> OxyResponse:
+        query = oxy_request.get_query(master_level=True)
+        text = _query_text(query)
+        decision = router.decide(text, oxy_request.arguments.get("attachments"))
+        applied = decision.route in routes and decision.confidence >= router.min_confidence
+        router.log(oxy_request, text, decision, applied)
+        if not applied:
+            return await inner_execute(oxy_request)
+        # 原样传入用户查询（含附件 parts），与 analyser 转发时的约定一致
+        return await oxy_request.call(callee=decision.route, arguments={"query": query})
+
+    object.__setattr__(master, "func_execute", routed_execute)
+    return master
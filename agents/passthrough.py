@@ -0,0 +1,132 @@
+"""
+路由 agent 的结果直通
+MASTER_PROMPT 和 ANALYSER_PROMPT 都要求模型把子 agent 的 Observation “原样输出”，于是 task_solver 返回答案后，
+analyser 和 master 还要各调用一次 LLM（每次约 3.5 秒）只为复述同一个结果。这里对只做路由的 ReAct agent：
+    - 指定的子 agent 返回 COMPLETED 且结果通过快速校验（非空、不是工具调用或报错、符合查询要求的格式）时，
+      父 agent 的下一轮 LLM 调用直接返回该结果，不再请求模型，并按最终答案结束 ReAct 循环
+    - 子 agent 失败或结果未通过校验时照常交给 LLM，由它决定是否改派其他 agent
+
+用法（需在 MAS 初始化之前调用，且在其他 LLM / agent 钩子之后，使被跳过的调用不计入缓存和统计）:
+    passthrough = enable_passthrough(oxy_space, PASSTHROUGH_ROUTES)
+    passthrough.stats()
+"""
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from oxygent.oxy.agents.react_agent import ReActAgent
+from oxygent.oxy.llms.base_llm import BaseLLM
+from oxygent.schemas import LLMResponse, LLMState, OxyRequest, OxyResponse, OxyState
+
+from agents.intent_router import _query_text
+from agents.speculative import answer_text, is_valid_answer
+
+logger = logging.getLogger(__name__)
+
+# 父 agent -> 结果可以直通的子 agent
+PASSTHROUGH_ROUTES = {
+    "master": ["analyser"],
+    "analyser": ["executor", "task_solver", "multimodal_agent"],
+}
+
+# 当前正在执行的路由 agent：{"parent", "children", "query", "answer"}
+_slot: ContextVar[Optional[dict]] = ContextVar("passthrough_slot", default=None)
+
+
+def _verbatim(output) -> str:
+    """WorkflowAgent 的输出可能嵌套 OxyResponse，只解开嵌套，不改动内容"""
+    while isinstance(output, OxyResponse):
+        output = output.output
+    return "" if output is None else str(output)
+
+
+class Passthrough:
+    def __init__(self, routes: Dict[str, List[str]]):
+        self.routes = routes
+        self.passed: Dict[str, int] = {parent: 0 for parent in routes}
+        self.rejected: Dict[str, int] = {parent: 0 for parent in routes}
+
+    def wrap_parent(self, agent: ReActAgent):
+        inner_execute = agent.func_execute or agent._execute
+        inner_parse = agent.func_parse_llm_response
+        children = set(self.routes[agent.name])
+
+        async def routed_execute(oxy_request: OxyRequest) -> OxyResponse:
+            token = _slot.set({
+                "parent": agent.name,
+                "children": children,
+                "query": _query_text(oxy_request.arguments.get("query", "")),
+                "answer": None,
+            })
+            try:
+                return await inner_execute(oxy_request)
+            finally:
+                _slot.reset(token)
+
+        def parse_llm_response(ori_response: str, oxy_request: OxyRequest = None) -> LLMResponse:
+            slot = _slot.get()
+            if slot is not None and slot["parent"] == agent.name and slot["answer"] is not None:
+                answer, slot["answer"] = slot["answer"], None
+                return LLMResponse(state=LLMState.ANSWER, output=answer, ori_response=answer)
+            return inner_parse(ori_response, oxy_request)
+
+        object.__setattr__(agent, "func_execute", routed_execute)
+        object.__setattr__(agent, "func_parse_llm_response", parse_llm_response)
+
+    def wrap_child(self, agent):
+        """子 agent 完成后把结果记到调用它的路由 agent 上"""
+        inner_execute = agent.func_execute or agent._execute
+
+        async def reported_execute(oxy_request: OxyRequest) -> OxyResponse:
+            oxy_response = await inner_execute(oxy_request)
+            slot = _slot.get()
+            if slot is None or slot["parent"] != oxy_request.caller or agent.name not in slot["children"]:
+                return oxy_response
+            output = _verbatim(oxy_response)
+            if oxy_response.state is OxyState.COMPLETED and is_valid_answer(answer_text(output), slot["query"]):
+                slot["answer"] = output
+            else:
+                self.rejected[slot["parent"]] += 1
+            return oxy_response
+
+        object.__setattr__(agent, "func_execute", reported_execute)
+
+    def wrap_llm(self, llm: BaseLLM):
+        """路由 agent 在已有直通结果时发起的 LLM 调用不再请求模型"""
+        inner_execute = llm.func_execute or llm._execute
+
+        async def skipped_execute(oxy_request: OxyRequest) -> OxyResponse:
+            slot = _slot.get()
+            if slot is not None and slot["answer"] is not None and oxy_request.caller == slot["parent"]:
+                self.passed[slot["parent"]] += 1
+                logger.info(
+                    f"{slot['parent']} 直接返回子 agent 的结果，跳过复述的 LLM 调用",
+                    extra={"trace_id": oxy_request.current_trace_id, "node_id": oxy_request.node_id},
+                )
+                return OxyResponse(state=OxyState.COMPLETED, output=slot["answer"])
+            return await inner_execute(oxy_request)
+
+        object.__setattr__(llm, "func_execute", skipped_execute)
+
+    def stats(self) -> dict:
+        return {
+            "passed": dict(self.passed),
+            "rejected": dict(self.rejected),
+            "llm_calls_saved": sum(self.passed.values()),
+        }
+
+
+def enable_passthrough(oxy_space: list, routes: Dict[str, List[str]] = PASSTHROUGH_ROUTES) -> Passthrough:
+    by_name = {oxy.name: oxy for oxy in oxy_space}
+    routes = {parent: children for parent, children in routes.items() if isinstance(by_name.get(parent), ReActAgent)}
+    passthrough = Passthrough(routes)
+    # 先包父 agent，再包子 agent：analyser 既是父又是子，上报结果的钩子要在外层，才能看到 master 的记录
+    for parent in routes:
+        passthrough.wrap_parent(by_name[parent])
+    for child in {c for children in routes.values() for c in children if c in by_name}:
+        passthrough.wrap_child(by_name[child])
+    for oxy in oxy_space:
+        if isinstance(oxy, BaseLLM):
+            passthrough.wrap_llm(oxy)
+    logger.info(f"路由结果直通已开启: {routes}")
+    return passthrough
@@ -0,0 +1,339 @@
+"""
+计划复用库
+比赛里很多查询结构相同，只是实体不同（“在 GitHub 仓库 X 中找用户 Y 在 Z 日提的 issue”、“item.jd.com/N 的问大家”），
+planner 却每次都带着很长的 PLANNER_PROMPT 从头规划。这里把成功完成的 task_solver 的初始计划存到本地：
+    - 查询先把 URL、邮箱、日期、数字、引号内容、owner/repo 换成类型占位符，再用 jieba 分词，得到结构签名
+    - 新查询按分词倒排索引找候选，用签名序列的相似度取最近邻；达到阈值、实体类型和个数一致时，
+      把计划里旧查询的实体换成新查询的实体，直接作为初始计划，不再调用 planner
+    - 旧查询中新查询没有的词若出现在计划里（计划依赖旧查询的具体内容，无法替换），或相似度低于阈值时照常调用 planner
+    - 重规划仍由 planner 带原查询完成，复用的计划有偏差时会在第一轮后被修正；复用后失败次数多于成功次数的计划不再使用
+
+用法（需在 MAS 初始化之前调用）:
+    library = PlanLibrary(os.path.join("cache_dir", "plan_library.jsonl"), threshold=0.8)
+    enable_plan_library(oxy_space, library)
+    library.stats()
+"""
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from oxygent.schemas import OxyRequest, OxyResponse, OxyState
+
+from agents.intent_router import _query_text
+from agents.speculative import answer_text, is_valid_answer
+from util.json_extract import extract_json_object
+
+logger = logging.getLogger(__name__)
+
+# 当前 task_solver 的执行状态：{"query", "planned", "entry", "plan"}
+_slot: ContextVar[Optional[dict]] = ContextVar("plan_library_slot", default=None)
+
+# 按顺序抽取，先抽出的部分不再参与后面的匹配
+ENTITY_PATTERNS = [
+    ("URL", re.compile(r"https?://[^\s，。；、）)\]】\"'“”]+|(?:[\w-]+\.)+(?:com|cn|net|org|io)(?:/[^\s，。；、）)\]】\"'“”]*)?")),
+    ("EMAIL", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+    # 数字类的实体两端不能紧挨数字，否则 “384400/3562” 会被切成 “4400/35” 和零散的数字
+    ("DATE", re.compile(r"(?<!\d)(?:\d{4}[-/.年]\d{1,2}(?:[-/.月]\d{1,2}日?)?|\d{1,2}月\d{1,2}日)(?!\d)")),
+    ("QUOTE", re.compile(r"[“\"「《『]([^”\"」》』]{1,40})[”\"」》』]")),
+    # 两边都是数字的 “a/b” 是算式或分数，不是 owner/repo
+    ("REPO", re.compile(r"(?<![\w/])(?![\d.]+/[\d.]+(?![\w-]))[A-Za-z0-9][\w.-]*/[\w.-]+")),
+    ("NUM", re.compile(r"(?<![A-Za-z0-9_.])\d+(?:\.\d+)?(?![A-Za-z0-9_])")),
+]
+PLACEHOLDER = re.compile(r"⟨(\w+)⟩")
+# 差异片段最多几个词时按实体替换，更长的差异说明查询结构不同
+MAX_SPAN_TOKENS = 3
+CANDIDATES = 20
+
+_jieba = None
+
+
+def _load_tokenizer():
+    """jieba 首次分词要加载词典（约 1 秒），在创建计划库时提前加载；未安装时退回按字切分"""
+    global _jieba
+    if _jieba is None:
+        try:
+            import jieba
+            jieba.setLogLevel(logging.WARNING)
+            jieba.initialize()
+            _jieba = jieba
+        except ImportError:
+            _jieba = False
+    return _jieba
+
+
+def _tokenize(text: str) -> List[str]:
+    if _load_tokenizer():
+        tokens = _jieba.lcut(text)
+    else:
+        tokens = re.findall(r"[A-Za-z]+|\d+|[一-鿿]|\S", text)
+    return [t for t in (t.strip() for t in tokens) if t and re.search(r"\w", t)]
+
+
+def signature(query: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """返回（占位后的分词序列，按出现顺序的实体列表 [(类型, 原文)]）"""
+    entities = []
+    text = query
+    for kind, pattern in ENTITY_PATTERNS:
+        def mask(m, kind=kind):
+            value = m.group(1) if m.groups() else m.group(0)
+            entities.append((m.start(), kind, value))
+            return m.group(0).replace(value, f" ⟨{kind}⟩ ")
+        text = pattern.sub(mask, text)
+    # 各类型分别抽取，位置只在同一类型内可比，按类型内的出现顺序即可
+    ordered = [(kind, value) for _, kind, value in sorted(entities, key=lambda e: (e[1], e[0]))]
+    tokens = []
+    for piece in re.split(r"(⟨\w+⟩)", text):
+        tokens.extend([piece] if PLACEHOLDER.fullmatch(piece) else _tokenize(piece))
+    return tokens, ordered
+
+
+def _mapping_pattern(mapping: Dict[str, str]) -> "re.Pattern":
+    parts = []
+    for key in sorted(mapping, key=len, reverse=True):
+        # 数字、英文实体要整段匹配，“3” 不能替换掉 “2023” 里的 3
+        left = r"(?<![A-Za-z0-9.])" if key[0].isascii() and key[0].isalnum() else ""
+        right = r"(?![A-Za-z0-9])" if key[-1].isascii() and key[-1].isalnum() else ""
+        parts.append(f"{left}{re.escape(key)}{right}")
+    return re.compile("|".join(parts))
+
+
+def _replace_all(text: str, mapping: Dict[str, str]) -> str:
+    """同时替换，避免替换后的值又被后面的规则替换"""
+    if not mapping:
+        return text
+    return _mapping_pattern(mapping).sub(lambda m: mapping[m.group(0)], text)
+
+
+class PlanLibrary:
+    def __init__(self, path: str, threshold: float = 0.8, max_entries: int = 1000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries: List[dict] = []
+        self._index: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.rejected = 0  # 相似度达标但实体无法替换
+        self.stored = 0
+        self.reused_failed = 0
+        self.saved_seconds = 0.0
+        self._plan_seconds = deque(maxlen=200)
+        self._lookup_seconds = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _load_tokenizer()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as fin:
+            for line in fin:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._add(record)
+        logger.info(f"计划复用库已加载 {len(self.entries)} 条: {self.path}")
+
+    def _add(self, record: dict):
+        record["tokens"], record["entities"] = signature(record["query"])
+        record.setdefault("success", 0)
+        record.setdefault("failure", 0)
+        self.entries.append(record)
+        for token in set(record["tokens"]):
+            self._index.setdefault(token, set()).add(len(self.entries) - 1)
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fout:
+            for entry in self.entries:
+                record = {k: entry[k] for k in ("query", "plan", "success", "failure", "created")}
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+    def _instantiate(self, entry: dict, tokens: List[str], entities: List[Tuple[str, str]]) -> Optional[dict]:
+        """把计划中旧查询的实体换成新查询的实体；计划依赖无法替换的内容时返回 None"""
+        if Counter(k for k, _ in entry["entities"]) != Counter(k for k, _ in entities):
+            return None
+        mapping = {old: new for (_, old), (_, new) in zip(entry["entities"], entities) if old != new}
+        stale = []
+        matcher = difflib.SequenceMatcher(a=entry["tokens"], b=tokens, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "equal":
+                continue
+            old, new = entry["tokens"][i1:i2], tokens[j1:j2]
+            if op == "replace" and max(len(old), len(new)) <= MAX_SPAN_TOKENS:
+                mapping.setdefault("".join(old), "".join(new))
+            elif op != "insert":
+                stale.extend(old)
+        text = json.dumps(entry["plan"], ensure_ascii=False)
+        if any(len(t) > 1 and not PLACEHOLDER.fullmatch(t) and t in text for t in stale):
+            return None
+        steps = entry["plan"]["steps"]
+        if mapping:
+            # 旧实体在计划里没有被整段替换掉（例如只是更长数字的一部分），复用会沿用旧查询的值
+            leftover = "\n".join(_mapping_pattern(mapping).sub("", step) for step in steps)
+            if any(len(old) > 1 and old in leftover for (_, old), (_, new) in zip(entry["entities"], entities)
+                   if old != new):
+                return None
+        plan = dict(entry["plan"])
+        plan["steps"] = [_replace_all(step, mapping) for step in steps]
+        return plan
+
+    def lookup(self, query: str) -> Tuple[Optional[dict], Optional[dict]]:
+        """返回（库中条目，替换实体后的计划），未命中时返回 (None, None)"""
+        started = time.perf_counter()
+        tokens, entities = signature(query)
+        with self._lock:
+            self.lookups += 1
+            shared = Counter(i for token in set(tokens) for i in self._index.get(token, ()))
+            result = (None, None)
+            best = 0.0
+            for i, _ in shared.most_common(CANDIDATES):
+                entry = self.entries[i]
+                if entry["failure"] > entry["success"]:
+                    continue
+                score = difflib.SequenceMatcher(a=entry["tokens"], b=tokens, autojunk=False).ratio()
+                if score < self.threshold or score <= best:
+                    continue
+                plan = self._instantiate(entry, tokens, entities)
+                if plan is None:
+                    self.rejected += 1
+                    continue
+                best, result = score, (entry, plan)
+            if result[0] is not None:
+                self.hits += 1
+                avg = self._avg_plan_seconds()
+                self.saved_seconds += avg or 0.0
+            self._lookup_seconds += time.perf_counter() - started
+        if result[0] is not None:
+            logger.info(f"复用计划（相似度 {best:.2f}）: {result[0]['query'][:60]} -> {query[:60]}")
+        return result
+
+    def _avg_plan_seconds(self) -> Optional[float]:
+        return sum(self._plan_seconds) / len(self._plan_seconds) if self._plan_seconds else None
+
+    def record_planning(self, seconds: float):
+        with self._lock:
+            self._plan_seconds.append(seconds)
+
+    def store(self, query: str, plan: dict):
+        with self._lock:
+            tokens, _ = signature(query)
+            if not tokens or any(entry["tokens"] == tokens for entry in self.entries):
+                return
+            self._add({"query": query, "plan": plan, "created": time.strftime("%Y-%m-%d %H:%M:%S")})
+            self.stored += 1
+            if len(self.entries) > self.max_entries:
+                # 淘汰最早的条目后重建索引
+                kept = self.entries[-self.max_entries:]
+                self.entries, self._index = [], {}
+                for entry in kept:
+                    self._add(entry)
+            self._save()
+
+    def record_outcome(self, entry: dict, ok: bool):
+        with self._lock:
+            entry["success" if ok else "failure"] += 1
+            if not ok:
+                self.reused_failed += 1
+            self._save()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "rejected": self.rejected,
+            "stored": self.stored,
+            "reused_failed": self.reused_failed,
+            "avg_plan_seconds": round(self._avg_plan_seconds() or 0.0, 2),
+            "saved_seconds": round(self.saved_seconds, 1),
+            "avg_lookup_ms": round(self._lookup_seconds / self.lookups * 1000, 2) if self.lookups else 0.0,
+        }
+
+
+def _parse_plan(output) -> Optional[dict]:
+    try:
+        plan = json.loads(extract_json_object(answer_text(output)) or "null")
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps"), list) or not plan["steps"]:
+        return None
+    return {"steps": [str(s) for s in plan["steps"]], "dependencies": plan.get("dependencies") or []}
+
+
+def enable_plan_library(oxy_space: list, library: PlanLibrary, workflow: str = "task_solver", planner: str = "planner"):
+    """task_solver 的第一次 planner 调用先查计划库；任务成功完成后保存 planner 给出的初始计划"""
+    by_name = {oxy.name: oxy for oxy in oxy_space}
+    workflow_agent, planner_agent = by_name[workflow], by_name[planner]
+    inner_workflow = workflow_agent.func_execute or workflow_agent._execute
+    inner_planner = planner_agent.func_execute or planner_agent._execute
+
+    async def library_workflow(oxy_request: OxyRequest) -> OxyResponse:
+        slot = {"query": _query_text(oxy_request.get_query()), "planned": False, "entry": None, "plan": None}
+        token = _slot.set(slot)
+        try:
+            oxy_response = await inner_workflow(oxy_request)
+        finally:
+            _slot.reset(token)
+        ok = oxy_response.state is OxyState.COMPLETED and is_valid_answer(answer_text(oxy_response), slot["query"])
+        if slot["entry"] is not None:
+            library.record_outcome(slot["entry"], ok)
+        elif ok and slot["plan"] is not None:
+            library.store(slot["query"], slot["plan"])
+        return oxy_response
+
+    async def library_planner(oxy_request: OxyRequest) -> OxyResponse:
+        slot = _slot.get()
+        if slot is None or slot["planned"] or oxy_request.caller != workflow:
+            return await inner_planner(oxy_request)
+        # 只处理初始规划，重规划照常调用 LLM
+        slot["planned"] = True
+        entry, plan = library.lookup(slot["query"])
+        if entry is not None:
+            slot["entry"] = entry
+            return OxyResponse(state=OxyState.COMPLETED, output=json.dumps(plan, ensure_ascii=False))
+        started = time.monotonic()
+        oxy_response = await inner_planner(oxy_request)
+        library.record_planning(time.monotonic() - started)
+        if oxy_response.state is OxyState.COMPLETED:
+            slot["plan"] = _parse_plan(oxy_response.output)
+        return oxy_response
+
+    object.__setattr__(workflow_agent, "func_execute", library_workflow)
+    object.__setattr__(planner_agent, "func_execute", library_planner)
+    logger.info(f"计划复用已开启: {library.path}（阈值 {library.threshold}）")
+    return library
+
+
+if __name__ == "__main__":
+    # python -m agents.plan_library：数字实体替换的自检
+    import tempfile
+
+    library = PlanLibrary(os.path.join(tempfile.mkdtemp(), "plan_library.jsonl"))
+    assert signature("请计算 384400/3562 的结果")[1] == [("NUM", "384400"), ("NUM", "3562")]
+    library.store("请计算 384400/3562 的结果，输出阿拉伯数字",
+                  {"steps": ["用计算工具计算 384400/3562", "输出结果"], "dependencies": []})
+    _, plan = library.lookup("请计算 123456/7890 的结果，输出阿拉伯数字")
+    assert plan["steps"][0] == "用计算工具计算 123456/7890", plan
+    _, plan = library.lookup("请计算 12/7 的结果，输出阿拉伯数字")
+    assert plan["steps"][0] == "用计算工具计算 12/7", plan
+    # 计划中的旧数字无法整段替换时不复用
+    library.store("月球距离 384400 公里，光速 299792 公里每秒，需要多少秒",
+                  {"steps": ["用计算工具计算 384400km / 299792"], "dependencies": []})
+    assert library.lookup("月球距离 400000 公里，光速 300000 公里每秒，需要多少秒") == (None, None)
+    library.store("2023-05-01 在 jkterry1/Tianshou 提的 issue",
+                  {"steps": ["打开 github.com/jkterry1/Tianshou 查 2023-05-01 的 issue"], "dependencies": []})
+    _, plan = library.lookup("2024-01-15 在 thu-ml/Tianshou 提的 issue")
+    assert plan["steps"][0] == "打开 github.com/thu-ml/Tianshou 查 2024-01-15 的 issue", plan
+    print("ok", library.stats())
@@ -0,0 +1,199 @@
+"""
+Prompt token 统计与工具描述精简
+ReAct 每一轮都会把完整的 tools_description 重新发送一次，analyser、executor 挂了多个子 agent，描述尤其长；
+而 LLM 的 max_tokens = 16384 - 4096 只是估计值，超长时没有任何提示。这里做两件事：
+    - 统计每次 LLM 调用的 prompt token，按系统提示词 / 工具描述 / 记忆 / 查询拆分，
+      接近上下文上限时提前告警，并可写入 jsonl 供离线分析
+    - 对只调用子 agent（参数只有 query）的 agent，把工具描述换成每个工具一行的精简目录，
+      只保留名称、参数名和一句话说明
+
+用法（需在 MAS 初始化之前调用）:
+    accountant = PromptAccountant(context_window=16384, reserved_output=4096)
+    enable_prompt_accounting(oxy_space, accountant, condense="auto")
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Union
+
+from oxygent.oxy.agents.local_agent import LocalAgent
+from oxygent.oxy.llms.base_llm import BaseLLM
+from oxygent.schemas import OxyRequest, OxyResponse
+
+from util.token_counter import MESSAGE_OVERHEAD_TOKENS, content_tokens, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 当前 agent 这次执行的 prompt 组成，LLM 调用时据此拆分 token
+_prompt_parts: ContextVar[Optional[dict]] = ContextVar("prompt_parts", default=None)
+
+
+def condense_tool_desc(tool) -> str:
+    """一行的工具说明：名称(参数名, 可选参数?): 描述的第一句"""
+    schema = tool.input_schema or {}
+    required = schema.get("required", [])
+    args = [
+        name if name in required else f"{name}?"
+        for name, info in schema.get("properties", {}).items()
+        if info.get("description") != "SystemArg"
+    ]
+    desc = re.split(r"(?<=[。.!！\n])", str(tool.desc or "").strip(), maxsplit=1)[0].strip()
+    return f"- {tool.name}({', '.join(args)}): {desc[:160]}"
+
+
+class PromptAccountant:
+    """按 agent 统计 prompt token 组成，超过预算时告警"""
+
+    def __init__(
+        self,
+        context_window: int = 16384,
+        reserved_output: int = 4096,
+        warn_ratio: float = 0.9,
+        log_path: Optional[str] = None,
+    ):
+        self.context_window = context_window
+        self.reserved_output = reserved_output
+        self.warn_ratio = warn_ratio
+        self.log_path = log_path
+        self.overflow_warnings = 0
+        self._records: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    @property
+    def prompt_budget(self) -> int:
+        return self.context_window - self.reserved_output
+
+    def measure(self, messages: List[dict], parts: Optional[dict] = None) -> dict:
+        """拆分 messages 的 token：[system, *short_memory, query, *react_memory]"""
+        messages = messages or []
+        breakdown = {"system": 0, "tools": 0, "memory": 0, "query": 0}
+        start = 0
+        if messages and messages[0].get("role") == "system":
+            system = messages[0].get("content")
+            breakdown["system"] = content_tokens(system)
+            tools_description = (parts or {}).get("tools_description")
+            if tools_description and tools_description in str(system):
+                breakdown["tools"] = estimate_tokens(tools_description)
+                breakdown["system"] -= breakdown["tools"]
+            start = 1
+        query_index = start + (parts or {}).get("short_memory", 0)
+        for i, message in enumerate(messages[start:], start):
+            key = "query" if i == query_index else "memory"
+            breakdown[key] += content_tokens(message.get("content"))
+        breakdown["overhead"] = MESSAGE_OVERHEAD_TOKENS * len(messages)
+        breakdown["total"] = sum(breakdown.values())
+        return breakdown
+
+    def record(self, oxy_request: OxyRequest, llm_name: str, breakdown: dict):
+        agent = oxy_request.caller or "unknown"
+        with self._lock:
+            self._records.setdefault(agent, deque(maxlen=10000)).append(breakdown)
+        if breakdown["total"] > self.prompt_budget * self.warn_ratio:
+            self.overflow_warnings += 1
+            logger.warning(
+                f"{agent} 调用 {llm_name} 的 prompt 约 {breakdown['total']} tokens，"
+                f"接近预算 {self.prompt_budget}（上下文 {self.context_window} - 预留输出 {self.reserved_output}）: {breakdown}",
+                extra={"trace_id": oxy_request.current_trace_id, "node_id": oxy_request.node_id},
+            )
+        if self.log_path:
+            record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "trace_id": oxy_request.current_trace_id,
+                      "agent": agent, "llm": llm_name, **breakdown}
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as fout:
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stats(self) -> dict:
+        result = {}
+        with self._lock:
+            items = [(agent, list(records)) for agent, records in self._records.items()]
+        for agent, records in items:
+            totals = sorted(r["total"] for r in records)
+            result[agent] = {
+                "calls": len(records),
+                "median": totals[len(totals) // 2],
+                "p95": totals[int((len(totals) - 1) * 0.95)],
+                "max": totals[-1],
+                "avg_parts": {k: round(sum(r[k] for r in records) / len(records))
+                              for k in ("system", "tools", "memory", "query")},
+            }
+        return {"agents": result, "overflow_warnings": self.overflow_warnings}
+
+
+def _tool_catalog(agent: LocalAgent) -> Optional[str]:
+    """只调用子 agent 的 agent 返回精简目录，否则返回 None"""
+    names = list(agent.permitted_tool_name_list)
+    tools = [agent.mas.oxy_name_to_oxy.get(name) for name in names]
+    if not names or any(t is None for t in tools):
+        return None
+    return "\n".join(condense_tool_desc(t) for t in tools)
+
+
+def wrap_agent(agent: LocalAgent, condense: bool = False):
+    """在 agent 执行时记录 prompt 组成；condense=True 时把工具描述替换为精简目录"""
+    inner_execute = agent.func_execute or agent._execute
+    catalogs: Dict[tuple, Optional[str]] = {}
+
+    async def accounted_execute(oxy_request: OxyRequest) -> OxyResponse:
+        if condense and oxy_request.arguments.get("tools_description"):
+            key = tuple(agent.permitted_tool_name_list)
+            if key not in catalogs:
+                catalogs[key] = _tool_catalog(agent)
+            if catalogs[key]:
+                oxy_request.arguments["tools_description"] = catalogs[key]
+        token = _prompt_parts.set({
+            "tools_description": oxy_request.arguments.get("tools_description"),
+            "short_memory": len(oxy_request.get_short_memory() or []),
+        })
+        try:
+            return await inner_execute(oxy_request)
+        finally:
+            _prompt_parts.reset(token)
+
+    object.__setattr__(agent, "func_execute", accounted_execute)
+    return agent
+
+
+def wrap_llm(llm: BaseLLM, accountant: PromptAccountant):
+    inner_execute = llm.func_execute or llm._execute
+
+    async def accounted_execute(oxy_request: OxyRequest) -> OxyResponse:
+        breakdown = accountant.measure(oxy_request.arguments.get("messages", []), _prompt_parts.get())
+        accountant.record(oxy_request, llm.name, breakdown)
+        return await inner_execute(oxy_request)
+
+    object.__setattr__(llm, "func_execute", accounted_execute)
+    return llm
+
+
+def _only_calls_agents(agent: LocalAgent) -> bool:
+    """工具全部是子 agent（参数只有 query），不需要完整的参数说明"""
+    return bool(agent.sub_agents) and not agent.tools
+
+
+def enable_prompt_accounting(
+    oxy_space: list,
+    accountant: PromptAccountant,
+    condense: Union[str, List[str], None] = "auto",
+) -> List[str]:
+    """给 LLM 挂上 token 统计；condense 为 "auto" 时精简只调用子 agent 的 agent 的工具描述，
+    也可以传入 agent 名称列表，None 表示不精简。返回精简了工具描述的 agent 名称"""
+    condensed = []
+    for oxy in oxy_space:
+        if isinstance(oxy, BaseLLM):
+            wrap_llm(oxy, accountant)
+        elif isinstance(oxy, LocalAgent):
+            if condense == "auto":
+                enabled = _only_calls_agents(oxy)
+            else:
+                enabled = oxy.name in (condense or [])
+            wrap_agent(oxy, condense=enabled)
+            if enabled:
+                condensed.append(oxy.name)
+    logger.info(f"prompt token 统计已开启，预算 {accountant.prompt_budget}，精简工具描述: {condensed}")
+    return condensed
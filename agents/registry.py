@@ -0,0 +1,130 @@
+"""
+按需启动
+MAS 启动时会初始化 oxy_space 中的全部 agent 和工具，其中 firecrawl_tools 要通过 npx 拉起 Node 进程，
+即使这次运行只用到 math_agent 也一样。这里提供两种裁剪：
+    - 从入口 agent（默认 master）出发，沿 sub_agents / tools / llm_model / 额外授权的调用关系
+      找出可达的 oxy，只把这些交给 MAS
+    - stdio MCP 客户端推迟到第一次被调用时才启动服务进程；启动 MAS 时用上次缓存的工具列表注册工具，
+      没有缓存时照常启动一次并写入缓存（cache_dir/mcp_tools/{name}.json）
+
+用法（需在 MAS 初始化之前、其他钩子挂好之后调用）:
+    oxy_space = enable_lazy_startup(oxy_space, roots=["master"])
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Set
+
+from mcp.types import ListToolsResult
+from oxygent.oxy.agents.local_agent import LocalAgent
+from oxygent.oxy.mcp_tools.base_mcp_client import BaseMCPClient
+from oxygent.oxy.mcp_tools.stdio_mcp_client import StdioMCPClient
+from oxygent.schemas import OxyRequest, OxyResponse
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MCP_LISTING_DIR = os.path.join(PROJECT_ROOT, "cache_dir", "mcp_tools")
+
+
+def _edges(oxy) -> List[str]:
+    """oxy 在初始化或执行时会引用到的其他 oxy 名称"""
+    names = []
+    if isinstance(oxy, LocalAgent):
+        names.extend(oxy.sub_agents or [])
+        names.extend(oxy.tools or [])
+        names.extend(oxy.extra_permitted_tool_name_list or [])
+        if oxy.llm_model:
+            names.append(oxy.llm_model)
+    return names
+
+
+def reachable_names(oxy_space: list, roots: Iterable[str]) -> Set[str]:
+    by_name: Dict[str, object] = {oxy.name: oxy for oxy in oxy_space}
+    seen: Set[str] = set()
+    stack = [r for r in roots if r in by_name]
+    while stack:
+        name = stack.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        stack.extend(n for n in _edges(by_name[name]) if n in by_name and n not in seen)
+    return seen
+
+
+def select_reachable(oxy_space: list, roots: Iterable[str]) -> list:
+    """只保留从 roots 可达的 oxy，顺序不变"""
+    roots = list(roots)
+    missing = [r for r in roots if r not in {oxy.name for oxy in oxy_space}]
+    if missing:
+        raise ValueError(f"入口 agent 不存在: {missing}")
+    names = reachable_names(oxy_space, roots)
+    skipped = [oxy.name for oxy in oxy_space if oxy.name not in names]
+    if skipped:
+        logger.info(f"从 {roots} 不可达，跳过初始化: {skipped}")
+    return [oxy for oxy in oxy_space if oxy.name in names]
+
+
+def defer_mcp_start(client: BaseMCPClient, listing_dir: str = MCP_LISTING_DIR) -> BaseMCPClient:
+    """MCP 服务进程推迟到第一次调用时启动；工具列表用缓存注册"""
+    listing_path = os.path.join(listing_dir, f"{client.name}.json")
+    real_init = client.init
+    real_add_tools = client.add_tools
+    inner_execute = client._execute
+    state = {"registered": False, "started": False}
+    lock = asyncio.Lock()
+
+    def add_tools(tools_response):
+        # 每次拿到真实的工具列表都刷新缓存；已经用缓存注册过的不再重复注册
+        try:
+            os.makedirs(listing_dir, exist_ok=True)
+            with open(listing_path, "w", encoding="utf-8") as fout:
+                json.dump(tools_response.model_dump(mode="json"), fout, ensure_ascii=False)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"{client.name} 的工具列表缓存写入失败: {e}")
+        if not state["registered"]:
+            state["registered"] = True
+            real_add_tools(tools_response)
+
+    async def lazy_init(is_fetch_tools=True):
+        state["started"] = False  # MAS 可能多次启动，每次都重新按需拉起
+        if is_fetch_tools and os.path.exists(listing_path):
+            try:
+                with open(listing_path, "r", encoding="utf-8") as fin:
+                    listing = ListToolsResult.model_validate(json.load(fin))
+            except (OSError, ValueError) as e:
+                logger.warning(f"{client.name} 的工具列表缓存不可用，立即启动: {e}")
+            else:
+                state["registered"] = False
+                add_tools(listing)
+                logger.info(f"{client.name} 使用缓存的工具列表注册，服务进程将在首次调用时启动")
+                return
+        state["registered"] = False
+        await real_init(is_fetch_tools)
+        state["started"] = True
+
+    async def lazy_execute(oxy_request: OxyRequest) -> OxyResponse:
+        if not state["started"]:
+            async with lock:
+                if not state["started"]:
+                    logger.info(f"首次调用 {oxy_request.callee}，启动 {client.name}")
+                    # 在独立的任务中启动（与 MAS 并发初始化时一致），stdio 连接的上下文不会挂在调用方的任务上；
+                    # 重新获取工具列表只用于刷新缓存
+                    await asyncio.create_task(real_init(True))
+                    state["started"] = True
+        return await inner_execute(oxy_request)
+
+    object.__setattr__(client, "add_tools", add_tools)
+    object.__setattr__(client, "init", lazy_init)
+    object.__setattr__(client, "_execute", lazy_execute)
+    return client
+
+
+def enable_lazy_startup(oxy_space: list, roots: Iterable[str] = ("master",)) -> list:
+    """裁剪 oxy_space 并推迟 stdio MCP 进程的启动，返回新的 oxy_space"""
+    oxy_space = select_reachable(oxy_space, roots)
+    for oxy in oxy_space:
+        if isinstance(oxy, StdioMCPClient):
+            defer_mcp_start(oxy)
+    return oxy_space
@@ -0,0 +1,243 @@
+"""
+双路径投机执行
+analyser 要在 executor（单步）和 task_solver（规划 / 执行 / 重规划）之间二选一，选错时要先付出错误路径的
+全部开销，往往还要再重试一次。对于本地路由判断为“模棱两可”的查询，这里同时启动两条路径：
+    - 先完成且通过快速校验（非空、不是工具调用或报错、符合查询要求的格式，如“输出阿拉伯数字”）的结果胜出，
+      另一条路径立即取消
+    - 两条路径都未通过校验时，取 task_solver 的结果（没有则取任意一个非空结果）
+    - 分别统计两条路径的 LLM 调用次数：落败路径已经用掉的记为浪费；节省的按落败路径
+      完整跑完的平均调用次数估算（即选错路径时需要多付出的调用），用于调整触发阈值
+
+用法（需在 MAS 初始化之前调用，且在本地意图路由之后）:
+    speculator = SpeculativeRouter(router, log_path=os.path.join("cache_dir", "speculative_runs.jsonl"))
+    enable_speculative_routing(oxy_space, master, speculator)
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from oxygent.oxy.llms.base_llm import BaseLLM
+from oxygent.schemas import OxyRequest, OxyResponse, OxyState
+from oxygent.utils.common_utils import generate_uuid
+
+from agents.intent_router import ROUTE_EXECUTOR, ROUTE_LLM, ROUTE_TASK_SOLVER, IntentRouter, RouteDecision, _query_text
+
+logger = logging.getLogger(__name__)
+
+# 当前所在投机路径的 LLM 调用计数，路径内创建的子任务继承同一个 dict
+_path_calls: ContextVar[Optional[dict]] = ContextVar("speculative_path_calls", default=None)
+
+NUMBER_PATTERN = re.compile(r"[-+]?\d[\d,]*(\.\d+)?%?")
+DATE_PATTERN = re.compile(r"\d{4}-\d{1,2}-\d{1,2}")
+# 查询中对答案格式的要求 -> 校验答案的函数
+FORMAT_RULES = [
+    (re.compile(r"阿拉伯数字|仅输出数字|只输出数字|仅输出数值|只输出数值|保留\S{0,3}位小数"),
+     lambda a: NUMBER_PATTERN.fullmatch(a) is not None),
+    (re.compile(r"是或否|是/否|“是”或“否”"), lambda a: a in ("是", "否")),
+    (re.compile(r"yes or no", re.IGNORECASE), lambda a: a.lower() in ("yes", "no")),
+    (re.compile(r"YYYY-MM-DD|yyyy-mm-dd"), lambda a: DATE_PATTERN.fullmatch(a) is not None),
+]
+FAILURE_MARKERS = [
+    "error executing", "timed out", "no permission", "not exists",
+    "无法", "抱歉", "未能", "失败", "请提供", "没有找到",
+]
+
+
+def answer_text(output) -> str:
+    """取出最终答案：WorkflowAgent 的输出可能嵌套 OxyResponse；去掉思考过程"""
+    while isinstance(output, OxyResponse):
+        output = output.output
+    text = "" if output is None else str(output)
+    if "</think>" in text:
+        text = text.split("</think>")[-1]
+    return text.strip()
+
+
+def is_valid_answer(answer: str, query: str) -> bool:
+    """不调用 LLM 的快速校验"""
+    if not answer:
+        return False
+    if answer.lstrip().startswith("{") and "tool_name" in answer:
+        return False  # 路由用的工具调用 JSON，不是答案
+    lowered = answer.lower()
+    if len(answer) < 80 and any(marker in lowered for marker in FAILURE_MARKERS):
+        return False
+    for pattern, check in FORMAT_RULES:
+        if pattern.search(query) and not check(answer.strip().strip("。.")):
+            return False
+    return True
+
+
+class SpeculativeRouter:
+    """决定哪些查询需要投机执行，并汇总浪费 / 节省的 LLM 调用"""
+
+    def __init__(
+        self,
+        router: IntentRouter,
+        paths: Tuple[str, ...] = (ROUTE_EXECUTOR, ROUTE_TASK_SOLVER),
+        max_confidence: Optional[float] = None,
+        include_ambiguous: bool = True,
+        log_path: Optional[str] = None,
+    ):
+        self.router = router
+        self.paths = paths
+        # 路由结果指向 paths 之一、但置信度低于该值时投机执行；默认与直接路由的阈值相同
+        self.max_confidence = router.min_confidence if max_confidence is None else max_confidence
+        self.include_ambiguous = include_ambiguous
+        self.log_path = log_path
+        self.runs = 0
+        self.wins: Dict[str, int] = {path: 0 for path in paths}
+        self.no_valid_answer = 0
+        self.wasted_calls = 0
+        self.saved_calls = 0.0
+        # 各路径正常跑完且答案有效时的 LLM 调用次数，用于估算被取消的路径本来还要花多少
+        self._full_calls: Dict[str, deque] = {path: deque(maxlen=200) for path in paths}
+        self._log_lock = threading.Lock()
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def is_borderline(self, decision: RouteDecision) -> bool:
+        if decision.route in self.paths:
+            return decision.confidence < self.max_confidence
+        return self.include_ambiguous and decision.route == ROUTE_LLM and decision.reason.startswith("ambiguous")
+
+    def _avg_full_calls(self, path: str) -> Optional[float]:
+        calls = self._full_calls[path]
+        return sum(calls) / len(calls) if calls else None
+
+    async def run(self, oxy_request: OxyRequest, query) -> OxyResponse:
+        """并发执行各条路径，返回第一个通过校验的结果"""
+        text = _query_text(query)
+        parallel_id = generate_uuid()
+        counters = {path: {"llm_calls": 0} for path in self.paths}
+        started = time.monotonic()
+
+        async def run_path(path: str) -> OxyResponse:
+            _path_calls.set(counters[path])
+            return await oxy_request.call(callee=path, arguments={"query": query}, parallel_id=parallel_id)
+
+        tasks = {asyncio.create_task(run_path(path)): path for path in self.paths}
+        finished: Dict[str, OxyResponse] = {}
+        durations: Dict[str, float] = {}
+        winner = None
+        try:
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path = tasks[task]
+                    durations[path] = round(time.monotonic() - started, 3)
+                    if task.cancelled():
+                        finished[path] = OxyResponse(state=OxyState.CANCELED, output="")
+                    elif task.exception():
+                        finished[path] = OxyResponse(
+                            state=OxyState.FAILED, output=f"{type(task.exception()).__name__}: {task.exception()}"
+                        )
+                    else:
+                        finished[path] = task.result()
+                    if (finished[path].state == OxyState.COMPLETED
+                            and is_valid_answer(answer_text(finished[path]), text)):
+                        # 只有正常跑完并给出有效答案的路径才计入“完整运行的开销”
+                        self._full_calls[path].append(counters[path]["llm_calls"])
+                        if winner is None:
+                            winner = path
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if winner is None:
+            self.no_valid_answer += 1
+            fallback = ROUTE_TASK_SOLVER if answer_text(finished.get(ROUTE_TASK_SOLVER)) else None
+            fallback = fallback or next((p for p, r in finished.items() if answer_text(r)), None)
+            response = finished.get(fallback) or OxyResponse(state=OxyState.FAILED, output="")
+        else:
+            self.wins[winner] += 1
+            response = finished[winner]
+        self._account(oxy_request, text, counters, winner, durations)
+        return OxyResponse(state=response.state, output=answer_text(response))
+
+    def _account(self, oxy_request: OxyRequest, query: str, counters: dict, winner: Optional[str], durations: dict):
+        self.runs += 1
+        wasted = saved = 0
+        if winner is not None:
+            for path in self.paths:
+                if path == winner:
+                    continue
+                wasted += counters[path]["llm_calls"]
+                avg = self._avg_full_calls(path)
+                if avg is not None:
+                    saved += max(avg - counters[path]["llm_calls"], 0.0)
+        self.wasted_calls += wasted
+        self.saved_calls += saved
+        logger.info(
+            f"speculative routing: winner={winner} calls={ {p: c['llm_calls'] for p, c in counters.items()} } "
+            f"wasted={wasted} saved≈{saved:.1f}",
+            extra={"trace_id": oxy_request.current_trace_id, "node_id": oxy_request.node_id},
+        )
+        if not self.log_path:
+            return
+        record = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "trace_id": oxy_request.current_trace_id,
+            "query": query[:200],
+            "winner": winner,
+            "llm_calls": {p: c["llm_calls"] for p, c in counters.items()},
+            "finished_at": durations,
+            "wasted_calls": wasted,
+            "saved_calls": round(saved, 1),
+        }
+        with self._log_lock, open(self.log_path, "a", encoding="utf-8") as fout:
+            fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "wins": dict(self.wins),
+            "no_valid_answer": self.no_valid_answer,
+            "wasted_llm_calls": self.wasted_calls,
+            "saved_llm_calls": round(self.saved_calls, 1),
+            "avg_full_calls": {p: round(self._avg_full_calls(p) or 0.0, 1) for p in self.paths},
+        }
+
+
+def _count_llm_calls(llm: BaseLLM):
+    inner_execute = llm.func_execute or llm._execute
+
+    async def counted_execute(oxy_request: OxyRequest) -> OxyResponse:
+        counter = _path_calls.get()
+        if counter is not None:
+            counter["llm_calls"] += 1
+        return await inner_execute(oxy_request)
+
+    object.__setattr__(llm, "func_execute", counted_execute)
+
+
+def enable_speculative_routing(oxy_space: List, master, speculator: SpeculativeRouter):
+    """通过 func_execute 钩子在 master 前判断是否投机执行，其余查询调用原有的执行函数"""
+    for oxy in oxy_space:
+        if isinstance(oxy, BaseLLM):
+            _count_llm_calls(oxy)
+    inner_execute = master.func_execute or master._execute
+    master.extra_permitted_tool_name_list.extend(
+        p for p in speculator.paths if p not in master.extra_permitted_tool_name_list
+    )
+
+    async def speculative_execute(oxy_request: OxyRequest) -> OxyResponse:
+        # 直接 mas.call 时没有 master 级别的查询，退回当前请求的 query
+        query = oxy_request.get_query(master_level=True) or oxy_request.get_query()
+        attachments = oxy_request.arguments.get("attachments")
+        decision = speculator.router.decide(_query_text(query), attachments)
+        if attachments or not speculator.is_borderline(decision):
+            return await inner_execute(oxy_request)
+        return await speculator.run(oxy_request, query)
+
+    object.__setattr__(master, "func_execute", speculative_execute)
+    return master
@@ -0,0 +1,86 @@
+"""
+plan_and_solve_workflow 的步骤历史
+替代原来不断拼接的 past_steps 字符串：最近几步的结果原样保留，较早或过长的结果压缩为
+关键信息摘要，整体不超过给定的 token 预算，并记录每轮发送的历史 token 数。
+"""
+import re
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from util.token_counter import estimate_tokens, truncate_to_tokens
+
+# 含有这些特征的行通常是答案线索：链接、数字、键值对
+_KEY_FACT_PATTERN = re.compile(r"https?://|\d|[:：=]")
+
+
+def extract_key_facts(text: str, max_tokens: int) -> str:
+    """从长结果中挑出包含链接、数字或键值的行，按原顺序拼接；挑不出时退化为截断摘要"""
+    lines = [line.strip() for line in re.split(r"[\r\n]+|(?<=[。！？；])", str(text)) if line.strip()]
+    facts, used = [], 0
+    for line in lines:
+        if not _KEY_FACT_PATTERN.search(line):
+            continue
+        line = truncate_to_tokens(line, max_tokens // 2)
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        facts.append(line)
+        used += cost
+    if not facts:
+        return truncate_to_tokens(text, max_tokens)
+    return " | ".join(facts)
+
+
+class StepRecord(BaseModel):
+    task: str
+    result: str
+    tokens: int = 0
+    digest: Optional[str] = None
+
+
+class StepHistory(BaseModel):
+    """带 token 预算的步骤历史"""
+
+    budget_tokens: int = Field(3000, description="渲染后历史的 token 上限")
+    keep_recent: int = Field(2, description="原样保留结果的最近步骤数")
+    max_result_tokens: int = Field(800, description="单步结果超过该长度时改用摘要")
+    digest_tokens: int = Field(150, description="单步摘要的 token 上限")
+    records: List[StepRecord] = Field(default_factory=list)
+    round_tokens: List[int] = Field(default_factory=list, description="每轮渲染出的历史 token 数")
+
+    def add(self, task: str, result) -> None:
+        result = "" if result is None else str(result)
+        self.records.append(StepRecord(task=str(task), result=result, tokens=estimate_tokens(result)))
+
+    def _digest(self, record: StepRecord) -> str:
+        if record.digest is None:
+            record.digest = extract_key_facts(record.result, self.digest_tokens)
+        return record.digest
+
+    def render(self) -> str:
+        """生成发送给 executor / planner 的历史文本"""
+        recent_start = len(self.records) - self.keep_recent
+        entries = []
+        for i, record in enumerate(self.records):
+            if i >= recent_start and record.tokens <= self.max_result_tokens:
+                entries.append(f"Task: {record.task}, Result: {record.result}")
+            else:
+                entries.append(f"Task: {record.task}, Key facts: {self._digest(record)}")
+
+        # 仍超出预算时，从最早的步骤开始只保留任务描述
+        total = sum(estimate_tokens(e) for e in entries)
+        for i, record in enumerate(self.records):
+            if total <= self.budget_tokens:
+                break
+            short = f"Task: {record.task}, Result: (omitted)"
+            total -= estimate_tokens(entries[i]) - estimate_tokens(short)
+            entries[i] = short
+
+        return "".join(f"\n{e}" for e in entries)
+
+    def record_round(self) -> str:
+        """渲染历史并记录本轮的 token 数"""
+        text = self.render()
+        self.round_tokens.append(estimate_tokens(text))
+        return text
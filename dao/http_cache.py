@@ -0,0 +1,287 @@
+"""
+网页 / 搜索结果的本地缓存
+http_agent、baidu_search_agent、firecrawl_agent 在 planner 多轮重规划之间、不同任务之间经常抓取相同的
+URL 和搜索词（item.jd.com 商品页、GitHub issue 等）。这里在 http_tools / baidu_search_tools / firecrawl_tools
+之下加一层缓存：
+    - 键：规范化后的 URL（小写域名、去掉默认端口和锚点、查询参数排序、去掉 utm_* 等跟踪参数及按域名配置的参数）或搜索词
+    - 过期时间按域名配置，搜索结果单独配置
+    - 值压缩后存入 sqlite，总大小超过上限时按最近访问时间淘汰
+    - 相同的请求同时在途时只发起一次，其余请求等待同一个结果
+只缓存成功的结果；POST 等有副作用的调用不经过缓存。
+
+用法（需在 MAS 初始化之前调用）:
+    cache = ResponseCache(os.path.join("cache_dir", "http_cache.sqlite"))
+    enable_http_cache(all_tools, cache)
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from oxygent.oxy import FunctionHub
+from oxygent.oxy.mcp_tools.base_mcp_client import BaseMCPClient
+from oxygent.schemas import OxyRequest, OxyResponse, OxyState
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+KEY_VERSION = 2  # 键的规范化规则变化时递增，旧的缓存条目不再命中，到期后淘汰
+DEFAULT_TTL = 24 * HOUR
+SEARCH_TTL = 6 * HOUR
+# 按域名后缀匹配，越具体的域名优先：ttl 为过期时间，ignore_params 为该域名下额外忽略的跟踪参数
+DOMAIN_RULES = {
+    "item.jd.com": {"ttl": 6 * HOUR},  # 价格、库存变化较快
+    "jd.com": {"ttl": 12 * HOUR},
+    "api.github.com": {"ttl": 1 * HOUR},
+    "github.com": {"ttl": 24 * HOUR},
+    "wikipedia.org": {"ttl": 7 * 24 * HOUR},
+    "baike.baidu.com": {"ttl": 7 * 24 * HOUR, "ignore_params": {"fromModule"}},
+}
+# 所有域名通用的跟踪参数；from、ts 等在不少接口中是分页、时间范围参数，不能忽略
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|spm|fbclid|gclid)$", re.IGNORECASE)
+
+# 可以缓存的工具：FunctionHub 中的函数名 / MCP 客户端中的工具名
+CACHEABLE_FUNCTIONS = {"http_get", "search_baidu"}
+CACHEABLE_MCP_TOOLS = {"firecrawl_scrape", "firecrawl_search", "firecrawl_map"}
+
+
+def normalize_url(url: str, params: Optional[dict] = None) -> str:
+    """规范化 URL，使写法不同但内容相同的请求得到同一个键"""
+    parts = urlsplit(str(url).strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.extend((str(k), str(v)) for k, v in (params or {}).items())
+    ignored = domain_rule(host).get("ignore_params", ())
+    query = sorted((k, v) for k, v in query if not TRACKING_PARAMS.match(k) and k not in ignored)
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", str(query)).strip().lower()
+
+
+def domain_rule(host: str, rules: Dict[str, dict] = DOMAIN_RULES) -> dict:
+    host = host.split(":", 1)[0].lower()
+    matches = [d for d in rules if host == d or host.endswith("." + d)]
+    return rules[max(matches, key=len)] if matches else {}
+
+
+def ttl_for_url(url: str, rules: Dict[str, dict] = DOMAIN_RULES, default: int = DEFAULT_TTL) -> int:
+    return domain_rule(urlsplit(url).hostname or "", rules).get("ttl", default)
+
+
+class ResponseCache:
+    """基于 sqlite 的压缩键值存储，带过期时间、容量上限和在途请求合并"""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[2] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._total_bytes -= row[1]
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, key: str, value: Any, ttl: float):
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now),
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """先删过期记录，仍超出上限时淘汰最久未访问的记录"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        cursor = self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self.evictions += max(cursor.rowcount, 0)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    async def fetch(self, key: str, ttl: float, loader: Callable[[], Awaitable[Any]],
+                    cacheable: Callable[[Any], bool] = bool) -> Any:
+        """读缓存；未命中时调用 loader，同一个键同时只有一个 loader 在执行"""
+        value = await asyncio.to_thread(self.get, key)
+        if value is not None:
+            return value
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他等待者时避免 "exception was never retrieved"
+            raise
+        else:
+            future.set_result(value)
+            if cacheable(value):
+                await asyncio.to_thread(self.put, key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _hash_key(*parts) -> str:
+    raw = json.dumps((KEY_VERSION,) + parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _is_success_json(text) -> bool:
+    """http_get 失败时返回 {"error": ...}，这类结果不缓存"""
+    if not text:
+        return False
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        return True
+    return not (isinstance(value, dict) and "error" in value) and value != []
+
+
+def _request_key(name: str, arguments: dict) -> tuple:
+    """返回 (缓存键, 过期时间)"""
+    arguments = dict(arguments or {})
+    url = arguments.pop("url", None)
+    query = arguments.pop("query", None) or arguments.pop("keyword", None)
+    if url:
+        normalized = normalize_url(url, arguments.pop("params", None))
+        return _hash_key(name, normalized, arguments), ttl_for_url(normalized)
+    return _hash_key(name, normalize_query(query or ""), arguments), SEARCH_TTL
+
+
+def wrap_function_hub(hub: FunctionHub, cache: ResponseCache, names=CACHEABLE_FUNCTIONS) -> list:
+    """替换 FunctionHub 中可缓存的函数；同步函数改在线程中执行，不再阻塞事件循环"""
+    wrapped = []
+    for name in [n for n in hub.func_dict if n in names]:
+        desc, async_func = hub.func_dict[name]
+        sync_func = getattr(async_func, "__wrapped__", None)
+
+        def make(async_func=async_func, sync_func=sync_func, name=name):
+            @functools.wraps(async_func)
+            async def cached_func(**kwargs):
+                if sync_func is not None and not asyncio.iscoroutinefunction(sync_func):
+                    loader = functools.partial(asyncio.to_thread, sync_func, **kwargs)
+                else:
+                    loader = functools.partial(async_func, **kwargs)
+                key, ttl = _request_key(name, kwargs)
+                return await cache.fetch(key, ttl, loader, _is_success_json)
+            return cached_func
+
+        hub.func_dict[name] = (desc, make())
+        wrapped.append(name)
+    return wrapped
+
+
+def wrap_mcp_client(client: BaseMCPClient, cache: ResponseCache, names=CACHEABLE_MCP_TOOLS) -> BaseMCPClient:
+    """MCPTool 通过 client._execute 执行，按工具名只缓存只读的抓取 / 搜索类工具"""
+    inner_execute = client._execute
+
+    async def cached_execute(oxy_request: OxyRequest) -> OxyResponse:
+        if oxy_request.callee not in names:
+            return await inner_execute(oxy_request)
+
+        async def loader():
+            return (await inner_execute(oxy_request)).output
+
+        key, ttl = _request_key(oxy_request.callee, oxy_request.arguments)
+        output = await cache.fetch(
+            key, ttl, loader, lambda out: bool(out) and not str(out).lstrip().lower().startswith("error")
+        )
+        return OxyResponse(state=OxyState.COMPLETED, output=output)
+
+    object.__setattr__(client, "_execute", cached_execute)
+    return client
+
+
+def enable_http_cache(tools: list, cache: ResponseCache) -> list:
+    """给 tools 中的网页抓取与搜索工具开启缓存，返回被包装的工具名称"""
+    wrapped = []
+    for tool in tools:
+        if isinstance(tool, FunctionHub):
+            wrapped.extend(wrap_function_hub(tool, cache))
+        elif isinstance(tool, BaseMCPClient):
+            wrap_mcp_client(tool, cache)
+            wrapped.append(tool.name)
+    logger.info(f"网页缓存已开启: {wrapped} -> {cache.path}")
+    return wrapped
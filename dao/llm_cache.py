@@ -0,0 +1,147 @@
+"""
+LLM 调用的本地磁盘缓存
+以 (模型, messages, 参数) 的内容哈希为键，把 LLM 输出压缩后存入 sqlite 文件；
+总大小超过上限时按最近访问时间淘汰（LRU）。temperature 很低时相同请求的结果基本一致，
+重跑时命中缓存即可跳过远程调用。
+
+用法:
+    cache = LLMCache(os.path.join("cache_dir", "llm_cache.sqlite"), max_bytes=512 * 1024 * 1024)
+    enable_llm_cache(oxy_space, cache)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Optional
+
+from oxygent.oxy.llms.base_llm import BaseLLM
+from oxygent.schemas import OxyRequest, OxyResponse, OxyState
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(llm: BaseLLM, oxy_request: OxyRequest) -> str:
+    """按模型、消息与调用参数计算内容哈希"""
+    arguments = oxy_request.arguments
+    params = dict(llm.llm_params)
+    params.update({k: v for k, v in arguments.items() if k != "messages"})
+    content = {
+        "model": getattr(llm, "model_name", "") or llm.name,
+        "messages": arguments.get("messages", []),
+        "params": params,
+    }
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """基于 sqlite 的压缩键值存储，带容量上限和命中统计"""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, key: str, value: Any):
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的记录，直到总大小回到上限以内"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def wrap_llm(llm: BaseLLM, cache: LLMCache):
+    """通过 func_execute 钩子给单个 LLM oxy 加上缓存，未命中时调用原有的执行函数"""
+    inner_execute = llm.func_execute or llm._execute
+
+    async def cached_execute(oxy_request: OxyRequest) -> OxyResponse:
+        key = make_cache_key(llm, oxy_request)
+        output = await asyncio.to_thread(cache.get, key)
+        if output is not None:
+            return OxyResponse(state=OxyState.COMPLETED, output=output, extra={"llm_cache": "hit"})
+        oxy_response = await inner_execute(oxy_request)
+        if oxy_response.state is OxyState.COMPLETED and oxy_response.output:
+            await asyncio.to_thread(cache.put, key, oxy_response.output)
+        return oxy_response
+
+    object.__setattr__(llm, "func_execute", cached_execute)
+    return llm
+
+
+def enable_llm_cache(oxy_space: list, cache: LLMCache) -> list:
+    """给 oxy_space 中所有 LLM 开启缓存，返回被包装的 LLM 名称"""
+    wrapped = []
+    for oxy in oxy_space:
+        if isinstance(oxy, BaseLLM):
+            wrap_llm(oxy, cache)
+            wrapped.append(oxy.name)
+    logger.info(f"LLM 缓存已开启: {wrapped} -> {cache.path}")
+    return wrapped
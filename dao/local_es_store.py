@@ -0,0 +1,225 @@
+"""
+local_es_data 的 sqlite 存储后端
+OxyGent 自带的 LocalEs 把每个索引存成一个 JSON 字典，每次写入都要整份重写并另存 .bak，
+历史越多写得越慢。这里用一个 sqlite 文件代替：每条文档一行，写入只改动单行；
+mapping 中 keyword 类型的字段（trace_id / group_id / request_id / node_id 等）另建倒排表，
+term / terms 查询直接走索引。首次建索引时会把已有的 {index}.json（损坏时用 .bak）一次性导入。
+
+用法（需在 MAS 初始化之前调用）:
+    install_sqlite_es()
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from oxygent.databases.db_es import LocalEs
+from oxygent.db_factory import DBFactory
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteEs(LocalEs):
+    """与 LocalEs 接口一致、以 sqlite 为存储的 ES 替身"""
+
+    def __init__(self, db_name: str = "local_es.sqlite", compact_every: int = 1000) -> None:
+        super().__init__()
+        self.db_path = os.path.join(self.data_dir, db_name)
+        self.compact_every = compact_every
+        self._writes = 0
+        self._keywords: Dict[str, List[str]] = {}
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                index_name TEXT NOT NULL, doc_id TEXT NOT NULL, body TEXT NOT NULL,
+                PRIMARY KEY (index_name, doc_id)
+            );
+            CREATE TABLE IF NOT EXISTS terms (
+                index_name TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, doc_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_terms_value ON terms(index_name, field, value);
+            CREATE INDEX IF NOT EXISTS idx_terms_doc ON terms(index_name, doc_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # sqlite 同步操作（通过 asyncio.to_thread 调用）
+    # ------------------------------------------------------------------
+
+    def _load(self, index_name: str, doc_id: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT body FROM docs WHERE index_name = ? AND doc_id = ?", (index_name, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, index_name: str, doc_id: str, body: dict) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO docs (index_name, doc_id, body) VALUES (?, ?, ?)",
+            (index_name, doc_id, json.dumps(body, ensure_ascii=False)),
+        )
+        self._conn.execute("DELETE FROM terms WHERE index_name = ? AND doc_id = ?", (index_name, doc_id))
+        rows = []
+        for field in self._keywords.get(index_name, []):
+            value = body.get(field)
+            values = value if isinstance(value, list) else [value]
+            rows.extend((index_name, field, v, doc_id) for v in values if isinstance(v, str) and v)
+        self._conn.executemany("INSERT INTO terms (index_name, field, value, doc_id) VALUES (?, ?, ?, ?)", rows)
+
+    def _write_sync(self, index_name: str, doc_id: str, body: dict, update_mode: bool) -> None:
+        with self._db_lock:
+            if update_mode:
+                merged = self._load(index_name, doc_id) or {}
+                merged.update(body)
+                body = merged
+            self._store(index_name, doc_id, body)
+            self._conn.commit()
+            self._writes += 1
+            if self.compact_every and self._writes % self.compact_every == 0:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _candidate_ids(self, index_name: str, query: dict) -> Optional[List[str]]:
+        """用 _id 或 keyword 字段的 term / terms 条件预先筛选，返回 None 表示需要全表扫描"""
+        conditions = [query]
+        if "bool" in query and "must" in query["bool"]:
+            conditions = query["bool"]["must"]
+        for cond in conditions:
+            for kind in ("term", "terms"):
+                if kind not in cond:
+                    continue
+                field, value = next(iter(cond[kind].items()))
+                values = value if kind == "terms" else [value]
+                if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                    continue
+                if field == "_id":
+                    return list(values)
+                if field in self._keywords.get(index_name, []):
+                    marks = ",".join("?" * len(values))
+                    rows = self._conn.execute(
+                        f"SELECT DISTINCT doc_id FROM terms WHERE index_name = ? AND field = ? AND value IN ({marks})",
+                        (index_name, field, *values),
+                    ).fetchall()
+                    return [r[0] for r in rows]
+        return None
+
+    def _fetch_sync(self, index_name: str, query: dict) -> Dict[str, dict]:
+        with self._db_lock:
+            ids = self._candidate_ids(index_name, query or {})
+            if ids is None:
+                rows = self._conn.execute(
+                    "SELECT doc_id, body FROM docs WHERE index_name = ? ORDER BY rowid", (index_name,)
+                ).fetchall()
+            else:
+                rows = []
+                for doc_id in ids:
+                    row = self._conn.execute(
+                        "SELECT doc_id, body FROM docs WHERE index_name = ? AND doc_id = ?", (index_name, doc_id)
+                    ).fetchone()
+                    if row:
+                        rows.append(row)
+        return {doc_id: json.loads(body) for doc_id, body in rows}
+
+    def _is_migrated(self, index_name: str) -> bool:
+        with self._db_lock:
+            row = self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (f"migrated:{index_name}",)).fetchone()
+        return row is not None
+
+    def _migrate_sync(self, index_name: str, data: Dict[str, Any]) -> int:
+        """把旧的 JSON 索引导入 sqlite，只执行一次"""
+        with self._db_lock:
+            key = f"migrated:{index_name}"
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            count = 0
+            for doc_id, body in (data or {}).items():
+                if isinstance(body, dict) and self._load(index_name, doc_id) is None:
+                    self._store(index_name, doc_id, body)
+                    count += 1
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(count)))
+            self._conn.commit()
+        return count
+
+    # ------------------------------------------------------------------
+    # ES 接口
+    # ------------------------------------------------------------------
+
+    async def create_index(self, index_name: str, body: dict[str, Any]) -> dict[str, bool]:
+        if not index_name or not body:
+            raise ValueError("index_name and body must not be empty")
+        await self._write_json_atomic(self._mapping_path(index_name), body)
+        properties = body.get("mappings", {}).get("properties", {})
+        keywords = [k for k, v in properties.items() if v.get("type") == "keyword"]
+        self._keywords[index_name] = list(dict.fromkeys(keywords + ["node_id"]))  # get_by_node_id 也走索引
+
+        if await asyncio.to_thread(self._is_migrated, index_name):
+            return {"acknowledged": True}
+        legacy_path = self._index_path(index_name)
+        data = await self._read_json_safe(legacy_path) if os.path.exists(legacy_path) else None
+        if not data and os.path.exists(f"{legacy_path}.bak"):
+            data = await self._read_json_safe(f"{legacy_path}.bak")
+        count = await asyncio.to_thread(self._migrate_sync, index_name, data or {})
+        if count:
+            logger.info(f"已将 {legacy_path} 中的 {count} 条记录导入 {self.db_path}")
+        return {"acknowledged": True}
+
+    async def insert(self, index_name: str, doc_id: str, body: dict[str, Any], *, update_mode: bool) -> dict[str, str]:
+        await asyncio.to_thread(self._write_sync, index_name, doc_id, body, update_mode)
+        return {"_id": doc_id, "result": "updated" if update_mode else "created"}
+
+    async def exists(self, index_name: str, doc_id: str) -> bool:
+        return bool(await asyncio.to_thread(self._fetch_sync, index_name, {"term": {"_id": doc_id}}))
+
+    async def search(self, index_name: str, body: dict[str, Any]):
+        query = body.get("query", {})
+        data = await asyncio.to_thread(self._fetch_sync, index_name, query)
+        docs = self._build_docs(data)
+        docs = self._filter_docs(docs, query)
+        docs = self._sort_docs(docs, body.get("sort", []))
+        return {"hits": {"hits": docs[: body.get("size", 10)]}}
+
+    async def get_by_node_id(self, index_name: str, node_id: str) -> Optional[dict[str, Any]]:
+        hits = (await self.search(index_name, {"query": {"term": {"node_id": node_id}}, "size": 1}))["hits"]["hits"]
+        return hits[0] if hits else None
+
+    async def update_by_node_id(self, index_name: str, node_id: str, updates: dict[str, Any]) -> dict[str, str]:
+        doc = await self.get_by_node_id(index_name, node_id)
+        if doc is None:
+            return {"_id": "", "result": "not_found"}
+        await self.update(index_name, doc["_id"], updates)
+        return {"_id": doc["_id"], "result": "updated"}
+
+    async def compact(self) -> bool:
+        """合并 WAL 并回收被覆盖记录占用的空间"""
+        def _compact():
+            with self._db_lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.execute("VACUUM")
+        await asyncio.to_thread(_compact)
+        return True
+
+    async def close(self) -> bool:
+        # DBFactory 单例会在多个 MAS 之间复用本实例，这里只落盘 WAL，不关闭连接
+        def _checkpoint():
+            with self._db_lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        await asyncio.to_thread(_checkpoint)
+        return True
+
+
+def install_sqlite_es(**kwargs) -> SqliteEs:
+    """让 MAS 使用 SqliteEs 作为本地 ES；MAS 通过 DBFactory 单例按 LocalEs 获取实例"""
+    factory = DBFactory()
+    if factory._instance is None:
+        factory._instance = SqliteEs(**kwargs)
+        factory._created_class = LocalEs
+    elif not isinstance(factory._instance, SqliteEs):
+        raise RuntimeError(f"ES 客户端已初始化为 {type(factory._instance).__name__}，请在创建 MAS 之前调用")
+    return factory._instance
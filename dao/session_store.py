@@ -0,0 +1,324 @@
+"""
+会话历史的内存存储
+OxyGent 每次 agent 调用结束都把 {query, answer, react_memory} 编码成 JSON 字符串写入 {app}_history，
+读取短期记忆时再整段解码；同一个工具输出（网页、文件内容）在不同会话的 react_memory 里各存一份。
+start_web_service 连续运行几天后，这部分数据只增不减。这里在 ES 客户端前加一层会话存储：
+    - 历史记录在内存中只保存解码后的紧凑记录（元组，不再保留 JSON 字符串），读取时才临时编码成 OxyGent 需要的格式
+    - 较长的文本（工具输出、LLM 回复）按内容驻留，多个会话共享同一份
+    - 按会话数和估算字节数设上限，超出时按最近最少使用淘汰，淘汰前写入持久存储（LocalEs / SqliteEs / ES）；
+      未写入的记录每积累 flush_every 条批量写一次，MAS 退出时全部写入
+    - 查询时内存中的记录覆盖了全部 trace_id 就不再访问持久存储
+持久存储中的文档格式不变（memory 仍是 JSON 字符串），ES mapping 把 memory 定义为 text，关闭本功能后也能照常读取。
+
+用法（需在 MAS 初始化之前调用，且在 install_sqlite_es 之后）:
+    session_store = install_session_store(max_sessions=2000, max_bytes=64 * 1024 * 1024)
+    session_store.stats()
+"""
+import json
+import logging
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from oxygent import Config
+from oxygent.databases.db_es import JesEs, LocalEs
+from oxygent.db_factory import DBFactory
+
+logger = logging.getLogger(__name__)
+
+# 每条记录除文本外的固定开销（对象、元组、字典项），用于估算占用
+RECORD_OVERHEAD = 400
+
+
+class _Record:
+    __slots__ = ("doc_id", "session_name", "trace_id", "create_time", "query", "answer", "react", "extra", "size", "dirty")
+
+    def __init__(self, doc_id, session_name, trace_id, create_time, query, answer, react, extra):
+        self.doc_id = doc_id
+        self.session_name = session_name
+        self.trace_id = trace_id
+        self.create_time = create_time
+        self.query = query
+        self.answer = answer
+        self.react: Tuple[Tuple[str, Any], ...] = react
+        self.extra: Optional[dict] = extra
+        self.size = 0
+        self.dirty = True
+
+    def texts(self):
+        yield self.query
+        yield self.answer
+        for _, content in self.react:
+            yield content
+
+    def memory(self) -> dict:
+        memory = {"query": self.query, "answer": self.answer}
+        if self.extra:
+            memory.update(self.extra)
+        if self.react or "react_memory" not in memory:
+            memory["react_memory"] = [{"role": role, "content": content} for role, content in self.react]
+        return memory
+
+    def body(self) -> dict:
+        return {
+            "sub_session_id": self.doc_id,
+            "session_name": self.session_name,
+            "trace_id": self.trace_id,
+            "memory": json.dumps(self.memory(), ensure_ascii=False),
+            "create_time": self.create_time,
+        }
+
+
+class SessionStore:
+    """代理 ES 客户端：{app}_history 的读写走内存存储，其余调用原样转发"""
+
+    def __init__(
+        self,
+        inner,
+        max_sessions: int = 2000,
+        max_bytes: int = 64 * 1024 * 1024,
+        intern_min_chars: int = 256,
+        flush_every: int = 20,
+    ):
+        self._inner = inner
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.intern_min_chars = intern_min_chars
+        self.flush_every = flush_every
+        self._records: "OrderedDict[str, _Record]" = OrderedDict()
+        self._by_session: Dict[Tuple[str, str], str] = {}  # (session_name, trace_id) -> doc_id
+        self._writing: Dict[str, _Record] = {}  # 已移出内存、尚未写完的记录
+        self._pool: Dict[str, list] = {}  # 文本 -> [共享的字符串, 引用数]
+        self._dirty = 0
+        self.record_bytes = 0
+        self.pool_bytes = 0
+        self.interned_refs = 0
+        self.evicted = 0
+        self.flushed = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    @property
+    def index_name(self) -> str:
+        return Config.get_app_name() + "_history"
+
+    # ------------------------------------------------------------------
+    # 文本驻留
+    # ------------------------------------------------------------------
+
+    def _is_pooled(self, text) -> bool:
+        return isinstance(text, str) and len(text) >= self.intern_min_chars
+
+    def _intern(self, text):
+        if not self._is_pooled(text):
+            return text
+        slot = self._pool.get(text)
+        if slot is None:
+            slot = self._pool[text] = [text, 0]
+            self.pool_bytes += sys.getsizeof(text)
+        else:
+            self.interned_refs += 1
+        slot[1] += 1
+        return slot[0]
+
+    def _release(self, text):
+        if not self._is_pooled(text):
+            return
+        slot = self._pool.get(text)
+        if slot is None:
+            return
+        slot[1] -= 1
+        if slot[1] <= 0:
+            del self._pool[text]
+            self.pool_bytes -= sys.getsizeof(text)
+        else:
+            self.interned_refs -= 1
+
+    # ------------------------------------------------------------------
+    # 记录增删与淘汰
+    # ------------------------------------------------------------------
+
+    def _compact(self, doc_id: str, body: dict) -> Optional[_Record]:
+        try:
+            memory = json.loads(body["memory"]) if isinstance(body.get("memory"), str) else body.get("memory")
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(memory, dict) or not body.get("session_name") or not body.get("trace_id"):
+            return None
+        memory = dict(memory)
+        react_memory = memory.pop("react_memory", None)
+        if not isinstance(react_memory, list) or not all(isinstance(m, dict) and set(m) == {"role", "content"}
+                                                         for m in react_memory):
+            if react_memory is not None:
+                memory["react_memory"] = react_memory
+            react_memory = []
+        query, answer = memory.pop("query", ""), memory.pop("answer", "")
+        record = _Record(
+            doc_id, body["session_name"], body["trace_id"], body.get("create_time", ""),
+            self._intern(query), self._intern(answer),
+            tuple((m["role"], self._intern(m["content"])) for m in react_memory),
+            memory or None,
+        )
+        record.size = RECORD_OVERHEAD + sum(
+            sys.getsizeof(t) for t in record.texts() if isinstance(t, str) and not self._is_pooled(t)
+        ) + (len(json.dumps(record.extra, ensure_ascii=False)) if record.extra else 0)
+        return record
+
+    def _remove(self, doc_id: str) -> Optional[_Record]:
+        record = self._records.pop(doc_id, None)
+        if record is None:
+            return None
+        self._by_session.pop((record.session_name, record.trace_id), None)
+        self.record_bytes -= record.size
+        for text in record.texts():
+            self._release(text)
+        if record.dirty:
+            self._dirty -= 1
+        return record
+
+    def _over_limit(self) -> bool:
+        return len(self._records) > self.max_sessions or self.record_bytes + self.pool_bytes > self.max_bytes
+
+    async def _persist(self, records: List[_Record]):
+        for record in records:
+            try:
+                await self._inner.index(self.index_name, record.doc_id, record.body())
+                self.flushed += 1
+            finally:
+                self._writing.pop(record.doc_id, None)
+
+    async def index(self, index_name, doc_id, body):
+        if index_name != self.index_name:
+            return await self._inner.index(index_name, doc_id, body)
+        record = self._compact(doc_id, body)
+        if record is None:
+            return await self._inner.index(index_name, doc_id, body)
+        self._remove(doc_id)
+        self._records[doc_id] = record
+        self._by_session[(record.session_name, record.trace_id)] = doc_id
+        self.record_bytes += record.size
+        self._dirty += 1
+
+        victims = []
+        while self._over_limit() and len(self._records) > 1:
+            victim = self._remove(next(iter(self._records)))
+            self.evicted += 1
+            if victim.dirty:
+                # 记录本身仍持有文本，移出内存后照样可以编码写入
+                self._writing[victim.doc_id] = victim
+                victims.append(victim)
+        if self._dirty >= self.flush_every:
+            victims.extend(self._take_dirty())
+        if victims:
+            await self._persist(victims)
+        return {"_id": doc_id, "result": "created"}
+
+    def _take_dirty(self) -> List[_Record]:
+        """取出待写入的记录并登记到 _writing，写完之前被淘汰也能查到"""
+        dirty = [r for r in self._records.values() if r.dirty]
+        for record in dirty:
+            record.dirty = False
+            self._writing[record.doc_id] = record
+        self._dirty = 0
+        return dirty
+
+    async def flush(self):
+        """把内存中未写入的记录写入持久存储"""
+        await self._persist(self._take_dirty())
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_query(query: dict) -> Optional[Tuple[List[str], str]]:
+        """只处理 OxyGent 读取短期记忆的查询：trace_id in [...] 且 session_name == ..."""
+        must = query.get("bool", {}).get("must") if isinstance(query, dict) else None
+        if not isinstance(must, list):
+            return None
+        trace_ids, session_name = None, None
+        for cond in must:
+            if "terms" in cond and "trace_id" in cond["terms"]:
+                trace_ids = cond["terms"]["trace_id"]
+            elif "term" in cond and "session_name" in cond["term"]:
+                session_name = cond["term"]["session_name"]
+            else:
+                return None
+        if not isinstance(trace_ids, list) or not isinstance(session_name, str):
+            return None
+        return trace_ids, session_name
+
+    @staticmethod
+    def _hit(record: _Record) -> dict:
+        return {"_id": record.doc_id, "_source": record.body()}
+
+    async def search(self, index_name, body):
+        if index_name != self.index_name:
+            return await self._inner.search(index_name, body)
+        parsed = self._parse_query(body.get("query", {}))
+        if parsed is None:
+            await self.flush()
+            return await self._inner.search(index_name, body)
+
+        trace_ids, session_name = parsed
+        resident: Dict[str, _Record] = {}
+        for trace_id in dict.fromkeys(trace_ids):
+            doc_id = self._by_session.get((session_name, trace_id))
+            if doc_id is not None:
+                self._records.move_to_end(doc_id)
+                resident[doc_id] = self._records[doc_id]
+        resident.update({
+            r.doc_id: r for r in self._writing.values() if r.session_name == session_name and r.trace_id in trace_ids
+        })
+        hits = [self._hit(r) for r in resident.values()]
+        if len(resident) < len(set(trace_ids)):
+            self.misses += 1
+            response = await self._inner.search(index_name, body)
+            for hit in response["hits"]["hits"]:
+                if hit["_id"] not in resident:
+                    hits.append(hit)
+        else:
+            self.hits += 1
+        for sort in body.get("sort", []):
+            for field, order in sort.items():
+                direction = order.get("order", "asc") if isinstance(order, dict) else order
+                hits.sort(key=lambda h: h["_source"].get(field, ""), reverse=direction == "desc")
+        return {"hits": {"hits": hits[: body.get("size", 10)]}}
+
+    async def close(self):
+        await self.flush()
+        return await self._inner.close()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._records),
+            "record_mb": round(self.record_bytes / 1024 / 1024, 2),
+            "pool_mb": round(self.pool_bytes / 1024 / 1024, 2),
+            "pooled_texts": len(self._pool),
+            "shared_refs": self.interned_refs,
+            "evicted": self.evicted,
+            "flushed": self.flushed,
+            "pending": self._dirty,
+            "memory_hits": self.hits,
+            "store_lookups": self.misses,
+        }
+
+
+def install_session_store(**kwargs) -> SessionStore:
+    """让 MAS 通过 DBFactory 拿到 SessionStore；未创建 ES 客户端时按 MAS 的规则先创建"""
+    factory = DBFactory()
+    if isinstance(factory._instance, SessionStore):
+        return factory._instance
+    if factory._instance is None:
+        if Config.get_es_config():
+            es_config = Config.get_es_config()
+            factory._instance = JesEs(es_config["hosts"], es_config["user"], es_config["password"])
+            factory._created_class = JesEs
+        else:
+            factory._instance = LocalEs()
+            factory._created_class = LocalEs
+    factory._instance = SessionStore(factory._instance, **kwargs)
+    return factory._instance
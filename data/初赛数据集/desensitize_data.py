@@ -1,9 +1,21 @@
 import os
 import re
+import json
 import argparse
+import functools
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import logging
 import platform
+import sys
+
+# 普通 JSON 文件复用 util/trace_analytics 中的增量解析
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from util.trace_analytics import scan_json_object  # noqa: E402
 
 # 配置日志
 logging.basicConfig(
@@ -12,36 +24,167 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 流式处理时每次读取的字符数，以及相邻分块之间保留的重叠长度（单个键值对不超过该长度）
+CHUNK_SIZE = 4 * 1024 * 1024
+OVERLAP_SIZE = 64 * 1024
+ENCODINGS = ['utf-8', 'gbk', 'latin-1', 'utf-16']
+
+
+@functools.lru_cache(maxsize=32)
+def build_pattern(sensitive_fields):
+    """根据敏感字段构建并缓存正则：匹配任意转义层级的 "key": "value"，如 \\"key\\": \\"value\\"
+
+    正则以 "key 字面量开头，便于快速定位；键前面的反斜杠在替换函数中核对。
+    """
+    fields = '|'.join(re.escape(field) for field in sensitive_fields)
+    # q 为键结束引号前的反斜杠，值使用同一层转义
+    return re.compile(rf'(?P<key>"(?:{fields})(?P<q>\\*)"):\s*(?P=q)"[^"]*(?P=q)"')
+
+
+def _replace_match(match):
+    # 保留键和引号结构，只替换值部分
+    q = match.group('q')
+    if q and not match.string.endswith(q, 0, match.start()):
+        return match.group(0)  # 键前后的转义层级不一致，不是完整的键值对
+    return f'{match.group("key")}: {q}"{q}"'
+
 
 def desensitize_content(content, sensitive_fields):
     """对内容中的敏感字段进行脱敏处理"""
-    # 处理每个敏感字段
-    patterns = []
-    for field in sensitive_fields:
-        # 构建正则表达式模式，匹配键值对
-        # 处理普通引号格式 "key": "value"
-        patterns.append(rf'"{field}":\s*"[^"]*"')
-        # 处理转义引号格式 \"key\": \"value\"
-        patterns.append(rf'\\"{field}\\\":\s*\\\"[^"]*\\\"')
-
-    # 组合所有模式
-    pattern = r'(' + r'|'.join(patterns) + r')'
-
-    # 定义替换函数
-    def replace_match(match):
-        match_str = match.group(0)
-        # 保留键和引号结构，只替换值部分
-        if '\\"' in match_str:
-            return re.sub(r':\s*\\\"[^"]*\\\"', r': \\"\\"', match_str)
+    return build_pattern(tuple(sorted(sensitive_fields))).sub(_replace_match, content)
+
+
+def desensitize_stream(fin, fout, sensitive_fields, chunk_size=CHUNK_SIZE, overlap=OVERLAP_SIZE):
+    """分块读取并脱敏，返回是否有内容被替换
+
+    每块末尾 overlap 长度内的内容留到下一块一起处理，跨块的键值对因此不会被截断；
+    跨过分界点的匹配整体归入当前块。
+    """
+    pattern = build_pattern(tuple(sorted(sensitive_fields)))
+    carry = ''
+    changed = False
+    while True:
+        chunk = fin.read(chunk_size)
+        buffer = carry + chunk
+        if not chunk:
+            cut = len(buffer)
         else:
-            return re.sub(r':\s*"[^"]*"', r': ""', match_str)
-
-    # 执行替换
-    content = re.sub(pattern, replace_match, content)
-    return content
+            cut = max(len(buffer) - overlap, 0)
+            while cut > 0 and buffer[cut - 1] == '\\':
+                cut -= 1  # 键前的转义反斜杠与键留在同一块
+        out, pos = [], 0
+        for match in pattern.finditer(buffer):
+            if match.start() >= cut:
+                break
+            replaced = _replace_match(match)
+            out.append(buffer[pos:match.start()])
+            out.append(replaced)
+            pos = match.end()
+            changed = changed or replaced != match.group(0)
+        cut = max(cut, pos)
+        out.append(buffer[pos:cut])
+        fout.write(''.join(out))
+        carry = buffer[cut:]
+        if not chunk:
+            return changed
+
+
+def desensitize_json_value(value, sensitive_fields):
+    """JSON 模式：递归置空敏感键的值；字符串里嵌套的 JSON（任意转义层级）解析后同样处理
+
+    返回 (新值, 是否有改动)，没有改动的字符串保持原样，不会被重新序列化。
+    """
+    if isinstance(value, dict):
+        changed = False
+        result = {}
+        for k, v in value.items():
+            if k in sensitive_fields:
+                result[k] = ''
+                changed = changed or v != ''
+            else:
+                result[k], sub_changed = desensitize_json_value(v, sensitive_fields)
+                changed = changed or sub_changed
+        return result, changed
+    if isinstance(value, list):
+        items = [desensitize_json_value(v, sensitive_fields) for v in value]
+        return [v for v, _ in items], any(c for _, c in items)
+    if isinstance(value, str):
+        text = value.strip()
+        if text[:1] in ('{', '[') and any(field in text for field in sensitive_fields):
+            try:
+                nested = json.loads(text)
+            except ValueError:
+                return desensitize_content(value, sensitive_fields), True
+            nested, changed = desensitize_json_value(nested, sensitive_fields)
+            if changed:
+                return json.dumps(nested, ensure_ascii=False), True
+    return value, False
+
+
+def desensitize_json_stream(fin, fout, sensitive_fields, is_jsonl):
+    """JSON 模式：JSON Lines 按行流式处理，普通 JSON 文件按顶层键值对增量解析
+
+    未改动的行 / 键值对原样写出，改动的部分以紧凑格式写出，不重新排版整个文件。
+    """
+    fields = set(sensitive_fields)
+    changed = False
+    if is_jsonl:
+        for line in fin:
+            if not line.strip():
+                fout.write(line)
+                continue
+            try:
+                obj, line_changed = desensitize_json_value(json.loads(line), fields)
+            except ValueError:
+                # 非法的行退回正则处理
+                new_line = desensitize_content(line, sensitive_fields)
+                changed = changed or new_line != line
+                fout.write(new_line)
+                continue
+            changed = changed or line_changed
+            fout.write(json.dumps(obj, ensure_ascii=False) + '\n' if line_changed else line)
+        return changed
+    if _first_char(fin) != '{':
+        # 顶层不是对象（数组等）时整体解析，没有改动则原样复制
+        obj, changed = desensitize_json_value(json.load(fin), fields)
+        fin.seek(0)
+        if changed:
+            json.dump(obj, fout, ensure_ascii=False)
+        else:
+            shutil.copyfileobj(fin, fout)
+        return changed
+    for key, value, before, text in scan_json_object(fin, CHUNK_SIZE, raw=True):
+        fout.write(before)
+        if key is None:
+            break
+        value, value_changed = desensitize_json_value(value, fields)
+        changed = changed or value_changed
+        fout.write(json.dumps(value, ensure_ascii=False) if value_changed else text)
+    return changed
+
+
+def _first_char(fin):
+    """返回文件第一个非空白字符，读完后回到文件开头"""
+    while True:
+        char = fin.read(1)
+        if not char.isspace():
+            fin.seek(0)
+            return char
+
+
+def _open_output(output_dir, new_base_name, ext):
+    """以独占方式创建输出文件，多进程同时处理时也不会重名覆盖"""
+    counter = 0
+    while True:
+        suffix = f"_{counter}" if counter else ""
+        output_file_path = os.path.join(output_dir, f"{new_base_name}{suffix}{ext}")
+        try:
+            return output_file_path, open(output_file_path, 'x', encoding='utf-8', newline='')
+        except FileExistsError:
+            counter += 1
 
 
-def desensitize_file(input_file_path, prefix, sensitive_fields, output_dir):
+def desensitize_file(input_file_path, prefix, sensitive_fields, output_dir, json_mode=False):
     """对单个文件进行脱敏处理"""
     file_name = os.path.basename(input_file_path)
 
@@ -50,83 +193,71 @@ def desensitize_file(input_file_path, prefix, sensitive_fields, output_dir):
         logger.debug(f"文件 {file_name} 不以指定前缀 {prefix} 开头，跳过处理")
         return False
 
-    try:
-        # 尝试多种编码读取文件
-        encodings = ['utf-8', 'gbk', 'latin-1', 'utf-16']
-        content = None
+    # 获取当前时间到秒，格式化为字符串
+    current_time = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    # 构建输出文件名: 保留原文件名，在前缀后添加时间戳
+    base_name = os.path.splitext(file_name)[0]
+    ext = os.path.splitext(file_name)[1]
 
-        for encoding in encodings:
+    # 处理前缀后的文件名部分
+    if base_name.startswith(prefix):
+        suffix = base_name[len(prefix):]
+        # 移除可能存在的分隔符
+        if suffix.startswith(('_', '-')):
+            suffix = suffix[1:]
+        new_base_name = f"{prefix}_{current_time}_{suffix}"
+    else:
+        new_base_name = f"{prefix}_{current_time}_{base_name}"
+
+    output_file_path, fout = _open_output(output_dir, new_base_name, ext)
+    try:
+        # 依次尝试多种编码；解码失败时清空输出重新处理，统一以 utf-8 写出
+        changed = None
+        for encoding in ENCODINGS:
+            fout.seek(0)
+            fout.truncate()
             try:
-                with open(input_file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
+                with open(input_file_path, 'r', encoding=encoding, newline='') as fin:
+                    if json_mode and ext in ('.json', '.jsonl'):
+                        changed = desensitize_json_stream(fin, fout, sensitive_fields, is_jsonl=ext == '.jsonl')
+                    else:
+                        changed = desensitize_stream(fin, fout, sensitive_fields)
                 break
-            except UnicodeDecodeError:
+            except UnicodeError:
                 continue
-            except Exception as e:
-                logger.warning(f"使用编码 {encoding} 读取文件 {input_file_path} 时出错: {str(e)}")
+            except ValueError as e:
+                # JSON 解析失败，退回正则模式
+                logger.warning(f"文件 {file_name} 不是合法的 JSON，改用正则脱敏: {str(e)}")
+                fout.seek(0)
+                fout.truncate()
+                with open(input_file_path, 'r', encoding=encoding, newline='') as fin:
+                    changed = desensitize_stream(fin, fout, sensitive_fields)
+                break
+        fout.close()
 
-        if content is None:
+        if changed is None:
             logger.error(f"无法解码文件 {input_file_path}，尝试了多种编码")
+            os.remove(output_file_path)
             return False
-
-        # 脱敏处理
-        desensitized_content = desensitize_content(content, sensitive_fields)
-
-        # 如果内容没有变化，可能是没有找到敏感字段
-        if desensitized_content == content:
-            # logger.info(f"文件 {file_name} 中未发现需要脱敏的字段")
-            1
-        else:
+        if changed:
             logger.info(f"文件 {file_name} 中发现需要脱敏的字段")
-        # 获取当前时间到秒，格式化为字符串
-        current_time = datetime.now().strftime("%Y%m%d%H%M%S")
-
-        # 构建输出文件名: 保留原文件名，在前缀后添加时间戳
-        base_name = os.path.splitext(file_name)[0]
-        ext = os.path.splitext(file_name)[1]
-
-        # 处理前缀后的文件名部分
-        if base_name.startswith(prefix):
-            suffix = base_name[len(prefix):]
-            # 移除可能存在的分隔符
-            if suffix.startswith(('_', '-')):
-                suffix = suffix[1:]
-            new_base_name = f"{prefix}_{current_time}_{suffix}"
-        else:
-            new_base_name = f"{prefix}_{current_time}_{base_name}"
-
-        output_file_name = f"{new_base_name}{ext}"
-        output_file_path = os.path.join(output_dir, output_file_name)
-
-        # 检查输出文件是否已存在
-        counter = 1
-        while os.path.exists(output_file_path):
-            output_file_name = f"{new_base_name}_{counter}{ext}"
-            output_file_path = os.path.join(output_dir, output_file_name)
-            counter += 1
-
-        # 写入脱敏后的内容，统一使用utf-8编码
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            f.write(desensitized_content)
 
         logger.info(f"脱敏完成，新文件保存至：{output_file_path}")
         return True
 
     except Exception as e:
+        fout.close()
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
         logger.error(f"处理文件 {input_file_path} 时出错：{str(e)}", exc_info=True)
         return False
 
 
-def process_directory(directory, prefix, sensitive_fields, output_dir, recursive=False):
-    """处理目录中的文件，可选择是否递归处理子目录"""
-    if not os.path.isdir(directory):
-        logger.error(f"目录 {directory} 不存在或不是一个有效的目录")
-        return 0
-
-    processed_count = 0
-
-    # 遍历目录下的所有条目
-    for entry in os.listdir(directory):
+def collect_files(directory, recursive=False, exclude_dir=None):
+    """列出目录中需要处理的文件，可选择是否递归处理子目录"""
+    files = []
+    for entry in sorted(os.listdir(directory)):
         entry_path = os.path.join(directory, entry)
 
         # 处理系统特定的特殊文件
@@ -136,15 +267,30 @@ def process_directory(directory, prefix, sensitive_fields, output_dir, recursive
             continue  # 跳过隐藏文件
 
         if os.path.isfile(entry_path):
-            if desensitize_file(entry_path, prefix, sensitive_fields, output_dir):
-                processed_count += 1
+            files.append(entry_path)
         elif os.path.isdir(entry_path) and recursive:
-            # 如果是目录且需要递归处理，则递归调用
+            if exclude_dir and os.path.abspath(entry_path) == os.path.abspath(exclude_dir):
+                continue  # 不重复处理输出目录
             logger.info(f"进入子目录：{entry_path}")
-            sub_count = process_directory(entry_path, prefix, sensitive_fields, output_dir, recursive)
-            processed_count += sub_count
+            files.extend(collect_files(entry_path, recursive, exclude_dir))
+    return files
+
+
+def process_directory(directory, prefix, sensitive_fields, output_dir, recursive=False, workers=None, json_mode=False):
+    """处理目录中的文件，多个文件时用进程池并行处理"""
+    if not os.path.isdir(directory):
+        logger.error(f"目录 {directory} 不存在或不是一个有效的目录")
+        return 0
 
-    return processed_count
+    files = [f for f in collect_files(directory, recursive, output_dir) if os.path.basename(f).startswith(prefix)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(files) <= 1:
+        return sum(1 for f in files if desensitize_file(f, prefix, sensitive_fields, output_dir, json_mode))
+
+    task = functools.partial(desensitize_file, prefix=prefix, sensitive_fields=list(sensitive_fields),
+                             output_dir=output_dir, json_mode=json_mode)
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        return sum(1 for ok in pool.map(task, files) if ok)
 
 
 def main():
@@ -153,9 +299,12 @@ def main():
     parser.add_argument('--directory', required=True, help='文件所在目录')
     parser.add_argument('--prefix', required=True, help='要处理的文件前缀')
     parser.add_argument('--output_dir', help='脱敏后文件的输出目录，默认为输入目录下的desensitized子目录')
-    parser.add_argument('--sensitive_fields', default=["api_key"],
+    parser.add_argument('--sensitive_fields', nargs='+', default=["api_key"],
                         help='需要脱敏的字段列表，默认为 ["api_key"]')
     parser.add_argument('--recursive', action='store_true', help='是否递归处理子目录', default=False)
+    parser.add_argument('--workers', type=int, default=None, help='并行处理的进程数，默认为 CPU 核数')
+    parser.add_argument('--json', action='store_true', default=False,
+                        help='按 JSON 解析 .json/.jsonl 文件，任意嵌套和转义层级的敏感键都会被置空')
     parser.add_argument('--verbose', action='store_true', help='显示详细日志信息', default=True)
 
     args = parser.parse_args()
@@ -176,7 +325,8 @@ def main():
         return
 
     # 处理目录中的文件
-    processed_count = process_directory(args.directory, args.prefix, args.sensitive_fields, output_dir, args.recursive)
+    processed_count = process_directory(args.directory, args.prefix, args.sensitive_fields, output_dir,
+                                        args.recursive, args.workers, args.json)
 
     if processed_count == 0:
         logger.info("未找到符合条件的文件进行处理")
@@ -186,4 +336,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,260 @@
+"""
+无界面批量评测入口
+读取 data/初赛数据集 下 valid / test 的 data.jsonl，按并发上限把任务交给 master agent，
+每完成一个任务就写入断点文件，中断后重新运行会跳过已完成的任务。
+结果按 README 要求写成 JSON Lines 提交文件；在验证集上额外输出分级准确率与 p50/p95 耗时。
+
+用法:
+    python -m service.batch_runner --split valid --concurrency 8
+    python -m service.batch_runner --split test --output result.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+from util.dataset import SPLIT_DIRS, TaskDataset, resolve_attachments, resolve_split_dir
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_DIR = os.path.join(PROJECT_ROOT, "cache_dir", "batch")
+
+
+def load_tasks(split_dir: str) -> List[dict]:
+    """按文件顺序读取全部任务，存在解析失败的行时直接报错而不是静默跳过"""
+    with TaskDataset(split_dir) as dataset:
+        if dataset.bad_lines:
+            bad = dataset.bad_lines[0]
+            raise ValueError(f"data.jsonl 第 {bad['lineno']} 行解析失败: {bad['error']}")
+        return list(dataset)
+
+
+def build_payload(task: dict, split_dir: str) -> dict:
+    """把数据集中的一条任务转换为 chat_with_agent 的 payload"""
+    payload = {"query": task["query"]}
+    attachments = resolve_attachments(split_dir, task.get("file_name"))
+    if attachments:
+        # 绝对路径在 chat_with_agent 中不会被拼接到 uploads 目录下
+        payload["attachments"] = attachments
+    return payload
+
+
+def clean_answer(output) -> str:
+    """去掉思考过程等多余内容，只保留最终答案"""
+    answer = "" if output is None else str(output)
+    if "</think>" in answer:
+        answer = answer.split("</think>")[-1]
+    return answer.strip()
+
+
+def normalize_answer(answer: str) -> str:
+    """准精确匹配前的规范化：去空白、统一标点与数字格式"""
+    text = str(answer).strip().strip("。.").replace("，", ",").replace("：", ":")
+    text = re.sub(r"\s*,\s*", ",", text)
+    text = re.sub(r"\s+", " ", text)
+    if re.fullmatch(r"-?\d{1,3}(,\d{3})+(\.\d+)?", text):
+        text = text.replace(",", "")  # 千分位
+    try:
+        number = float(text)
+        return str(int(number)) if number.is_integer() else str(round(number, 6))
+    except ValueError:
+        return text.lower()
+
+
+def is_correct(prediction: str, answer: str) -> bool:
+    return normalize_answer(prediction) == normalize_answer(answer)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    low, high = int(k), min(int(k) + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    """读取断点文件，只保留成功完成的任务；同一任务以最后一次记录为准"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as fin:
+        for line in fin:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 进程崩溃时可能留下半行
+            if record.get("status") == "ok":
+                done[record["task_id"]] = record
+            else:
+                done.pop(record.get("task_id"), None)
+    return done
+
+
+def report(tasks: List[dict], records: Dict[str, dict]) -> dict:
+    """统计分级准确率与耗时分位数"""
+    levels = {}
+    for task in tasks:
+        if "answer" not in task:
+            continue
+        stat = levels.setdefault(str(task.get("level")), {"total": 0, "correct": 0})
+        stat["total"] += 1
+        record = records.get(task["task_id"])
+        if record and is_correct(record["answer"], task["answer"]):
+            stat["correct"] += 1
+    latencies = [r["latency"] for r in records.values() if "latency" in r]
+    summary = {
+        "levels": {k: dict(v, accuracy=v["correct"] / v["total"]) for k, v in sorted(levels.items())},
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "finished": len(records),
+        "total": len(tasks),
+    }
+    total = sum(v["total"] for v in levels.values())
+    if total:
+        summary["accuracy"] = sum(v["correct"] for v in levels.values()) / total
+    return summary
+
+
+def write_submission(tasks: List[dict], records: Dict[str, dict], output_path: str):
+    """按数据集顺序写出提交文件，未完成的任务答案留空，保证 task_id 无遗漏"""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as fout:
+        for task in tasks:
+            record = records.get(task["task_id"], {})
+            fout.write(json.dumps({"task_id": task["task_id"], "answer": record.get("answer", "")},
+                                  ensure_ascii=False) + "\n")
+
+
+async def run_batch(
+    mas,
+    tasks: List[dict],
+    split_dir: str,
+    checkpoint_path: str,
+    concurrency: int = 8,
+    task_timeout: Optional[float] = None,
+) -> Dict[str, dict]:
+    """并发执行未完成的任务，每个任务结束后立即追加到断点文件"""
+    from oxygent.schemas import OxyState
+
+    records = load_checkpoint(checkpoint_path)
+    pending = [t for t in tasks if t["task_id"] not in records]
+    print(f"共 {len(tasks)} 个任务，已完成 {len(records)} 个，待执行 {len(pending)} 个")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+
+    async def handle(task: dict, fout):
+        async with semaphore:
+            start = time.perf_counter()
+            record = {"task_id": task["task_id"], "level": str(task.get("level"))}
+            try:
+                response = await asyncio.wait_for(
+                    mas.chat_with_agent(payload=build_payload(task, split_dir)), timeout=task_timeout
+                )
+                if response.state is OxyState.COMPLETED:
+                    record.update(status="ok", answer=clean_answer(response.output))
+                else:
+                    # agent 运行失败时 MAS 返回 FAILED 状态而不是抛异常，记为 error，续跑时重试
+                    error = f"{response.state.name}: {str(response.output)[:500]}"
+                    record.update(status="error", answer="", error=error)
+            except Exception as e:
+                record.update(status="error", answer="", error=f"{type(e).__name__}: {e}")
+            record["latency"] = round(time.perf_counter() - start, 3)
+        async with write_lock:
+            fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            fout.flush()
+            if record["status"] == "ok":
+                records[task["task_id"]] = record
+        print(f"[{len(records)}/{len(tasks)}] {task['task_id']} {record['status']} {record['latency']}s")
+
+    with open(checkpoint_path, "a", encoding="utf-8") as fout:
+        await asyncio.gather(*(handle(task, fout) for task in pending))
+    return records
+
+
+async def main(args):
+    from oxygent import MAS
+    from service.main_oxy import (
+        attachment_prep, http_cache, llm_cache, llm_schedulers, log_writer, mcp_pools, oxy_space, passthrough,
+        plan_library, prompt_accountant, python_pool, session_store, speculator,
+    )
+
+    split_dir = resolve_split_dir(args.split)
+    tasks = load_tasks(split_dir)
+    if args.limit:
+        tasks = tasks[: args.limit]
+    checkpoint_path = args.checkpoint or os.path.join(BATCH_DIR, f"{args.split}_checkpoint.jsonl")
+    output_path = args.output or os.path.join(BATCH_DIR, f"{args.split}_result.jsonl")
+
+    if attachment_prep:
+        # 派发任务前用进程池预处理全部附件，任务执行时直接命中缓存
+        from util.attachment_prep import prepare_attachments
+        paths = [p for t in tasks for p in resolve_attachments(split_dir, t.get("file_name")) if os.path.isfile(p)]
+        await asyncio.to_thread(prepare_attachments, paths, args.prep_workers)
+
+    async with MAS(oxy_space=oxy_space) as mas:
+        records = await run_batch(mas, tasks, split_dir, checkpoint_path, args.concurrency, args.timeout)
+
+    write_submission(tasks, records, output_path)
+    print(f"✅ 提交文件已写入: {output_path}")
+    summary = report(tasks, records)
+    for level, stat in summary["levels"].items():
+        print(f"level {level}: {stat['correct']}/{stat['total']} = {stat['accuracy']:.2%}")
+    if "accuracy" in summary:
+        print(f"总准确率: {summary['accuracy']:.2%}")
+    print(f"耗时 p50={summary['p50']:.2f}s p95={summary['p95']:.2f}s，完成 {summary['finished']}/{summary['total']}")
+    if llm_cache:
+        summary["llm_cache"] = llm_cache.stats()
+        print(f"LLM 缓存统计: {summary['llm_cache']}")
+    if llm_schedulers:
+        summary["llm_schedulers"] = {name: scheduler.stats() for name, scheduler in llm_schedulers.items()}
+        print(f"LLM 调度统计: {summary['llm_schedulers']}")
+    if prompt_accountant:
+        summary["prompt_tokens"] = prompt_accountant.stats()
+        print(f"prompt token 统计: {summary['prompt_tokens']}")
+    if http_cache:
+        summary["http_cache"] = http_cache.stats()
+        print(f"网页缓存统计: {summary['http_cache']}")
+    if speculator:
+        summary["speculative"] = speculator.stats()
+        print(f"投机执行统计: {summary['speculative']}")
+    if passthrough:
+        summary["passthrough"] = passthrough.stats()
+        print(f"结果直通统计: {summary['passthrough']}")
+    if plan_library:
+        summary["plan_library"] = plan_library.stats()
+        print(f"计划复用统计: {summary['plan_library']}")
+    if mcp_pools:
+        summary["mcp_pools"] = {name: pool.stats() for name, pool in mcp_pools.items()}
+        print(f"MCP 进程池统计: {summary['mcp_pools']}")
+    if python_pool:
+        summary["python_pool"] = python_pool.stats()
+        print(f"python 进程池统计: {summary['python_pool']}")
+    if session_store:
+        summary["session_store"] = session_store.stats()
+        print(f"会话存储统计: {summary['session_store']}")
+    if log_writer:
+        summary["log"] = log_writer.stats()
+        print(f"日志统计: {summary['log']}")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量运行数据集任务并生成提交文件")
+    parser.add_argument("--split", choices=sorted(SPLIT_DIRS), default="valid", help="数据集：valid 或 test")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时执行的任务数")
+    parser.add_argument("--timeout", type=float, default=None, help="单个任务超时时间（秒）")
+    parser.add_argument("--limit", type=int, default=0, help="只运行前 N 个任务，0 表示全部")
+    parser.add_argument("--prep-workers", type=int, default=None, help="附件预处理的进程数，默认为 CPU 核数")
+    parser.add_argument("--checkpoint", help="断点文件路径，默认 cache_dir/batch/{split}_checkpoint.jsonl")
+    parser.add_argument("--output", help="提交文件路径，默认 cache_dir/batch/{split}_result.jsonl")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
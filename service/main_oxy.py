@@ -1,5 +1,20 @@
 from agents.all_agents import *
 from tools.pre_tools import *
+from dao.llm_cache import LLMCache, enable_llm_cache
+from util.llm_scheduler import enable_llm_scheduler
+from agents.intent_router import IntentRouter, enable_intent_router
+from agents.speculative import SpeculativeRouter, enable_speculative_routing
+from agents.passthrough import enable_passthrough
+from agents.plan_library import PlanLibrary, enable_plan_library
+from agents.prompt_budget import PromptAccountant, enable_prompt_accounting
+from agents.registry import enable_lazy_startup
+from dao.local_es_store import install_sqlite_es
+from dao.session_store import install_session_store
+from dao.http_cache import ResponseCache, enable_http_cache
+from util.attachment_prep import enable_attachment_prep
+from tools.mcp_pool import enable_mcp_pools
+from tools.python_pool import enable_python_pool
+from util.structured_log import enable_structured_logging, parse_sample_rates
 ## plan_parser = PydanticOutputParser(Plan)  ## 目的解释器
 ## action_parser = PydanticOutputParser(Action) ## 行动解释器
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -35,11 +50,142 @@ oxy_space = [
     firecrawl_agent,
 ]
 
+# 异步结构化日志（默认关闭，仍由 OxyGent 同步写 cache_dir/app.log），在 .env 中设置 STRUCTURED_LOG_ENABLED=1 开启：
+# 后台线程写 cache_dir/app.jsonl，按 LOG_MAX_MB 轮转压缩；LOG_PAYLOAD_CHARS=0 时完整输入输出只保存在 trace 存储中
+log_writer = None
+if (get_env_var("STRUCTURED_LOG_ENABLED") or "").lower() in ("1", "true", "yes"):
+    log_writer = enable_structured_logging(
+        oxy_space,
+        os.path.join(PROJECT_ROOT, "cache_dir", "app.jsonl"),
+        max_bytes=int(get_env_var("LOG_MAX_MB") or 20) * 1024 * 1024,
+        backup_count=int(get_env_var("LOG_BACKUPS") or 5),
+        payload_chars=int(get_env_var("LOG_PAYLOAD_CHARS") or 300),
+        sample_rates=parse_sample_rates(get_env_var("LOG_SAMPLE")),
+    )
+
+# LLM 自适应并发调度（默认关闭，仍使用上面固定的 semaphore），在 .env 中设置 LLM_SCHEDULER_ENABLED=1 开启
+# 需在 LLM 缓存之前挂上，缓存命中的调用不必排队
+llm_schedulers = {}
+if (get_env_var("LLM_SCHEDULER_ENABLED") or "").lower() in ("1", "true", "yes"):
+    llm_schedulers = enable_llm_scheduler(
+        oxy_space,
+        max_limit=int(get_env_var("LLM_MAX_CONCURRENCY") or 16),
+        tokens_per_minute=int(get_env_var("LLM_TPM_LIMIT") or 0),
+        agent_priority={"planner": -1},  # 重规划阻塞着整个任务，优先放行
+    )
+
+# LLM 磁盘缓存（默认关闭），在 .env 中设置 LLM_CACHE_ENABLED=1 开启
+llm_cache = None
+if (get_env_var("LLM_CACHE_ENABLED") or "").lower() in ("1", "true", "yes"):
+    llm_cache = LLMCache(
+        os.path.join(PROJECT_ROOT, "cache_dir", "llm_cache.sqlite"),
+        max_bytes=int(get_env_var("LLM_CACHE_MAX_MB") or 512) * 1024 * 1024,
+    )
+    enable_llm_cache(oxy_space, llm_cache)
+
+# 网页抓取与搜索结果缓存（默认关闭），在 .env 中设置 HTTP_CACHE_ENABLED=1 开启
+http_cache = None
+if (get_env_var("HTTP_CACHE_ENABLED") or "").lower() in ("1", "true", "yes"):
+    http_cache = ResponseCache(
+        os.path.join(PROJECT_ROOT, "cache_dir", "http_cache.sqlite"),
+        max_bytes=int(get_env_var("HTTP_CACHE_MAX_MB") or 256) * 1024 * 1024,
+    )
+    enable_http_cache(all_tools, http_cache)
+
+# 本地 ES 改用 sqlite 存储（默认仍为 OxyGent 的 JSON 文件），在 .env 中设置 LOCAL_ES_BACKEND=sqlite 开启
+if (get_env_var("LOCAL_ES_BACKEND") or "").lower() == "sqlite":
+    install_sqlite_es()
+
+# 会话历史内存存储（默认关闭），在 .env 中设置 SESSION_STORE_ENABLED=1 开启：history 记录以紧凑形式留在内存中，
+# 超过 SESSION_MAX 个会话或 SESSION_MAX_MB 时按 LRU 淘汰到持久存储。需放在 sqlite 存储之后
+session_store = None
+if (get_env_var("SESSION_STORE_ENABLED") or "").lower() in ("1", "true", "yes"):
+    session_store = install_session_store(
+        max_sessions=int(get_env_var("SESSION_MAX") or 2000),
+        max_bytes=int(get_env_var("SESSION_MAX_MB") or 64) * 1024 * 1024,
+    )
+
+# 本地意图路由（默认关闭），在 .env 中设置 INTENT_ROUTER_ENABLED=1 开启
+intent_router = IntentRouter(
+    min_confidence=float(get_env_var("INTENT_ROUTER_MIN_CONFIDENCE") or 0.75),
+    log_path=os.path.join(PROJECT_ROOT, "cache_dir", "router_decisions.jsonl"),
+)
+if (get_env_var("INTENT_ROUTER_ENABLED") or "").lower() in ("1", "true", "yes"):
+    enable_intent_router(master, intent_router)
+
+# 双路径投机执行（默认关闭），在 .env 中设置 SPECULATIVE_ROUTING_ENABLED=1 开启：
+# 路由模棱两可的查询同时交给 executor 与 task_solver，取先通过校验的结果；
+# SPECULATIVE_MAX_CONFIDENCE 设置触发投机的置信度上限（默认与 INTENT_ROUTER_MIN_CONFIDENCE 相同）
+speculator = None
+if (get_env_var("SPECULATIVE_ROUTING_ENABLED") or "").lower() in ("1", "true", "yes"):
+    speculator = SpeculativeRouter(
+        intent_router,
+        max_confidence=float(get_env_var("SPECULATIVE_MAX_CONFIDENCE") or intent_router.min_confidence),
+        log_path=os.path.join(PROJECT_ROOT, "cache_dir", "speculative_runs.jsonl"),
+    )
+    enable_speculative_routing(oxy_space, master, speculator)
+
+# prompt token 统计（默认关闭），在 .env 中设置 PROMPT_ACCOUNTING_ENABLED=1 开启，
+# TOOL_DESC_CONDENSE=1 时只调用子 agent 的 agent（analyser 等）改用精简的工具目录
+prompt_accountant = None
+if (get_env_var("PROMPT_ACCOUNTING_ENABLED") or "").lower() in ("1", "true", "yes"):
+    prompt_accountant = PromptAccountant(
+        context_window=int(get_env_var("LLM_CONTEXT_WINDOW") or 16384),
+        reserved_output=4096,
+        log_path=os.path.join(PROJECT_ROOT, "cache_dir", "prompt_tokens.jsonl"),
+    )
+    condense = (get_env_var("TOOL_DESC_CONDENSE") or "").lower() in ("1", "true", "yes")
+    enable_prompt_accounting(oxy_space, prompt_accountant, condense="auto" if condense else None)
+
+# 路由 agent 结果直通（默认关闭），在 .env 中设置 ANSWER_PASSTHROUGH_ENABLED=1 开启：
+# analyser / master 拿到子 agent 的有效结果后直接返回，不再调用 LLM 复述。需放在其他 LLM 钩子之后
+passthrough = None
+if (get_env_var("ANSWER_PASSTHROUGH_ENABLED") or "").lower() in ("1", "true", "yes"):
+    passthrough = enable_passthrough(oxy_space)
+
+# 计划复用（默认关闭），在 .env 中设置 PLAN_LIBRARY_ENABLED=1 开启：task_solver 成功后保存初始计划，
+# 结构相似（PLAN_LIBRARY_THRESHOLD，默认 0.8）的新查询替换实体后直接复用，不再调用 planner
+plan_library = None
+if (get_env_var("PLAN_LIBRARY_ENABLED") or "").lower() in ("1", "true", "yes"):
+    plan_library = PlanLibrary(
+        os.path.join(PROJECT_ROOT, "cache_dir", "plan_library.jsonl"),
+        threshold=float(get_env_var("PLAN_LIBRARY_THRESHOLD") or 0.8),
+    )
+    enable_plan_library(oxy_space, plan_library)
+
+# stdio MCP 服务进程池（默认关闭），在 .env 中设置 MCP_POOL_SIZE=N 为每个 StdioMCPClient 预启动 N 个进程
+mcp_pools = {}
+if int(get_env_var("MCP_POOL_SIZE") or 0) > 0:
+    mcp_pools = enable_mcp_pools(all_tools, size=int(get_env_var("MCP_POOL_SIZE")))
+
+# python_tools 预热进程池（默认关闭），在 .env 中设置 PYTHON_POOL_SIZE=N 开启：run_python_code 改在 N 个预先导入
+# numpy / pandas 的子进程中执行，PYTHON_TIMEOUT / PYTHON_MEMORY_MB 设置单次执行的超时与内存上限
+python_pool = None
+if int(get_env_var("PYTHON_POOL_SIZE") or 0) > 0:
+    python_pool = enable_python_pool(
+        all_tools,
+        size=int(get_env_var("PYTHON_POOL_SIZE")),
+        timeout=float(get_env_var("PYTHON_TIMEOUT") or 60),
+        memory_mb=int(get_env_var("PYTHON_MEMORY_MB") or 2048),
+    )
+
+# 附件预处理（默认关闭），在 .env 中设置 ATTACHMENT_PREP_ENABLED=1 开启
+attachment_prep = (get_env_var("ATTACHMENT_PREP_ENABLED") or "").lower() in ("1", "true", "yes")
+if attachment_prep:
+    enable_attachment_prep(multimodal_agent)
+
+# 按需启动（默认关闭），在 .env 中设置 LAZY_STARTUP=1 开启：只初始化从 ENTRY_AGENT（默认 master）可达的 agent 和工具，
+# stdio MCP 进程推迟到第一次调用时启动。需放在其他钩子之后
+if (get_env_var("LAZY_STARTUP") or "").lower() in ("1", "true", "yes"):
+    oxy_space = enable_lazy_startup(oxy_space, roots=[get_env_var("ENTRY_AGENT") or "master"])
+
 async def main():
     import asyncio
     
     async with MAS(oxy_space=oxy_space) as mas:
         await mas.start_web_service(first_query="How many chars in 'OxyGent'?")
+    if llm_cache:
+        print(f"LLM 缓存统计: {llm_cache.stats()}")
         
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,127 @@
+"""
+desensitize_data.py 性能对比
+生成与 local_es_data 结构类似的测试文件（api_key 分别出现在普通 JSON 与转义后的嵌套 JSON 字符串中），
+对比原实现（整文件读入、每次调用重建正则、匹配内再 re.sub）与新实现的耗时，并校验两者输出一致。
+
+用法:
+    python test/bench_desensitize.py --size-mb 50 --files 8
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "初赛数据集", "desensitize_data.py")
+
+
+def load_module():
+    spec = importlib.util.spec_from_file_location("desensitize_data", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_desensitize_content(content, sensitive_fields):
+    """原实现，保留用于对比"""
+    patterns = []
+    for field in sensitive_fields:
+        patterns.append(rf'"{field}":\s*"[^"]*"')
+        patterns.append(rf'\\"{field}\\\":\s*\\\"[^"]*\\\"')
+    pattern = r'(' + r'|'.join(patterns) + r')'
+
+    def replace_match(match):
+        match_str = match.group(0)
+        if '\\"' in match_str:
+            return re.sub(r':\s*\\\"[^"]*\\\"', r': \\"\\"', match_str)
+        else:
+            return re.sub(r':\s*"[^"]*"', r': ""', match_str)
+
+    return re.sub(pattern, replace_match, content)
+
+
+def make_document(size_bytes: int, seed: int = 0) -> str:
+    """生成类似 app_node.json 的大 JSON 字典"""
+    rng = random.Random(seed)
+    data, total, i = {}, 0, 0
+    while total < size_bytes:
+        class_attr = {"class_name": "HttpLLM", "api_key": f"sk-{rng.getrandbits(64):x}", "base_url": "https://example.com/v1"}
+        record = {
+            "node_id": f"node{i}",
+            "trace_id": f"trace{i // 20}",
+            "input": json.dumps({"class_attr": class_attr, "arguments": {"query": "查询" * rng.randint(20, 200)}}, ensure_ascii=False),
+            "output": "结果 " * rng.randint(50, 500),
+            "api_key": f"sk-{rng.getrandbits(64):x}",
+        }
+        data[f"node{i}"] = record
+        total += len(record["input"]) + len(record["output"]) * 3
+        i += 1
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36}{elapsed:>8.3f}s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="desensitize_data.py 新旧实现性能对比")
+    parser.add_argument("--size-mb", type=float, default=20, help="单个测试文件大小（MB）")
+    parser.add_argument("--files", type=int, default=4, help="目录模式下的文件数")
+    args = parser.parse_args()
+    module = load_module()
+    fields = ["api_key"]
+
+    content = make_document(int(args.size_mb * 1024 * 1024))
+    print(f"测试文件 {len(content.encode('utf-8')) / 1024 / 1024:.1f} MB")
+
+    legacy, t_legacy = timed("原实现 desensitize_content", legacy_desensitize_content, content, fields)
+    new, t_new = timed("新实现 desensitize_content", module.desensitize_content, content, fields)
+    assert legacy == new, "新旧实现输出不一致"
+    print(f"{'加速比':<36}{t_legacy / t_new:>8.2f}x")
+
+    workdir = tempfile.mkdtemp(prefix="bench_desensitize_")
+    try:
+        src = os.path.join(workdir, "src")
+        os.makedirs(src)
+        for i in range(args.files):
+            with open(os.path.join(src, f"app_{i}.json"), "w", encoding="utf-8") as fout:
+                fout.write(content)
+
+        def legacy_directory():
+            for name in sorted(os.listdir(src)):
+                with open(os.path.join(src, name), "r", encoding="utf-8") as fin:
+                    result = legacy_desensitize_content(fin.read(), fields)
+                with open(os.path.join(workdir, "legacy_" + name), "w", encoding="utf-8") as fout:
+                    fout.write(result)
+
+        def new_directory(workers, json_mode, out):
+            os.makedirs(out)
+            return module.process_directory(src, "app", fields, out, workers=workers, json_mode=json_mode)
+
+        _, t_dir_legacy = timed(f"原实现 目录 x{args.files}", legacy_directory)
+        _, t_dir_serial = timed(f"流式 单进程 目录 x{args.files}", new_directory, 1, False, os.path.join(workdir, "serial"))
+        _, t_dir_pool = timed(f"流式 进程池 目录 x{args.files}", new_directory, None, False, os.path.join(workdir, "pool"))
+        _, t_dir_json = timed(f"JSON 模式 进程池 目录 x{args.files}", new_directory, None, True, os.path.join(workdir, "json"))
+        print(f"{'目录加速比（进程池）':<36}{t_dir_legacy / t_dir_pool:>8.2f}x")
+
+        for name in os.listdir(os.path.join(workdir, "pool")):
+            with open(os.path.join(workdir, "pool", name), "r", encoding="utf-8") as fin:
+                assert fin.read() == legacy, f"{name} 与原实现输出不一致"
+        for name in os.listdir(os.path.join(workdir, "json")):
+            with open(os.path.join(workdir, "json", name), "r", encoding="utf-8") as fin:
+                assert "sk-" not in fin.read(), f"{name} 中仍有未脱敏的 api_key"
+        print("✅ 输出校验通过")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
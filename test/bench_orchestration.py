@@ -0,0 +1,209 @@
+"""
+agent 编排开销基准
+在本进程内启动 util/replay_llm.py 的回放服务，把 LLM 指向它后运行几条录制过的流程，
+统计吞吐量、端到端耗时，以及扣除 LLM 耗时后每一跳（agent / 工具 / LLM 调用）的编排开销。
+不访问网络：stdio MCP 客户端只有在 cache_dir/mcp_tools 中有工具列表缓存时才保留（不会启动进程），
+否则连同依赖它的 agent 一起从 oxy_space 中去掉。
+
+场景:
+    time            time_agent 查询当前时间（ReAct + 本地工具）
+    master          master -> analyser -> ... 的完整路由
+    plan_and_solve  task_solver 的 plan_and_solve_workflow（planner / executor 多轮）
+
+用法:
+    python test/bench_orchestration.py --runs 20 --concurrency 4 --latency 0.05
+    python test/bench_orchestration.py --scenario master --runs 10 --latency 0
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import socket
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+SCENARIOS = {
+    "time": ("time_agent", "current time"),
+    "master": ("master", "How many chars in 'OxyGent'?"),
+    "plan_and_solve": ("task_solver", "列出你能找到的所有MP3文件"),
+}
+
+# 当前请求的统计，子任务继承同一个 dict
+_run_stats = contextvars.ContextVar("run_stats", default=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def point_llms_to(base_url: str):
+    """在导入 service.main_oxy 之前设置，.env 不会覆盖已有的环境变量"""
+    for prefix in ("DEFAULT_LLM", "DEFAULT_VLM"):
+        os.environ[f"{prefix}_BASE_URL"] = base_url
+        os.environ[f"{prefix}_API_KEY"] = "replay"
+        os.environ[f"{prefix}_MODEL_NAME"] = "replay"
+    # 缓存命中会让结果失真
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["HTTP_CACHE_ENABLED"] = "0"
+
+
+def offline_space(oxy_space: list) -> list:
+    """去掉没有工具列表缓存的 stdio MCP 客户端及依赖它的 agent，其余 MCP 客户端推迟启动"""
+    from oxygent.oxy.agents.local_agent import LocalAgent
+    from oxygent.oxy.mcp_tools.stdio_mcp_client import StdioMCPClient
+
+    from agents.registry import MCP_LISTING_DIR, defer_mcp_start
+
+    dropped = set()
+    for oxy in oxy_space:
+        if isinstance(oxy, StdioMCPClient):
+            if os.path.exists(os.path.join(MCP_LISTING_DIR, f"{oxy.name}.json")):
+                defer_mcp_start(oxy)
+            else:
+                dropped.add(oxy.name)
+    changed = True
+    while changed:
+        changed = False
+        for oxy in oxy_space:
+            if isinstance(oxy, LocalAgent) and oxy.name not in dropped and set(oxy.tools or []) & dropped:
+                dropped.add(oxy.name)
+                changed = True
+    for oxy in oxy_space:
+        if isinstance(oxy, LocalAgent):
+            oxy.sub_agents = [n for n in oxy.sub_agents or [] if n not in dropped]
+            oxy.tools = [n for n in oxy.tools or [] if n not in dropped]
+    if dropped:
+        print(f"离线运行，已去掉: {sorted(dropped)}")
+    return [oxy for oxy in oxy_space if oxy.name not in dropped]
+
+
+def instrument(oxys: list):
+    """统计每个请求的调用跳数、LLM 调用次数与 LLM 耗时"""
+    from oxygent.oxy.llms.base_llm import BaseLLM
+
+    for oxy in oxys:
+        inner = oxy.execute
+
+        def make(inner=inner, is_llm=isinstance(oxy, BaseLLM)):
+            async def counted_execute(oxy_request):
+                stats = _run_stats.get()
+                start = time.perf_counter()
+                try:
+                    return await inner(oxy_request)
+                finally:
+                    if stats is not None:
+                        stats["hops"] += 1
+                        if is_llm:
+                            stats["llm_calls"] += 1
+                            stats["llm_seconds"] += time.perf_counter() - start
+            return counted_execute
+
+        object.__setattr__(oxy, "execute", make())
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int((len(values) - 1) * q)] if values else 0.0
+
+
+async def run_scenario(mas, callee: str, query: str, runs: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one():
+        async with semaphore:
+            stats = {"hops": 0, "llm_calls": 0, "llm_seconds": 0.0}
+            _run_stats.set(stats)
+            start = time.perf_counter()
+            try:
+                await mas.call(callee=callee, arguments={"query": query})
+                stats["ok"] = True
+            except Exception as e:
+                stats["ok"] = False
+                stats["error"] = f"{type(e).__name__}: {e}"
+            stats["seconds"] = time.perf_counter() - start
+            results.append(stats)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(one()) for _ in range(runs)))
+    wall = time.perf_counter() - start
+    ok = [r for r in results if r["ok"]]
+    # 单个请求内的 LLM 调用基本是串行的，并发的子调用会使 LLM 耗时之和偏大，因此按 0 截断
+    overhead = [max(r["seconds"] - r["llm_seconds"], 0.0) for r in ok]
+    per_hop = [o / r["hops"] for o, r in zip(overhead, ok) if r["hops"]]
+    return {
+        "runs": runs,
+        "failed": len(results) - len(ok),
+        "error": next((r["error"] for r in results if not r["ok"]), ""),
+        "throughput": len(ok) / wall if wall else 0.0,
+        "p50": percentile([r["seconds"] for r in ok], 0.5),
+        "p95": percentile([r["seconds"] for r in ok], 0.95),
+        "hops": percentile([r["hops"] for r in ok], 0.5),
+        "llm_calls": percentile([r["llm_calls"] for r in ok], 0.5),
+        "overhead": percentile(overhead, 0.5),
+        "per_hop_ms": percentile(per_hop, 0.5) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="可重复，默认全部")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="回放服务每次调用的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    from util.replay_llm import ReplayIndex, create_app, enable_replay_headers
+
+    index = ReplayIndex().load()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(index, args.latency, args.jitter), host="127.0.0.1", port=port, log_level="warning"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    point_llms_to(f"http://127.0.0.1:{port}/v1")
+    # MAS 的 cache_dir 等相对路径落在临时目录中，不影响项目中的记录
+    os.chdir(tempfile.mkdtemp(prefix="bench_orchestration_"))
+    import logging
+
+    import service.main_oxy as main_oxy
+
+    logging.disable(logging.ERROR)  # 离线时工具报错很多，失败次数会在结果中列出
+    oxy_space = offline_space(main_oxy.oxy_space)
+    enable_replay_headers(oxy_space)
+
+    print(f"回放数据 {len(index)} 条，LLM 延迟 {args.latency}s，每个场景 {args.runs} 次，并发 {args.concurrency}\n")
+    print(f"{'场景':<16}{'吞吐(req/s)':>12}{'p50(s)':>9}{'p95(s)':>9}{'跳数':>6}{'LLM':>5}"
+          f"{'编排开销(s)':>12}{'每跳(ms)':>10}")
+    async with main_oxy.MAS(oxy_space=oxy_space) as mas:
+        # FunctionHub 中的函数在 MAS 初始化时才注册为工具，因此在这里统一统计
+        instrument(list(mas.oxy_name_to_oxy.values()))
+        for name in args.scenario or list(SCENARIOS):
+            callee, query = SCENARIOS[name]
+            if callee not in mas.oxy_name_to_oxy:
+                print(f"{name:<16}跳过: {callee} 不在 oxy_space 中")
+                continue
+            row = await run_scenario(mas, callee, query, args.runs, args.concurrency)
+            print(f"{name:<16}{row['throughput']:>12.2f}{row['p50']:>9.3f}{row['p95']:>9.3f}{row['hops']:>6}"
+                  f"{row['llm_calls']:>5}{row['overhead']:>12.3f}{row['per_hop_ms']:>10.1f}"
+                  + (f"  （{row['failed']} 次失败: {row['error'][:80]}）" if row["failed"] else ""))
+    print(f"\n回放匹配: {dict(index.counts)}")
+
+    server.should_exit = True
+    await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
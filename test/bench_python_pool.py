@@ -0,0 +1,102 @@
+"""
+python_tools 执行方式对比
+对同一批代码片段（numpy / pandas 计算），比较三种执行方式的单次延迟与并发吞吐：
+    - inprocess：原实现，在服务进程中 exec（阻塞事件循环，并发时实际串行）
+    - subprocess：每段代码启动一个新的 Python 进程（隔离，但每次都要付解释器启动和导入的开销）
+    - pool：tools/python_pool.py 的预热进程池
+
+用法:
+    python test/bench_python_pool.py --tasks 40 --concurrency 4 --pool-size 2
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from tools.python_pool import PythonWorkerPool  # noqa: E402
+
+SNIPPETS = [
+    "import numpy as np\nprint(round(float(np.linalg.norm(np.arange(1, 1001))), 4))",
+    "import pandas as pd\ndf = pd.DataFrame({'a': range(1000), 'b': range(1000)})\nprint(int((df.a * df.b).sum()))",
+    "result = sum(i * i for i in range(100000))",
+    "import math\nprint(math.ceil(384400 / 3561.55))",
+]
+
+
+def inprocess_run(code: str) -> str:
+    """与 preset_tools.python_tools.run_python_code 相同的执行方式（print 的内容不会返回）"""
+    namespace = {}
+    with redirect_stdout(io.StringIO()):
+        exec(code, namespace)
+    return "successfully run python code"
+
+
+async def run_inprocess(code: str) -> str:
+    return inprocess_run(code)
+
+
+async def run_subprocess(code: str) -> str:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", "import numpy, pandas\n" + code,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await process.communicate()
+    return output.decode("utf-8", errors="replace")
+
+
+async def measure(name: str, runner, tasks: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await runner(SNIPPETS[i % len(SNIPPETS)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(tasks)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "name": name,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int((len(latencies) - 1) * 0.95)],
+        "throughput": tasks / wall,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    pool = PythonWorkerPool(size=args.pool_size)
+    start = time.perf_counter()
+    await pool.start()
+    print(f"进程池启动耗时 {time.perf_counter() - start:.2f}s（{args.pool_size} 个进程，启动时完成，不计入下表）\n")
+
+    # 原实现首次导入 numpy / pandas 的开销只在第一次出现，先预热，公平起见
+    inprocess_run("import numpy, pandas")
+    rows = [
+        await measure("inprocess", run_inprocess, args.tasks, args.concurrency),
+        await measure("subprocess", run_subprocess, max(args.tasks // 4, 4), args.concurrency),
+        await measure("pool", pool.run, args.tasks, args.concurrency),
+    ]
+    print(f"{'方式':<12}{'p50(ms)':>10}{'p95(ms)':>10}{'吞吐(次/s)':>12}")
+    for row in rows:
+        print(f"{row['name']:<12}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['throughput']:>12.1f}")
+    print(f"\n进程池统计: {pool.stats()}")
+    await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+会话历史存储的内存增长对比
+以 cache_dir/local_es_data/app_history.json 中的记录为模板，模拟长时间运行的 web 服务持续收到查询：
+每个查询按模板生成一组新的 history 记录（换成新的 trace_id，工具输出沿用模板内容，与真实场景中
+反复抓取同一网页 / 读取同一文件相同），并按 OxyGent 读取短期记忆的方式查询最近的会话。对比：
+    - inmemory：把 history 文档原样放在内存字典中（不设上限，memory 仍是 JSON 字符串）
+    - store：dao/session_store.py，设会话数和字节上限，淘汰的记录写入临时目录中的 SqliteEs
+每种方式在独立子进程中运行，记录 RSS 随查询数的变化及写入 / 查询延迟。
+
+用法:
+    python test/bench_session_store.py --queries 20000 --max-sessions 2000 --max-mb 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+HISTORY_PATH = os.path.join(PROJECT_ROOT, "cache_dir", "local_es_data", "app_history.json")
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as fin:
+            for line in fin:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class InMemoryHistory:
+    """不设上限的内存索引，只实现 history 用到的 index / search"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def index(self, index_name, doc_id, body):
+        self.docs[doc_id] = body
+
+    async def search(self, index_name, body):
+        must = body["query"]["bool"]["must"]
+        trace_ids = set(must[0]["terms"]["trace_id"])
+        session_name = must[1]["term"]["session_name"]
+        hits = [{"_id": k, "_source": v} for k, v in self.docs.items()
+                if v["trace_id"] in trace_ids and v["session_name"] == session_name]
+        hits.sort(key=lambda h: h["_source"]["create_time"], reverse=True)
+        return {"hits": {"hits": hits[: body.get("size", 10)]}}
+
+
+def load_templates() -> list:
+    """按 trace 分组的 history 文档"""
+    with open(HISTORY_PATH, encoding="utf-8") as fin:
+        docs = json.load(fin)
+    traces = {}
+    for body in docs.values():
+        traces.setdefault(body["trace_id"], []).append(body)
+    return list(traces.values())
+
+
+async def run_mode(args) -> dict:
+    from oxygent import Config
+
+    index_name = Config.get_app_name() + "_history"
+    if args.mode == "store":
+        from dao.local_es_store import SqliteEs
+        from dao.session_store import SessionStore
+
+        Config.set_cache_save_dir(tempfile.mkdtemp(prefix="bench_session_store_"))
+        inner = SqliteEs()
+        await inner.create_index(index_name, {"mappings": {"properties": {
+            "sub_session_id": {"type": "keyword"}, "session_name": {"type": "keyword"},
+            "trace_id": {"type": "keyword"}, "memory": {"type": "text"}, "create_time": {"type": "date"},
+        }}})
+        client = SessionStore(inner, max_sessions=args.max_sessions, max_bytes=args.max_mb * 1024 * 1024)
+    else:
+        client = InMemoryHistory()
+
+    templates = load_templates()
+    rng = random.Random(0)
+    recent = []
+    write_latency, search_latency = [], []
+    curve = []
+    base = rss_mb()
+    for i in range(args.queries):
+        group = templates[i % len(templates)]
+        trace_id = f"T{i:08d}"
+        for body in group:
+            memory = json.loads(body["memory"])
+            memory["query"] = f"{memory.get('query', '')} #{i}"
+            doc = dict(body, trace_id=trace_id, sub_session_id=f"{trace_id}__{body['session_name']}",
+                       memory=json.dumps(memory, ensure_ascii=False), create_time=f"{i:012d}")
+            start = time.perf_counter()
+            await client.index(index_name, doc["sub_session_id"], doc)
+            write_latency.append(time.perf_counter() - start)
+        recent.append((trace_id, group[0]["session_name"]))
+        # 多轮对话：按 root_trace_ids 查询最近若干次中的一次会话
+        if len(recent) > 1:
+            trace_id, session_name = recent[-1 - rng.randrange(min(len(recent) - 1, 50))]
+            start = time.perf_counter()
+            await client.search(index_name, {
+                "query": {"bool": {"must": [{"terms": {"trace_id": [trace_id]}},
+                                            {"term": {"session_name": session_name}}]}},
+                "size": 10, "sort": [{"create_time": {"order": "desc"}}],
+            })
+            search_latency.append(time.perf_counter() - start)
+        if (i + 1) % max(args.queries // 10, 1) == 0:
+            curve.append((i + 1, round(rss_mb() - base, 1)))
+    write_latency.sort()
+    search_latency.sort()
+    result = {
+        "mode": args.mode,
+        "curve": curve,
+        "write_p50_ms": write_latency[len(write_latency) // 2] * 1000,
+        "search_p50_ms": search_latency[len(search_latency) // 2] * 1000 if search_latency else 0.0,
+    }
+    if args.mode == "store":
+        await client.close()
+        result["stats"] = client.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--max-sessions", type=int, default=2000)
+    parser.add_argument("--max-mb", type=int, default=32)
+    parser.add_argument("--mode", choices=["inmemory", "store"], help="只运行一种方式（子进程内部使用）")
+    args = parser.parse_args()
+
+    if args.mode:
+        print("RESULT " + json.dumps(asyncio.run(run_mode(args))))
+        return
+
+    results = []
+    for mode in ("inmemory", "store"):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode, "--queries", str(args.queries),
+             "--max-sessions", str(args.max_sessions), "--max-mb", str(args.max_mb)],
+            capture_output=True, text=True,
+        )
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("RESULT ")), None)
+        if line is None:
+            print(f"{mode} 运行失败:\n{proc.stderr[-2000:]}")
+            continue
+        results.append(json.loads(line[len("RESULT "):]))
+
+    print(f"{args.queries} 个查询，上限 {args.max_sessions} 个会话 / {args.max_mb} MB\n")
+    print("RSS 增长（MB）：")
+    print(f"{'查询数':>10}" + "".join(f"{r['mode']:>12}" for r in results))
+    for row in zip(*(r["curve"] for r in results)):
+        print(f"{row[0][0]:>10}" + "".join(f"{point[1]:>12.1f}" for point in row))
+    print()
+    for r in results:
+        print(f"{r['mode']:<10} 写入 p50 {r['write_p50_ms']:.3f}ms  查询 p50 {r['search_p50_ms']:.3f}ms")
+        if "stats" in r:
+            print(f"{'':<10} {r['stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+启动耗时对比
+每轮在独立的子进程中导入 service.main_oxy 并完成一次 MAS 启动与关闭，分别记录导入、启动、关闭耗时，
+对比以下配置（中位数）：
+    - eager：原有方式，初始化 oxy_space 中的全部 agent 与工具
+    - lazy：LAZY_STARTUP=1，只初始化从 master 可达的部分，stdio MCP 进程推迟到首次调用
+    - lazy-<agent>：LAZY_STARTUP=1 且 ENTRY_AGENT=<agent>，例如只用 math_agent 的场景
+子进程在临时目录中运行，MAS 产生的 cache_dir 等文件不会写入项目目录
+（按需启动的工具列表缓存仍写在 cache_dir/mcp_tools，与正式运行共用）。
+
+用法:
+    python test/bench_startup.py --runs 5 --entry math_agent
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import asyncio, json, logging, time
+logging.disable(logging.CRITICAL)
+t0 = time.perf_counter()
+import service.main_oxy as m
+t1 = time.perf_counter()
+
+async def run():
+    mas = m.MAS(oxy_space=m.oxy_space)
+    start = time.perf_counter()
+    await mas.__aenter__()
+    ready = time.perf_counter()
+    await mas.__aexit__(None, None, None)
+    return ready - start, time.perf_counter() - ready, len(m.oxy_space)
+
+startup, shutdown, count = asyncio.run(run())
+print("RESULT " + json.dumps({"import": t1 - t0, "startup": startup, "shutdown": shutdown, "oxys": count}))
+"""
+
+
+def run_once(env: dict, timeout: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD],
+            cwd=workdir,
+            env={**os.environ, "PYTHONPATH": PROJECT_ROOT, **env},
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"超过 {timeout} 秒未完成"}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ["无输出"]
+    return {"error": tail[0][:200]}
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--entry", default="math_agent", help="额外对比的入口 agent")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    configs = {
+        "eager": {"LAZY_STARTUP": "0"},
+        "lazy": {"LAZY_STARTUP": "1", "ENTRY_AGENT": "master"},
+        f"lazy-{args.entry}": {"LAZY_STARTUP": "1", "ENTRY_AGENT": args.entry},
+    }
+    # 先跑一次按需启动，确保 MCP 工具列表已缓存，后续轮次测的是常态
+    run_once(configs["lazy"], args.timeout)
+
+    print(f"{'配置':<20}{'oxy 数':>8}{'导入(s)':>10}{'启动(s)':>10}{'关闭(s)':>10}{'合计(s)':>10}")
+    for name, env in configs.items():
+        results, errors = [], []
+        for _ in range(args.runs):
+            result = run_once(env, args.timeout)
+            (errors if "error" in result else results).append(result)
+        if not results:
+            print(f"{name:<20}失败: {errors[0]['error']}")
+            continue
+        row = {k: median([r[k] for r in results]) for k in ("import", "startup", "shutdown")}
+        total = median([r["import"] + r["startup"] + r["shutdown"] for r in results])
+        print(f"{name:<20}{results[0]['oxys']:>8}{row['import']:>10.3f}{row['startup']:>10.3f}"
+              f"{row['shutdown']:>10.3f}{total:>10.3f}" + (f"  （{len(errors)} 次失败）" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+视频关键帧抽取对比
+对同一段视频比较两种交给 VLM 的方式：
+    - uniform：按固定间隔（默认每秒 1 帧）抽帧
+    - keyframes：util/video_keyframes.py 的画面切换检测 + 感知哈希去重
+统计送出的帧数、按 Qwen-VL 的切块方式估算的图片 token（长边先缩到 1568，与附件预处理一致；每 28x28 像素 1 个 token）
+和本地抽帧耗时。加 --vlm 时用 DEFAULT_VLM_* 配置的模型对两组帧分别提问，记录真实的延迟和 usage。
+不指定 --video 时合成一段类似手机录屏的视频：若干页文字，页面停留、滚动、点击后返回前一页。
+
+用法:
+    python test/bench_video_keyframes.py
+    python test/bench_video_keyframes.py --video valid/xxx.mp4 --uniform-fps 1 --max-frames 12
+    python test/bench_video_keyframes.py --video valid/xxx.mp4 --vlm --question "视频里最后买的是什么商品？"
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from util.attachment_prep import IMAGE_MAX_SIDE  # noqa: E402
+
+PATCH = 28
+
+
+def image_tokens(width: int, height: int) -> int:
+    scale = min(IMAGE_MAX_SIDE / max(width, height), 1.0)
+    width, height = max(round(width * scale / PATCH), 1), max(round(height * scale / PATCH), 1)
+    return width * height + 2  # 图片前后的 vision_start / vision_end
+
+
+def synthesize(path: str, seconds: int = 60, fps: int = 25, width: int = 720, height: int = 1280) -> str:
+    """合成录屏：每页停留数秒，中间夹着滚动和返回上一页"""
+    import cv2
+    import numpy as np
+
+    rng = random.Random(0)
+    pages = []
+    for p in range(6):
+        page = np.full((height * 2, width, 3), 245, np.uint8)
+        cv2.rectangle(page, (0, 0), (width, 120), (40 + p * 30, 90, 200), -1)
+        cv2.putText(page, f"Page {p + 1}", (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        for line in range(40):
+            words = " ".join(rng.choice(["price", "iPhone", "cart", "order", "JD", "5999", "coupon", "delivery"])
+                             for _ in range(5))
+            cv2.putText(page, words, (30, 180 + line * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (30, 30, 30), 2)
+        pages.append(page)
+
+    # (页面, 起始滚动位置, 结束滚动位置, 秒数)
+    script = [(0, 0, 0, 6), (0, 0, 400, 2), (0, 400, 400, 5), (1, 0, 0, 5), (2, 0, 0, 4), (1, 0, 0, 3),
+              (3, 0, 600, 3), (3, 600, 600, 6), (4, 0, 0, 5), (0, 0, 0, 3), (5, 0, 0, 6), (5, 0, 900, 3),
+              (5, 900, 900, 9)]
+    # 录屏编码噪声
+    noises = [np.random.default_rng(i).integers(-3, 4, (height, width, 3), dtype=np.int16) for i in range(8)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    total = 0
+    for page, start, end, duration in script:
+        for i in range(duration * fps):
+            if total >= seconds * fps:
+                break
+            offset = int(start + (end - start) * i / (duration * fps))
+            frame = pages[page][offset:offset + height].astype(np.int16) + noises[total % len(noises)]
+            writer.write(np.clip(frame, 0, 255).astype(np.uint8))
+            total += 1
+    writer.release()
+    return path
+
+
+def frame_tokens(frames) -> int:
+    return sum(image_tokens(f.image.shape[1], f.image.shape[0]) for f in frames)
+
+
+def ask_vlm(frames, question: str) -> dict:
+    import cv2
+    import httpx
+
+    from oxygent.utils.env_utils import get_env_var
+
+    content = [{"type": "text", "text": "以下是视频中按时间顺序抽取的帧。"}]
+    for f in frames:
+        image = f.image
+        scale = min(IMAGE_MAX_SIDE / max(image.shape[:2]), 1.0)
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        data = base64.b64encode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1]).decode()
+        content.append({"type": "text", "text": f"[{f.timestamp:.1f}s]"})
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{data}"}})
+    content.append({"type": "text", "text": question})
+    start = time.perf_counter()
+    response = httpx.post(
+        get_env_var("DEFAULT_VLM_BASE_URL").rstrip("/") + "/chat/completions",
+        headers={"Authorization": f"Bearer {get_env_var('DEFAULT_VLM_API_KEY')}"},
+        json={"model": get_env_var("DEFAULT_VLM_MODEL_NAME"), "temperature": 0.1,
+              "messages": [{"role": "user", "content": content}]},
+        timeout=300,
+    )
+    response.raise_for_status()
+    body = response.json()
+    return {
+        "latency": time.perf_counter() - start,
+        "prompt_tokens": body.get("usage", {}).get("prompt_tokens"),
+        "answer": body["choices"][0]["message"]["content"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", nargs="*", help="视频路径，不指定时合成一段录屏")
+    parser.add_argument("--uniform-fps", type=float, default=1.0)
+    parser.add_argument("--max-frames", type=int, default=12)
+    parser.add_argument("--require-text", action="store_true", help="只保留疑似含文字的帧")
+    parser.add_argument("--vlm", action="store_true", help="调用 DEFAULT_VLM_* 配置的模型比较真实延迟和 usage")
+    parser.add_argument("--question", default="请按时间顺序描述视频中的操作，以及出现过的关键数字。")
+    args = parser.parse_args()
+
+    from util.video_keyframes import extract_keyframes, format_timestamp, uniform_frames
+
+    videos = args.video or [synthesize(os.path.join(tempfile.mkdtemp(prefix="bench_video_"), "screen.mp4"))]
+    for path in videos:
+        start = time.perf_counter()
+        uniform = uniform_frames(path, args.uniform_fps)
+        uniform_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        keyframes, info = extract_keyframes(path, max_frames=args.max_frames, require_text=args.require_text)
+        keyframe_seconds = time.perf_counter() - start
+
+        print(f"{os.path.basename(path)}  时长 {info['duration']:.1f}s  {info}")
+        print(f"{'方式':<12}{'帧数':>8}{'图片 token':>14}{'抽帧耗时':>12}")
+        print(f"{'uniform':<12}{len(uniform):>8}{frame_tokens(uniform):>14}{uniform_seconds:>11.2f}s")
+        print(f"{'keyframes':<12}{len(keyframes):>8}{frame_tokens(keyframes):>14}{keyframe_seconds:>11.2f}s")
+        print("关键帧: " + ", ".join(format_timestamp(f.timestamp) for f in keyframes))
+        if args.vlm:
+            for name, frames in (("uniform", uniform), ("keyframes", keyframes)):
+                result = ask_vlm(frames, args.question)
+                print(f"\n[{name}] 延迟 {result['latency']:.2f}s  prompt_tokens {result['prompt_tokens']}\n"
+                      f"{result['answer']}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
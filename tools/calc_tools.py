@@ -0,0 +1,132 @@
+"""
+四则运算工具
+preset_tools.math_tools 只有 power 和 calc_pi，“384400/3562” 这类计算步骤原来要经过 math_agent 让 LLM 心算。
+这里提供一个只接受算术表达式的 calculate，供 executor 直接调用；表达式按语法树求值，不执行任意代码。
+"""
+import ast
+import math
+import operator
+import re
+
+from oxygent.oxy import FunctionHub
+from pydantic import Field
+
+calc_tools = FunctionHub(name="calc_tools")
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_FUNCTIONS = {
+    "abs": abs, "round": round, "min": min, "max": max, "sum": lambda *a: sum(a),
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "ceil": math.ceil, "floor": math.floor, "factorial": math.factorial, "radians": math.radians,
+    "degrees": math.degrees,
+}
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+# hub 在事件循环中直接运行同步工具，限制运算规模，避免 LLM 写出的表达式长时间占住 CPU
+MAX_EXPONENT = 10000
+MAX_INT_BITS = 100000
+MAX_FACTORIAL = 1000
+# 千分位逗号：数字之间、后面恰好跟三位数字
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+
+def _strip_thousands(expression: str) -> str:
+    """去掉函数调用参数列表以外的千分位逗号；括号内紧跟函数名时逗号一律视为参数分隔（max(100,200) 是两个参数）"""
+    out, calls = [], []  # calls：每层括号是否为函数调用
+    for i, ch in enumerate(expression):
+        if ch == "(":
+            before = expression[:i].rstrip()
+            calls.append(bool(before) and (before[-1].isalnum() or before[-1] == "_"))
+        elif ch == ")" and calls:
+            calls.pop()
+        elif ch == "," and not (calls and calls[-1]) and _THOUSANDS.match(expression, i):
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ValueError(f"结果过大: 超过 {MAX_INT_BITS} 位")
+    return value
+
+
+def _eval(node):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in _CONSTANTS:
+        return _CONSTANTS[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        left, right = _eval(node.left), _eval(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > MAX_EXPONENT:
+                raise ValueError(f"指数过大: {right}")
+            if isinstance(left, int) and isinstance(right, int) and left.bit_length() * right > MAX_INT_BITS:
+                raise ValueError(f"结果过大: 超过 {MAX_INT_BITS} 位")
+        return _check_int(_BINARY[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        return _UNARY[type(node.op)](_eval(node.operand))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+            and not node.keywords):
+        args = [_eval(arg) for arg in node.args]
+        if node.func.id == "factorial" and args and isinstance(args[0], (int, float)) and args[0] > MAX_FACTORIAL:
+            raise ValueError(f"factorial 参数过大: {args[0]}（上限 {MAX_FACTORIAL}）")
+        return _check_int(_FUNCTIONS[node.func.id](*args))
+    raise ValueError(f"不支持的表达式: {ast.dump(node)[:80]}")
+
+
+def evaluate(expression: str):
+    # 兼容中文符号与千分位
+    expression = (str(expression).replace("×", "*").replace("÷", "/").replace("（", "(").replace("）", ")")
+                  .replace("^", "**").replace("，", ","))
+    expression = _strip_thousands(expression)
+    result = _eval(ast.parse(expression.strip().rstrip("=").strip(), mode="eval"))
+    if isinstance(result, float) and result.is_integer() and abs(result) < 1e16:
+        return int(result)
+    return result
+
+
+@calc_tools.tool(
+    description="Evaluate an arithmetic expression and return the exact result. "
+    "Supports + - * / // % ** (or ^), parentheses, pi, e and functions such as "
+    "sqrt, log, log10, sin, cos, ceil, floor, round, abs, min, max, factorial. "
+    "Do not use thousands separators inside function arguments: commas there separate arguments."
+)
+def calculate(
+    expression: str = Field(description="arithmetic expression, e.g. '384400 / 3562' or 'ceil(384400 / 3562)'"),
+) -> str:
+    try:
+        return str(evaluate(expression))
+    except (ValueError, SyntaxError, TypeError, ZeroDivisionError, OverflowError) as e:
+        return f"Error: {type(e).__name__}: {e}"
+
+
+if __name__ == "__main__":
+    # python tools/calc_tools.py：快速自检
+    assert evaluate("round(3.14159, 2)") == 3.14
+    assert evaluate("max(3, 5)") == 5
+    assert evaluate("min(1，2)") == 1
+    assert evaluate("1,234,567 + 1") == 1234568
+    assert evaluate("(1,234 + 1) * 2") == 2470
+    assert evaluate("max(100,200)") == 200
+    assert evaluate("max(3.5,100)") == 100
+    assert evaluate("sum(100,200,300)") == 600
+    assert evaluate("ceil(384400 / 3562)") == 108
+    for bad in ("(10**10000)**10000", "factorial(10**7)", "9**9**9"):
+        try:
+            evaluate(bad)
+        except ValueError:
+            continue
+        raise AssertionError(bad)
+    print("ok")
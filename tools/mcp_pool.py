@@ -0,0 +1,232 @@
+"""
+stdio MCP 服务进程池
+StdioMCPClient 只维持一个 MCP 服务进程（firecrawl_tools 还要先经过 npx 解析和 Node 启动），
+所有并发的工具调用都挤在同一条 stdio 管道上。这里为每个 StdioMCPClient 预先启动多个服务进程：
+    - MAS 初始化时并发拉起全部进程，工具列表从第一个就绪的进程获取
+    - 调用时从空闲队列取一个进程，用完放回，并记录排队等待时间
+    - 定期对空闲进程发送 ping，进程崩溃或无响应时自动重启（指数退避）
+
+用法（需在 MAS 初始化之前调用）:
+    pools = enable_mcp_pools(all_tools, size=3)
+    pools["firecrawl_tools"].stats()
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import anyio
+from mcp import ClientSession
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+from oxygent import oxy
+
+logger = logging.getLogger(__name__)
+
+
+class _Worker:
+    __slots__ = ("index", "session", "stop", "task", "restarts")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.stop = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.restarts = 0
+
+
+class StdioMCPPool:
+    """一个 StdioMCPClient 对应的一组服务进程"""
+
+    def __init__(
+        self,
+        client: oxy.StdioMCPClient,
+        size: int = 2,
+        health_interval: float = 30.0,
+        ping_timeout: float = 10.0,
+        start_timeout: float = 120.0,
+    ):
+        self.client = client
+        self.size = max(size, 1)
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.start_timeout = start_timeout
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._closing = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._waits: deque = deque(maxlen=10000)  # 最近的排队等待时间（秒）
+        self._calls = 0
+        self._failures = 0
+
+    # ------------------------------------------------------------------
+    # 进程生命周期：每个进程由一个常驻协程持有，上下文的进入与退出都在该协程内完成
+    # ------------------------------------------------------------------
+
+    async def _serve(self, worker: _Worker):
+        params = await self.client.get_server_params()
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                worker.session = session
+                worker.stop.clear()
+                self._idle.put_nowait(worker)
+                self._ready.set()
+                await worker.stop.wait()
+
+    async def _supervise(self, worker: _Worker):
+        backoff = 1.0
+        while not self._closing:
+            started = time.monotonic()
+            try:
+                await self._serve(worker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.client.name} 第 {worker.index} 个 MCP 进程退出: {type(e).__name__}: {e}")
+            finally:
+                worker.session = None
+            if self._closing:
+                break
+            # 稳定运行过一段时间后重新从 1 秒开始退避
+            backoff = 1.0 if time.monotonic() - started > 60 else min(backoff * 2, 30.0)
+            worker.restarts += 1
+            logger.info(f"{backoff:.0f} 秒后重启 {self.client.name} 第 {worker.index} 个 MCP 进程")
+            await asyncio.sleep(backoff)
+
+    def _retire(self, worker: _Worker):
+        """标记进程不可用，由 _supervise 关闭并重启"""
+        worker.session = None
+        worker.stop.set()
+
+    async def start(self):
+        """并发拉起全部进程，至少一个就绪后返回"""
+        # 队列和事件在当前事件循环中创建，进程池可以随 MAS 多次启动
+        self._idle = asyncio.Queue()
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._workers = [_Worker(i) for i in range(self.size)]
+        for worker in self._workers:
+            worker.task = asyncio.create_task(self._supervise(worker))
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=self.start_timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise RuntimeError(f"{self.client.name} 的 MCP 进程在 {self.start_timeout} 秒内均未就绪")
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"{self.client.name} MCP 进程池已启动，共 {self.size} 个进程")
+
+    async def close(self):
+        self._closing = True
+        if self._health_task:
+            self._health_task.cancel()
+        for worker in self._workers:
+            worker.stop.set()
+        tasks = [w.task for w in self._workers if w.task]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=10)
+            for task in pending:
+                task.cancel()
+        logger.info(f"{self.client.name} MCP 进程池已关闭: {self.stats()}")
+
+    async def _health_loop(self):
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            # 只检查空闲的进程，正在处理调用的进程不受影响
+            for _ in range(self._idle.qsize()):
+                worker = self._idle.get_nowait()
+                if worker.session is None:
+                    continue
+                try:
+                    await asyncio.wait_for(worker.session.send_ping(), timeout=self.ping_timeout)
+                except Exception as e:
+                    logger.warning(f"{self.client.name} 第 {worker.index} 个 MCP 进程健康检查失败: {e}")
+                    self._failures += 1
+                    self._retire(worker)
+                else:
+                    self._idle.put_nowait(worker)
+
+    # ------------------------------------------------------------------
+    # 调用
+    # ------------------------------------------------------------------
+
+    async def _acquire(self) -> _Worker:
+        start = time.monotonic()
+        while True:
+            worker = await self._idle.get()
+            if worker.session is not None:
+                self._waits.append(time.monotonic() - start)
+                return worker
+
+    async def call_tool(self, tool_name: str, arguments: dict, headers=None):
+        """取一个空闲进程执行调用；进程在调用中断开时换一个进程重试一次"""
+        for attempt in range(2):
+            worker = await self._acquire()
+            self._calls += 1
+            try:
+                result = await worker.session.call_tool(tool_name, arguments)
+            except (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, OSError, McpError) as e:
+                if isinstance(e, McpError) and e.error.code != CONNECTION_CLOSED:
+                    self._idle.put_nowait(worker)
+                    raise
+                logger.warning(f"{self.client.name} 第 {worker.index} 个 MCP 进程调用失败: {type(e).__name__}: {e}")
+                self._failures += 1
+                self._retire(worker)
+                if attempt:
+                    raise
+                continue
+            except BaseException:
+                self._idle.put_nowait(worker)
+                raise
+            self._idle.put_nowait(worker)
+            return result
+
+    async def list_tools(self):
+        worker = await self._acquire()
+        try:
+            return await worker.session.list_tools()
+        finally:
+            self._idle.put_nowait(worker)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "size": self.size,
+            "alive": sum(1 for w in self._workers if w.session is not None),
+            "idle": self._idle.qsize() if self._idle else 0,
+            "calls": self._calls,
+            "failures": self._failures,
+            "restarts": sum(w.restarts for w in self._workers),
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95": round(waits[int((len(waits) - 1) * 0.95)], 4) if waits else 0.0,
+            "wait_max": round(waits[-1], 4) if waits else 0.0,
+        }
+
+
+def enable_mcp_pool(client: oxy.StdioMCPClient, size: int = 2, **kwargs) -> StdioMCPPool:
+    """把 client 的初始化、调用和清理改为由进程池处理"""
+    pool = StdioMCPPool(client, size=size, **kwargs)
+
+    async def pooled_init(is_fetch_tools=True):
+        await pool.start()
+        if is_fetch_tools:
+            client.add_tools(await pool.list_tools())
+
+    # is_keep_alive=False 时 BaseMCPClient._execute 改走 call_tool，由进程池分配会话
+    object.__setattr__(client, "is_keep_alive", False)
+    object.__setattr__(client, "init", pooled_init)
+    object.__setattr__(client, "call_tool", pool.call_tool)
+    object.__setattr__(client, "cleanup", pool.close)
+    return pool
+
+
+def enable_mcp_pools(tools: list, size: int = 2, **kwargs) -> Dict[str, StdioMCPPool]:
+    """为 tools 中所有的 StdioMCPClient 启用进程池"""
+    return {
+        tool.name: enable_mcp_pool(tool, size=size, **kwargs)
+        for tool in tools
+        if isinstance(tool, oxy.StdioMCPClient)
+    }
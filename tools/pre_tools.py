@@ -1,6 +1,9 @@
 from oxygent import preset_tools
 from oxygent import oxy
 import os
+
+from tools.calc_tools import calc_tools
+
 firecrawl_tools = oxy.StdioMCPClient(
     name="firecrawl_tools",
     params={
@@ -26,4 +29,5 @@ all_tools = [
     preset_tools.string_tools,
     preset_tools.system_tools,
     firecrawl_tools,
+    calc_tools,
 ]
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+python_tools 的预热进程池
+preset_tools.python_tools 的 run_python_code 直接在服务进程里 exec：代码阻塞整个事件循环，print 的内容
+不会返回给 LLM，死循环或内存暴涨会拖垮整个服务。这里改为交给一组常驻的子进程执行：
+    - 子进程启动时预先导入 numpy / pandas，用完 max_runs 次或崩溃后自动换新，新进程在后台提前启动
+    - 每次执行有墙钟超时；POSIX 下还限制 CPU 时间与内存（RLIMIT_CPU / RLIMIT_AS），超限的进程被回收
+    - 返回 variable_to_return 的值，没有时返回 print 的输出；结果较大时经共享内存传回，不走管道
+    - 每次执行使用新的命名空间，互不影响
+
+用法（需在 MAS 初始化之前调用）:
+    pool = enable_python_pool(all_tools, size=2)
+    pool.stats()
+"""
+import asyncio
+import io
+import logging
+import os
+import pickle
+import struct
+import sys
+import time
+import traceback
+from collections import deque
+from contextlib import redirect_stderr, redirect_stdout
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PRELOAD = ("numpy", "pandas")
+_HEADER = struct.Struct("<I")
+
+
+def _write_frame(stream, obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_frame(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    return pickle.loads(stream.read(_HEADER.unpack(header)[0]))
+
+
+# ----------------------------------------------------------------------
+# 子进程
+# ----------------------------------------------------------------------
+
+def _limit_memory(memory_mb: int):
+    """在已导入的库的基础上，再允许 memory_mb 的地址空间"""
+    try:
+        import resource
+        with open("/proc/self/statm") as fin:
+            current = int(fin.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        limit = current + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, ValueError):
+        pass  # Windows 等平台只依赖墙钟超时
+
+
+def _limit_cpu(cpu_seconds: int):
+    """RLIMIT_CPU 按进程累计，每次执行前把软限制设为已用时间加上本次额度"""
+    try:
+        import resource
+        used = int(sum(resource.getrusage(resource.RUSAGE_SELF)[:2]))
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, resource.RLIM_INFINITY))
+    except (ImportError, OSError, ValueError):
+        pass
+
+
+def _execute(code: str, variable_to_return: Optional[str], namespace: Optional[dict], max_output: int) -> str:
+    namespace = dict(namespace or {})
+    namespace.setdefault("__name__", "__main__")
+    captured = io.StringIO()
+    try:
+        with redirect_stdout(captured), redirect_stderr(captured):
+            exec(code, namespace)
+    except Exception as e:
+        output = captured.getvalue()[-max_output:]
+        return f"Error running python code: {type(e).__name__}: {e}" + (f"\n{output}" if output else "")
+    if variable_to_return:
+        if namespace.get(variable_to_return) is None:
+            return f"Variable {variable_to_return} not found"
+        return str(namespace[variable_to_return])
+    output = captured.getvalue()
+    if len(output) > max_output:
+        output = output[:max_output] + f"\n...（输出过长，已截断，共 {len(output)} 个字符）"
+    return output or "successfully run python code"
+
+
+def _pack_result(text: str, shm_threshold: int) -> dict:
+    data = text.encode("utf-8")
+    if len(data) <= shm_threshold:
+        return {"text": text}
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[: len(data)] = data
+    name = shm.name
+    shm.close()
+    try:
+        # 由父进程读取后 unlink，子进程不再跟踪这块内存
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return {"shm": name, "size": len(data)}
+
+
+def _worker_main():
+    config = pickle.loads(bytes.fromhex(sys.argv[sys.argv.index("--worker") + 1]))
+    # 协议占用原来的 stdout，用户代码的 print 只写入捕获缓冲区
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    protocol_in = sys.stdin.buffer
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    for name in config["preload"]:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    _limit_memory(config["memory_mb"])
+    _write_frame(protocol_out, {"ready": True, "pid": os.getpid()})
+    while True:
+        request = _read_frame(protocol_in)
+        if request is None:
+            break
+        _limit_cpu(config["cpu_seconds"])
+        try:
+            text = _execute(request["code"], request.get("variable_to_return"), request.get("namespace"),
+                            config["max_output"])
+        except BaseException:  # MemoryError / SystemExit 等也要返回
+            text = f"Error running python code: {traceback.format_exc(limit=1)}"
+        _write_frame(protocol_out, _pack_result(text, config["shm_threshold"]))
+
+
+# ----------------------------------------------------------------------
+# 父进程
+# ----------------------------------------------------------------------
+
+class _Worker:
+    __slots__ = ("process", "runs", "started")
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+        self.started = time.monotonic()
+
+
+class _WorkerCrashed(Exception):
+    pass
+
+
+class PythonWorkerPool:
+    """常驻的 Python 子进程池"""
+
+    def __init__(
+        self,
+        size: int = 2,
+        preload=DEFAULT_PRELOAD,
+        max_runs: int = 50,
+        timeout: float = 60.0,
+        cpu_seconds: int = 60,
+        memory_mb: int = 2048,
+        max_output: int = 20000,
+        shm_threshold: int = 64 * 1024,
+    ):
+        self.size = max(size, 1)
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self._config = {
+            "preload": list(preload),
+            "cpu_seconds": cpu_seconds,
+            "memory_mb": memory_mb,
+            "max_output": max_output,
+            "shm_threshold": shm_threshold,
+        }
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._spawning: set = set()
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._closing = False
+        self._latencies: deque = deque(maxlen=10000)
+        self._waits: deque = deque(maxlen=10000)
+        self.runs = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.timeouts = 0
+
+    async def _spawn(self) -> _Worker:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (PROJECT_ROOT, env.get("PYTHONPATH")) if p)
+        # 每个进程只执行一段代码，BLAS 多线程只会互相争抢 CPU
+        for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            env.setdefault(name, "1")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "tools.python_pool", "--worker", pickle.dumps(self._config).hex(),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=env,
+        )
+        worker = _Worker(process)
+        try:
+            ready = await asyncio.wait_for(self._receive(worker), timeout=120)
+        except BaseException:
+            self._kill(worker)
+            raise
+        if not ready.get("ready"):
+            self._kill(worker)
+            raise RuntimeError("python worker 启动失败")
+        worker.started = time.monotonic()
+        return worker
+
+    def _replace_in_background(self):
+        """补一个新进程，就绪后放入空闲队列"""
+        if self._closing:
+            return
+
+        async def spawn():
+            try:
+                worker = await self._spawn()
+            except Exception as e:
+                logger.warning(f"python worker 启动失败: {e}")
+                await asyncio.sleep(1)
+                self._replace_in_background()
+                return
+            if self._closing:
+                self._kill(worker)
+                return
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+        task = asyncio.create_task(spawn())
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def start(self):
+        if self._idle is not None and not self._closing:
+            return
+        self._start_lock = self._start_lock or asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None and not self._closing:
+                return
+            self._closing = False
+            self._idle = asyncio.Queue()
+            started = time.monotonic()
+            self._workers = list(await asyncio.gather(*(self._spawn() for _ in range(self.size))))
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+            logger.info(f"python worker 池已启动：{self.size} 个进程，预加载 {self._config['preload']}，"
+                        f"耗时 {time.monotonic() - started:.2f}s")
+
+    def _kill(self, worker: _Worker):
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if worker.process.returncode is None:
+            try:
+                worker.process.kill()
+            except ProcessLookupError:
+                pass
+
+    def _retire(self, worker: _Worker):
+        self._kill(worker)
+        self._replace_in_background()
+
+    async def close(self):
+        self._closing = True
+        for task in list(self._spawning):
+            task.cancel()
+        for worker in list(self._workers):
+            if worker.process.stdin and not worker.process.stdin.is_closing():
+                worker.process.stdin.close()
+            self._kill(worker)
+        self._idle = None
+
+    async def _receive(self, worker: _Worker) -> dict:
+        stdout = worker.process.stdout
+        try:
+            header = await stdout.readexactly(_HEADER.size)
+            data = await stdout.readexactly(_HEADER.unpack(header)[0])
+        except asyncio.IncompleteReadError:
+            code = await worker.process.wait()
+            raise _WorkerCrashed(f"python worker 异常退出（返回码 {code}）")
+        return pickle.loads(data)
+
+    @staticmethod
+    def _unpack_result(result: dict) -> str:
+        if "shm" not in result:
+            return result["text"]
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(name=result["shm"])
+        try:
+            return bytes(shm.buf[: result["size"]]).decode("utf-8")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def run(self, code: str, variable_to_return: Optional[str] = None, namespace: Optional[dict] = None) -> str:
+        await self.start()
+        waited = time.monotonic()
+        worker = await self._idle.get()
+        self._waits.append(time.monotonic() - waited)
+        started = time.monotonic()
+        self.runs += 1
+        worker.runs += 1
+        try:
+            data = pickle.dumps({"code": code, "variable_to_return": variable_to_return, "namespace": namespace})
+            worker.process.stdin.write(_HEADER.pack(len(data)) + data)
+            await worker.process.stdin.drain()
+            result = await asyncio.wait_for(self._receive(worker), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._retire(worker)
+            return f"Error running python code: 执行超过 {self.timeout} 秒，已终止"
+        except (_WorkerCrashed, ConnectionError, BrokenPipeError) as e:
+            self.crashed += 1
+            self._retire(worker)
+            return f"Error running python code: {e}（可能超出了 CPU 时间或内存限制）"
+        except BaseException:
+            self._retire(worker)  # 取消时进程状态未知，直接换新
+            raise
+        finally:
+            self._latencies.append(time.monotonic() - started)
+        if worker.runs >= self.max_runs:
+            self.recycled += 1
+            self._retire(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return self._unpack_result(result)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        waits = sorted(self._waits)
+        return {
+            "size": self.size,
+            "alive": len(self._workers),
+            "runs": self.runs,
+            "recycled": self.recycled,
+            "crashed": self.crashed,
+            "timeouts": self.timeouts,
+            "latency_p50": round(latencies[len(latencies) // 2], 4) if latencies else 0.0,
+            "latency_p95": round(latencies[int((len(latencies) - 1) * 0.95)], 4) if latencies else 0.0,
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+        }
+
+
+def enable_python_pool(tools: list, size: int = 2, **kwargs) -> Optional[PythonWorkerPool]:
+    """把 python_tools 的 run_python_code 换成进程池执行，进程随 MAS 初始化一起启动"""
+    import functools
+
+    from oxygent.oxy import FunctionHub
+
+    hub = next((t for t in tools if isinstance(t, FunctionHub) and "run_python_code" in t.func_dict), None)
+    if hub is None:
+        return None
+    pool = PythonWorkerPool(size=size, **kwargs)
+    desc, async_func = hub.func_dict["run_python_code"]
+
+    # 保留原函数签名，LLM 看到的工具参数不变
+    @functools.wraps(async_func)
+    async def run_python_code(code: str, variable_to_return: Optional[str] = None,
+                              safe_globals: Optional[dict] = None, safe_locals: Optional[dict] = None) -> str:
+        namespace = {**(safe_globals or {}), **(safe_locals or {})}
+        return await pool.run(code, variable_to_return, namespace or None)
+
+    hub.func_dict["run_python_code"] = (desc, run_python_code)
+    real_init = hub.init
+
+    async def pooled_init():
+        await real_init()
+        await pool.start()
+
+    object.__setattr__(hub, "init", pooled_init)
+    return pool
+
+
+if __name__ == "__main__" and "--worker" in sys.argv:
+    _worker_main()
@@ -0,0 +1,358 @@
+"""
+附件预处理
+multimodal_agent 每次都把原始附件整份交给 VLM，同一个文件在重跑和不同任务之间会被反复上传、反复理解
+（valid/ 与 valid/test/ 中还有大量重复文件）。这里在派发任务之前先把附件处理成更紧凑的输入：
+    PDF  -> 按阅读顺序抽取的文字；文字很少或含图片的页面另外渲染成图片
+    PPTX -> 按位置排序的每页文字、表格，以及缩小后的图片
+    图片 -> 限制长边后重新编码（有透明通道保留 PNG，否则 JPEG）
+    音频 -> 用 ffmpeg 切成单声道 16k 的分段
+    视频 -> 用 OpenCV 按画面切换抽取、感知哈希去重后的少量关键帧，附带时间戳（见 util/video_keyframes.py）
+结果按文件内容的 sha256 缓存在 cache_dir/attachments 下，内容相同的文件只处理一次。
+PDF / PPTX / 音频 / 视频依赖 PyMuPDF（或 pypdf）、python-pptx、ffmpeg、opencv-python，缺少时对应附件原样传给模型。
+
+用法:
+    prepare_attachments(paths, workers=4)   # 派发任务前批量预处理
+    enable_attachment_prep(multimodal_agent)  # 调用 agent 时把附件替换为预处理结果
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from oxygent.schemas import OxyRequest
+
+from util.token_counter import truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, "cache_dir", "attachments")
+PREP_VERSION = 1  # 处理逻辑变化时递增，旧缓存自动失效
+
+IMAGE_MAX_SIDE = 1568
+IMAGE_QUALITY = 85
+PDF_RENDER_DPI = 110
+PDF_MIN_PAGE_CHARS = 50  # 少于该字数的页面视为扫描件，渲染成图片
+AUDIO_SEGMENT_SECONDS = 60
+VIDEO_MAX_FRAMES = 12
+MAX_TEXT_TOKENS = 6000
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tiff"}
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".flac", ".aac", ".ogg"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+class PreparedAttachment(BaseModel):
+    path: str
+    kind: str  # pdf / pptx / image / audio / video / raw
+    text: str = ""
+    files: List[str] = []  # 交给模型的文件，raw 时为原文件
+
+
+class UnsupportedAttachment(Exception):
+    """缺少处理该类附件所需的依赖"""
+
+
+def file_digest(path: str) -> str:
+    """文件内容的 sha256，按 (路径, 大小, 修改时间) 在进程内记忆，避免重复读取大文件"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        if key in _digest_memo:
+            return _digest_memo[key]
+    sha = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(1024 * 1024), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    with _digest_lock:
+        _digest_memo[key] = digest
+    return digest
+
+
+def _entry_dir(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, digest[:2], f"{digest}-v{PREP_VERSION}")
+
+
+def _extension(path: str) -> str:
+    return os.path.splitext(path.lower())[1]
+
+
+# ----------------------------------------------------------------------
+# 各类附件的处理函数：把产物写入 out_dir，返回 (文字, 产物文件名列表)
+# ----------------------------------------------------------------------
+
+def _encode_image(image, out_dir: str, stem: str) -> str:
+    """限制长边并重新编码，返回写出的文件名"""
+    from PIL import ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        name = f"{stem}.png"
+        image.save(os.path.join(out_dir, name), "PNG", optimize=True)
+    else:
+        name = f"{stem}.jpg"
+        image.convert("RGB").save(os.path.join(out_dir, name), "JPEG", quality=IMAGE_QUALITY, optimize=True)
+    return name
+
+
+def _prepare_image(path: str, out_dir: str) -> Tuple[str, List[str]]:
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        original_side = max(image.size)
+        name = _encode_image(image, out_dir, "image")
+    encoded = os.path.join(out_dir, name)
+    if (original_side <= IMAGE_MAX_SIDE and _extension(path) in (".jpg", ".jpeg", ".png")
+            and os.path.getsize(encoded) >= os.path.getsize(path)):
+        # 原图尺寸合适且重新编码并没有变小，直接保留原图
+        os.remove(encoded)
+        name = f"image{_extension(path)}"
+        shutil.copyfile(path, os.path.join(out_dir, name))
+    return "", [name]
+
+
+def _prepare_pdf(path: str, out_dir: str) -> Tuple[str, List[str]]:
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+    if fitz is None:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise UnsupportedAttachment("需要安装 PyMuPDF 或 pypdf")
+        reader = PdfReader(path)
+        pages = [f"[第 {i} 页]\n{(page.extract_text() or '').strip()}" for i, page in enumerate(reader.pages, 1)]
+        return "\n\n".join(pages), []
+
+    pages, files = [], []
+    with fitz.open(path) as doc:
+        for i, page in enumerate(doc, 1):
+            # 按文本块的位置（先上后下、先左后右）排列，保留版面顺序
+            blocks = sorted(
+                (b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()),
+                key=lambda b: (round(b[1]), b[0]),
+            )
+            text = "\n".join(b[4].strip() for b in blocks)
+            pages.append(f"[第 {i} 页]\n{text}")
+            if len(text) < PDF_MIN_PAGE_CHARS or page.get_images():
+                name = f"page_{i:03d}.png"
+                page.get_pixmap(dpi=PDF_RENDER_DPI).save(os.path.join(out_dir, name))
+                files.append(name)
+    return "\n\n".join(pages), files
+
+
+def _prepare_pptx(path: str, out_dir: str) -> Tuple[str, List[str]]:
+    try:
+        from pptx import Presentation
+        from pptx.enum.shapes import MSO_SHAPE_TYPE
+    except ImportError:
+        raise UnsupportedAttachment("需要安装 python-pptx")
+    from PIL import Image
+
+    slides, files = [], []
+    for i, slide in enumerate(Presentation(path).slides, 1):
+        lines = []
+        shapes = sorted(slide.shapes, key=lambda s: (s.top or 0, s.left or 0))
+        for j, shape in enumerate(shapes):
+            if shape.has_text_frame and shape.text_frame.text.strip():
+                lines.append(shape.text_frame.text.strip())
+            elif getattr(shape, "has_table", False) and shape.has_table:
+                for row in shape.table.rows:
+                    lines.append(" | ".join(cell.text.strip() for cell in row.cells))
+            elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+                with Image.open(io.BytesIO(shape.image.blob)) as image:
+                    files.append(_encode_image(image, out_dir, f"slide_{i:03d}_{j:02d}"))
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame.text.strip():
+            lines.append(f"备注: {slide.notes_slide.notes_text_frame.text.strip()}")
+        slides.append(f"[第 {i} 页]\n" + "\n".join(lines))
+    return "\n\n".join(slides), files
+
+
+def _prepare_audio(path: str, out_dir: str) -> Tuple[str, List[str]]:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise UnsupportedAttachment("需要安装 ffmpeg")
+    subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-i", path, "-vn", "-ac", "1", "-ar", "16000",
+         "-f", "segment", "-segment_time", str(AUDIO_SEGMENT_SECONDS), "-c:a", "libmp3lame", "-b:a", "32k",
+         os.path.join(out_dir, "segment_%03d.mp3")],
+        check=True, capture_output=True, timeout=600,
+    )
+    files = sorted(f for f in os.listdir(out_dir) if f.startswith("segment_"))
+    text = f"音频已按每段 {AUDIO_SEGMENT_SECONDS} 秒切分为 {len(files)} 段，按顺序给出"
+    return text, files
+
+
+def _prepare_video(path: str, out_dir: str) -> Tuple[str, List[str]]:
+    try:
+        import cv2
+    except ImportError:
+        raise UnsupportedAttachment("需要安装 opencv-python")
+    from PIL import Image
+    from util.video_keyframes import extract_keyframes, format_timestamp
+
+    frames, info = extract_keyframes(path, max_frames=VIDEO_MAX_FRAMES)
+    lines, files = [], []
+    for i, frame in enumerate(frames, 1):
+        seconds = int(frame.timestamp)
+        image = Image.fromarray(cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB))
+        name = _encode_image(image, out_dir, f"frame_{i:03d}_{seconds // 60:02d}m{seconds % 60:02d}s")
+        lines.append(f"[{format_timestamp(frame.timestamp)}] {name}")
+        files.append(name)
+    text = (f"视频时长约 {info['duration']:.0f} 秒，按画面切换抽取并去重后得到 {len(files)} 个关键帧，"
+            f"按时间顺序给出：\n" + "\n".join(lines))
+    return text, files
+
+
+PREPARERS = {
+    **{ext: ("image", _prepare_image) for ext in IMAGE_EXTENSIONS},
+    **{ext: ("audio", _prepare_audio) for ext in AUDIO_EXTENSIONS},
+    **{ext: ("video", _prepare_video) for ext in VIDEO_EXTENSIONS},
+    ".pdf": ("pdf", _prepare_pdf),
+    ".pptx": ("pptx", _prepare_pptx),
+}
+
+
+# ----------------------------------------------------------------------
+# 缓存与批量处理
+# ----------------------------------------------------------------------
+
+def _raw(path: str) -> PreparedAttachment:
+    return PreparedAttachment(path=path, kind="raw", files=[path])
+
+
+def _from_manifest(path: str, entry_dir: str, manifest: dict) -> PreparedAttachment:
+    return PreparedAttachment(
+        path=path,
+        kind=manifest["kind"],
+        text=manifest.get("text", ""),
+        files=[os.path.join(entry_dir, f) for f in manifest.get("files", [])],
+    )
+
+
+def lookup_cached(path: str, cache_dir: str = CACHE_DIR) -> Optional[PreparedAttachment]:
+    """只查缓存，不做处理；不需要预处理的附件直接返回原文件"""
+    if _extension(path) not in PREPARERS or not os.path.isfile(path):
+        return _raw(path)
+    entry_dir = _entry_dir(cache_dir, file_digest(path))
+    try:
+        with open(os.path.join(entry_dir, "manifest.json"), "r", encoding="utf-8") as fin:
+            return _from_manifest(path, entry_dir, json.load(fin))
+    except (OSError, ValueError):
+        return None
+
+
+def prepare_attachment(path: str, cache_dir: str = CACHE_DIR) -> PreparedAttachment:
+    """预处理单个附件，命中缓存时直接返回；处理失败或缺少依赖时返回原文件"""
+    cached = lookup_cached(path, cache_dir)
+    if cached is not None:
+        return cached
+    kind, preparer = PREPARERS[_extension(path)]
+    entry_dir = _entry_dir(cache_dir, file_digest(path))
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        text, files = preparer(path, tmp_dir)
+        manifest = {"version": PREP_VERSION, "source": os.path.basename(path), "kind": kind,
+                    "text": text, "files": files}
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as fout:
+            json.dump(manifest, fout, ensure_ascii=False)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # 其他进程已写入同一份内容
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return _from_manifest(path, entry_dir, manifest)
+    except UnsupportedAttachment as e:
+        logger.debug(f"附件 {path} 未预处理: {e}")
+    except Exception as e:
+        logger.warning(f"附件 {path} 预处理失败，改用原文件: {type(e).__name__}: {e}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return _raw(path)
+
+
+def prepare_attachments(paths: List[str], workers: Optional[int] = None,
+                        cache_dir: str = CACHE_DIR) -> Dict[str, PreparedAttachment]:
+    """批量预处理，未命中缓存的附件交给进程池；返回 路径 -> 预处理结果"""
+    paths = list(dict.fromkeys(paths))
+    results: Dict[str, PreparedAttachment] = {}
+    pending: Dict[str, str] = {}  # digest -> path，内容相同的文件只处理一次
+    for path in paths:
+        cached = lookup_cached(path, cache_dir)
+        if cached is not None:
+            results[path] = cached
+        else:
+            pending.setdefault(file_digest(path), path)
+
+    todo = list(pending.values())
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    if workers <= 1:
+        done = [prepare_attachment(path, cache_dir) for path in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(prepare_attachment, todo, [cache_dir] * len(todo)))
+    skipped = sum(1 for d in done if d.kind == "raw")
+    logger.info(f"附件预处理: 共 {len(paths)} 个，命中缓存 {len(results)} 个，新处理 {len(todo) - skipped} 个，"
+                f"{skipped} 个因缺少依赖或处理失败使用原文件")
+
+    for path in paths:
+        if path not in results:
+            results[path] = lookup_cached(path, cache_dir) or _raw(path)
+    return results
+
+
+# ----------------------------------------------------------------------
+# 接入 agent
+# ----------------------------------------------------------------------
+
+def rewrite_query_parts(parts: list, cache_dir: str = CACHE_DIR, max_text_tokens: int = MAX_TEXT_TOKENS) -> list:
+    """把 parts 中的本地附件替换为预处理后的文字和文件"""
+    rewritten = []
+    for p in parts:
+        part = p.get("part", {}) if isinstance(p, dict) else {}
+        path = str(part.get("data", ""))
+        if part.get("content_type") != "path" or not os.path.isfile(path):
+            rewritten.append(p)
+            continue
+        prepared = prepare_attachment(path, cache_dir)
+        if prepared.kind == "raw":
+            rewritten.append(p)
+            continue
+        if prepared.text:
+            text = truncate_to_tokens(prepared.text, max_text_tokens)
+            rewritten.append({"part": {"content_type": "text/plain",
+                                       "data": f"[附件 {os.path.basename(path)} 的预处理内容]\n{text}"}})
+        rewritten.extend({"part": {"content_type": "path", "data": f}} for f in prepared.files)
+    return rewritten
+
+
+def enable_attachment_prep(agent, cache_dir: str = CACHE_DIR, max_text_tokens: int = MAX_TEXT_TOKENS):
+    """通过 func_process_input 钩子，在 agent 组装多模态输入之前替换附件"""
+    inner_process_input = agent.func_process_input
+
+    async def prepared_input(oxy_request: OxyRequest) -> OxyRequest:
+        oxy_request = await inner_process_input(oxy_request)
+        query = oxy_request.arguments.get("query")
+        if isinstance(query, list):
+            oxy_request.arguments["query"] = await asyncio.to_thread(
+                rewrite_query_parts, query, cache_dir, max_text_tokens
+            )
+        return oxy_request
+
+    object.__setattr__(agent, "func_process_input", prepared_input)
+    return agent
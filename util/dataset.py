@@ -0,0 +1,209 @@
+"""
+数据集读取与索引
+一遍扫描 data.jsonl，建立 task_id / level 到字节偏移的索引并持久化到 cache_dir/dataset_index，
+之后通过 mmap 按偏移直接读取单条任务，不必每次重新解析整个文件；源文件变化（大小或修改时间）时自动重建。
+解析失败的行会记录行号与错误信息，而不是静默跳过。
+
+用法:
+    dataset = TaskDataset.open("valid")
+    task = dataset.get("fddfe2fc")
+    for task in dataset.iter_level(2): ...
+    dataset.attachments(task)  # 附件的绝对路径
+"""
+import ast
+import json
+import logging
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_DIR = os.path.join(PROJECT_ROOT, "data", "初赛数据集")
+INDEX_DIR = os.path.join(PROJECT_ROOT, "cache_dir", "dataset_index")
+INDEX_VERSION = 1
+
+# 各数据集可能的位置（按顺序查找），附件与 data.jsonl 位于同一目录
+SPLIT_DIRS = {
+    "valid": [os.path.join(DATASET_DIR, "valid")],
+    "test": [os.path.join(DATASET_DIR, "test"), os.path.join(DATASET_DIR, "valid", "test")],
+}
+
+
+def resolve_split_dir(split: str) -> str:
+    """返回数据集所在目录"""
+    for folder in SPLIT_DIRS[split]:
+        if os.path.exists(os.path.join(folder, "data.jsonl")):
+            return folder
+    raise FileNotFoundError(f"未找到 {split} 数据集: {SPLIT_DIRS[split]}")
+
+
+def parse_file_names(file_name) -> List[str]:
+    """file_name 字段可能是空串、列表或 "['a.pdf', 'b.jpg']" 形式的字符串"""
+    if not file_name:
+        return []
+    if isinstance(file_name, list):
+        return [str(f) for f in file_name if f]
+    try:
+        value = ast.literal_eval(file_name)
+        if isinstance(value, (list, tuple)):
+            return [str(f) for f in value if f]
+        return [str(value)]
+    except (ValueError, SyntaxError):
+        # 兼容 "[xada2.png]" 这类没有引号的写法
+        return [f.strip(" '\"") for f in file_name.strip("[]").split(",") if f.strip(" '\"")]
+
+
+def resolve_attachments(split_dir: str, file_name) -> List[str]:
+    """把 file_name 字段解析为附件的绝对路径；"逛京东_副本,mp4" 这类把 . 写成 , 的文件名会尝试修正"""
+    paths = []
+    for name in parse_file_names(file_name):
+        path = os.path.abspath(os.path.join(split_dir, name))
+        if not os.path.exists(path) and "," in name and "." not in os.path.basename(name):
+            fixed = os.path.abspath(os.path.join(split_dir, ".".join(name.rsplit(",", 1))))
+            if os.path.exists(fixed):
+                path = fixed
+        if not os.path.exists(path):
+            logger.warning(f"附件不存在: {path}")
+        paths.append(path)
+    return paths
+
+
+def scan_jsonl(path: str) -> dict:
+    """一遍扫描 jsonl，返回偏移索引：task_id -> [offset, length]、level -> [task_id]、解析失败的行"""
+    by_task_id: Dict[str, List[int]] = {}
+    by_level: Dict[str, List[str]] = {}
+    bad_lines = []
+    offset = 0
+    with open(path, "rb") as fin:
+        for lineno, raw in enumerate(fin, 1):
+            length = len(raw)
+            if raw.strip():
+                try:
+                    task = json.loads(raw)
+                    task_id = str(task["task_id"])
+                except (ValueError, KeyError, TypeError) as e:
+                    bad_lines.append({"lineno": lineno, "offset": offset, "error": f"{type(e).__name__}: {e}"})
+                else:
+                    if task_id in by_task_id:
+                        bad_lines.append({"lineno": lineno, "offset": offset, "error": f"重复的 task_id: {task_id}"})
+                    else:
+                        by_task_id[task_id] = [offset, length]
+                        by_level.setdefault(str(task.get("level")), []).append(task_id)
+            offset += length
+    stat = os.stat(path)
+    return {
+        "version": INDEX_VERSION,
+        "source": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "by_task_id": by_task_id,
+        "by_level": by_level,
+        "bad_lines": bad_lines,
+    }
+
+
+class TaskDataset:
+    """带持久化偏移索引的 data.jsonl 读取器"""
+
+    def __init__(self, split_dir: str, index_dir: str = INDEX_DIR):
+        self.split_dir = split_dir
+        self.path = os.path.join(split_dir, "data.jsonl")
+        rel = os.path.relpath(os.path.abspath(split_dir), DATASET_DIR).replace(os.sep, "_").strip("._")
+        self.index_path = os.path.join(index_dir, f"{rel or 'data'}.index.json")
+        self.index = self._load_index()
+        for bad in self.index["bad_lines"]:
+            logger.warning(f"{self.path} 第 {bad['lineno']} 行无法使用: {bad['error']}")
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.index["size"] else None
+
+    @classmethod
+    def open(cls, split: str) -> "TaskDataset":
+        return cls(resolve_split_dir(split))
+
+    def _load_index(self) -> dict:
+        stat = os.stat(self.path)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as fin:
+                    index = json.load(fin)
+                if (index.get("version") == INDEX_VERSION and index.get("size") == stat.st_size
+                        and index.get("mtime") == stat.st_mtime):
+                    return index
+            except (OSError, ValueError):
+                pass
+        index = scan_jsonl(self.path)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fout:
+            json.dump(index, fout, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        return index
+
+    @property
+    def bad_lines(self) -> List[dict]:
+        return self.index["bad_lines"]
+
+    @property
+    def task_ids(self) -> List[str]:
+        """按文件顺序排列的 task_id"""
+        return list(self.index["by_task_id"])
+
+    @property
+    def levels(self) -> List[str]:
+        return sorted(self.index["by_level"])
+
+    def __len__(self) -> int:
+        return len(self.index["by_task_id"])
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.index["by_task_id"]
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """按 task_id 直接读取单条任务"""
+        entry = self.index["by_task_id"].get(task_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(self._mmap[offset:offset + length])
+
+    def __iter__(self) -> Iterator[dict]:
+        for task_id in self.index["by_task_id"]:
+            yield self.get(task_id)
+
+    def iter_level(self, level) -> Iterator[dict]:
+        for task_id in self.index["by_level"].get(str(level), []):
+            yield self.get(task_id)
+
+    def attachments(self, task: dict) -> List[str]:
+        """把任务的 file_name 解析为附件的绝对路径"""
+        return resolve_attachments(self.split_dir, task.get("file_name"))
+
+    def split_by_level(self, output_pattern: str) -> Dict[str, int]:
+        """按 level 写出子集，output_pattern 中的 {level} 会被替换，返回各 level 的条数"""
+        counts = {}
+        outputs = {}
+        try:
+            for level, task_ids in self.index["by_level"].items():
+                path = output_pattern.format(level=level)
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                outputs[level] = open(path, "w", encoding="utf-8")
+                for task_id in task_ids:
+                    outputs[level].write(json.dumps(self.get(task_id), ensure_ascii=False) + "\n")
+                counts[level] = len(task_ids)
+        finally:
+            for fout in outputs.values():
+                fout.close()
+        return counts
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
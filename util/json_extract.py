@@ -0,0 +1,89 @@
+"""
+从 LLM 输出中提取 JSON 对象
+按字符扫描，跟踪括号深度和字符串/转义状态，一遍即可找到第一个完整的顶层对象，
+不会像贪婪正则那样回溯整段文本，也不会把对象后面带括号的说明文字一并截进来。
+扫描器可以逐段喂入流式输出，对象闭合的那一刻就能拿到结果。
+
+用法:
+    scanner = JsonObjectScanner()
+    for chunk in stream:
+        obj = scanner.feed(chunk)
+        if obj is not None:
+            break
+"""
+import json
+from typing import Iterable, Optional
+
+
+class JsonObjectScanner:
+    """增量式的平衡括号扫描器，只返回能被 json 解析的对象文本"""
+
+    def __init__(self):
+        self._parts = []     # 当前候选对象已收到的片段
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result: Optional[str] = None
+        self.first_candidate: Optional[str] = None  # 第一个括号平衡但解析失败的片段，用于兜底
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """喂入一段文本；找到完整的 JSON 对象后返回其文本，否则返回 None"""
+        if self.result is not None or not chunk:
+            return self.result
+        start = 0 if self._depth else None  # 候选对象在本段中的起点
+        for i, ch in enumerate(chunk):
+            if not self._depth:
+                if ch == "{":
+                    start, self._depth = i, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if not self._depth:
+                    self._parts.append(chunk[start:i + 1])
+                    candidate = "".join(self._parts)
+                    self._parts = []
+                    if self._is_json(candidate):
+                        self.result = candidate
+                        return candidate
+                    # 不是合法 JSON（例如说明文字里的 {xxx}），继续寻找下一个对象
+                    if self.first_candidate is None:
+                        self.first_candidate = candidate
+                    self._in_string = self._escape = False
+                    start = None
+        if self._depth:
+            self._parts.append(chunk[start:])
+        return None
+
+    @staticmethod
+    def _is_json(candidate: str) -> bool:
+        try:
+            json.loads(candidate)
+            return True
+        except ValueError:
+            return False
+
+
+def extract_json_object(chunks: Iterable[str]) -> Optional[str]:
+    """从文本或文本片段序列中提取第一个完整的 JSON 对象"""
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    scanner = JsonObjectScanner()
+    for chunk in chunks:
+        if scanner.feed(chunk) is not None:
+            return scanner.result
+    return scanner.first_candidate
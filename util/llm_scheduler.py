@@ -0,0 +1,227 @@
+"""
+LLM 自适应并发调度
+所有 agent 共用同一个 LLM，原来用固定的 semaphore=4 限流：调高会触发 429，调低则批量运行时吞吐不足，
+而且 planner 这类深层调用可能排在大量叶子 agent 的调用后面。这里改为由调度器放行 LLM 调用：
+    - 并发上限按 AIMD 调整：调用成功且延迟正常时缓慢增加，遇到 429 / 超时时减半
+    - 可选的每分钟 token 预算（令牌桶），按估算的输入 token 加上平均输出 token 预扣
+    - 等待的调用按优先级放行：指定 agent 的优先级 > 所属 trace 的开始先后 > 调用深度（越深越先），
+      让已经在执行的任务先完成，再开始新任务
+    - 按调用方 agent 统计排队等待时间
+
+用法（需在 MAS 初始化之前调用，且在 LLM 缓存之前，使缓存命中不必排队）:
+    schedulers = enable_llm_scheduler(oxy_space, max_limit=16, tokens_per_minute=200000)
+    schedulers["default_llm"].stats()
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+from oxygent.oxy.llms.base_llm import BaseLLM
+from oxygent.schemas import OxyRequest, OxyResponse
+
+from util.token_counter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """429 / 限流 / 超时类错误，需要降低并发"""
+    for obj in (error, getattr(error, "response", None)):
+        if getattr(obj, "status_code", None) == 429 or getattr(obj, "status", None) == 429:
+            return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(k in text for k in ("429", "rate limit", "ratelimit", "too many requests", "timeout", "timed out"))
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "agent", "enqueued")
+
+    def __init__(self, future: asyncio.Future, tokens: int, agent: str):
+        self.future = future
+        self.tokens = tokens
+        self.agent = agent
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """AIMD 并发上限 + token 预算 + 优先级队列"""
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        tokens_per_minute: int = 0,
+        latency_tolerance: float = 2.0,
+        agent_priority: Optional[Dict[str, int]] = None,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tokens_per_minute = tokens_per_minute
+        self.latency_tolerance = latency_tolerance
+        # 数值越小越优先，未列出的 agent 为 0
+        self.agent_priority = agent_priority or {}
+        self.inflight = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._trace_order: "OrderedDict[str, int]" = OrderedDict()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._latency_ewma = 0.0
+        self._latency_floor = 0.0
+        self._last_decrease = 0.0
+        self._avg_output_tokens = 500.0
+        self._waits: Dict[str, deque] = {}
+        self.completed = 0
+        self.rate_limited = 0
+
+    # ------------------------------------------------------------------
+    # 放行
+    # ------------------------------------------------------------------
+
+    def _priority(self, oxy_request: OxyRequest) -> tuple:
+        agent = oxy_request.caller or ""
+        trace_id = oxy_request.current_trace_id or ""
+        if trace_id not in self._trace_order:
+            self._trace_order[trace_id] = next(self._seq)
+            if len(self._trace_order) > 10000:
+                self._trace_order.popitem(last=False)
+        return (self.agent_priority.get(agent, 0), self._trace_order[trace_id],
+                -len(oxy_request.call_stack), next(self._seq))
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute,
+                           self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """按优先级放行等待的调用，直到达到并发上限或 token 预算不足"""
+        self._wakeup = None
+        self._refill()
+        while self._heap and self.inflight < int(self.limit):
+            waiter = self._heap[0][-1]
+            if waiter.future.done():  # 已取消
+                heapq.heappop(self._heap)
+                continue
+            # 单次调用超过整个预算时按预算放行，避免永远等待
+            need = min(waiter.tokens, self.tokens_per_minute)
+            if self.tokens_per_minute and self._tokens < need:
+                delay = (need - self._tokens) * 60 / self.tokens_per_minute
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._heap)
+            if self.tokens_per_minute:
+                self._tokens -= need
+            self.inflight += 1
+            waiter.future.set_result(None)
+
+    async def acquire(self, oxy_request: OxyRequest, tokens: int):
+        agent = oxy_request.caller or "unknown"
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, agent)
+        heapq.heappush(self._heap, (*self._priority(oxy_request), waiter))
+        if self._wakeup is None:
+            self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(0.0, ok=False, rate_limited=False)
+            raise
+        self._waits.setdefault(agent, deque(maxlen=10000)).append(time.monotonic() - waiter.enqueued)
+
+    def release(self, latency: float, ok: bool, rate_limited: bool, output_tokens: int = 0):
+        self.inflight -= 1
+        now = time.monotonic()
+        if rate_limited:
+            self.rate_limited += 1
+            # 每个往返时间内只减一次，同一批并发调用的多个 429 不会把上限连续减半
+            if now - self._last_decrease > (self._latency_ewma or 1.0):
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+                logger.info(f"LLM 调用被限流，并发上限降为 {int(self.limit)}")
+        elif ok:
+            self.completed += 1
+            self._latency_ewma = latency if not self._latency_ewma else 0.8 * self._latency_ewma + 0.2 * latency
+            # 延迟下限缓慢上浮，以适应输出变长等正常变化
+            self._latency_floor = (self._latency_ewma if not self._latency_floor
+                                   else min(self._latency_floor * 1.01, self._latency_ewma))
+            if output_tokens:
+                self._avg_output_tokens = 0.9 * self._avg_output_tokens + 0.1 * output_tokens
+            if self._latency_ewma <= self._latency_floor * self.latency_tolerance:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if self.tokens_per_minute and output_tokens:
+            # 预扣时按平均输出估算，这里按实际输出补差
+            self._tokens -= output_tokens - self._avg_output_tokens
+        if self._wakeup is None:
+            self._dispatch()
+
+    def estimate_request_tokens(self, oxy_request: OxyRequest) -> int:
+        messages = oxy_request.arguments.get("messages", [])
+        return estimate_tokens(str(messages)) + int(self._avg_output_tokens)
+
+    def stats(self) -> dict:
+        waits = {}
+        for agent, values in self._waits.items():
+            values = sorted(values)
+            waits[agent] = {
+                "calls": len(values),
+                "wait_avg": round(sum(values) / len(values), 4),
+                "wait_p95": round(values[int((len(values) - 1) * 0.95)], 4),
+                "wait_max": round(values[-1], 4),
+            }
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": sum(1 for *_, w in self._heap if not w.future.done()),
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "latency_ewma": round(self._latency_ewma, 3),
+            "queue_wait": waits,
+        }
+
+
+def wrap_llm(llm: BaseLLM, scheduler: LLMScheduler):
+    """通过 func_execute 钩子让 LLM 调用经过调度器；原有的固定信号量放宽到调度器的上限"""
+    inner_execute = llm.func_execute or llm._execute
+    llm.semaphore = scheduler.max_limit
+    llm._semaphore = asyncio.Semaphore(scheduler.max_limit)
+
+    async def scheduled_execute(oxy_request: OxyRequest) -> OxyResponse:
+        await scheduler.acquire(oxy_request, scheduler.estimate_request_tokens(oxy_request))
+        start = time.monotonic()
+        try:
+            oxy_response = await inner_execute(oxy_request)
+        except asyncio.CancelledError:
+            scheduler.release(time.monotonic() - start, ok=False, rate_limited=False)
+            raise
+        except Exception as e:
+            scheduler.release(time.monotonic() - start, ok=False, rate_limited=is_rate_limited(e))
+            raise
+        scheduler.release(time.monotonic() - start, ok=True, rate_limited=False,
+                          output_tokens=estimate_tokens(oxy_response.output))
+        return oxy_response
+
+    object.__setattr__(llm, "func_execute", scheduled_execute)
+    return llm
+
+
+def enable_llm_scheduler(oxy_space: list, names: Optional[list] = None, **kwargs) -> Dict[str, LLMScheduler]:
+    """给 oxy_space 中的 LLM（或 names 指定的 LLM）各配一个调度器，初始并发取各自原来的 semaphore"""
+    schedulers = {}
+    for oxy in oxy_space:
+        if isinstance(oxy, BaseLLM) and (names is None or oxy.name in names):
+            scheduler = LLMScheduler(initial_limit=oxy.semaphore, **kwargs)
+            scheduler.max_limit = max(scheduler.max_limit, oxy.semaphore)
+            wrap_llm(oxy, scheduler)
+            schedulers[oxy.name] = scheduler
+            logger.info(f"LLM 调度器已开启: {oxy.name}，初始并发 {int(scheduler.limit)}，上限 {scheduler.max_limit}")
+    return schedulers
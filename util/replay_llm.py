@@ -0,0 +1,258 @@
+"""
+本地回放 LLM 服务
+启动一个 OpenAI 兼容的 /v1/chat/completions 服务，用 local_es_data 中记录过的 LLM 输出回答请求，
+不访问网络、延迟可控，用于在没有真实模型的情况下测量 agent 编排本身的开销。回放数据来自：
+    - app_node 中 node_type 为 llm 的记录：完整的 messages 与输出
+    - app_history 中各子会话的 react_memory：每条 assistant 消息对应当时的对话内容，answer 对应最后一轮
+按以下顺序匹配请求：
+    1. messages 规范化后完全一致（时间戳等易变内容会被替换为占位符）
+    2. 同一个 agent 的最近几条非系统消息一致
+    3. 同一个 agent 中最近几条消息最相似的记录（相似度不低于 min_similarity）
+都未命中时返回固定的兜底回答（普通文本，ReAct agent 会把它当作最终答案结束）。
+调用方 agent 通过请求头 X-Oxy-Caller 传入（见 enable_replay_headers），没有请求头时按系统提示词识别。
+
+用法:
+    python -m util.replay_llm --port 18000 --latency 0.2 --jitter 0.05
+    # .env 中把 DEFAULT_LLM_BASE_URL 改为 http://127.0.0.1:18000/v1
+"""
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from util.trace_analytics import DEFAULT_DATA_DIR, iter_node_records
+
+logger = logging.getLogger(__name__)
+
+CALLER_HEADER = "X-Oxy-Caller"
+FALLBACK_ANSWER = "[replay] 没有找到匹配的录制回答。"
+TAIL_MESSAGES = 3  # 按最近几条非系统消息匹配
+_VOLATILE = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?"), "<datetime>"),
+    (re.compile(r"\b[0-9a-f]{32,64}\b"), "<hash>"),
+    (re.compile(r"/tmp/[\w./-]+"), "<tmpfile>"),
+]
+
+
+def normalize_text(content) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    for pattern, placeholder in _VOLATILE:
+        content = pattern.sub(placeholder, content)
+    return re.sub(r"\s+", " ", content).strip()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _split(messages: List[dict]) -> Tuple[str, List[str]]:
+    """返回 (规范化的系统提示词, 规范化的其余消息)"""
+    system, rest = "", []
+    for message in messages or []:
+        text = normalize_text(message.get("content", ""))
+        if message.get("role") == "system" and not rest:
+            system = text
+        else:
+            rest.append(f"{message.get('role')}: {text}")
+    return system, rest
+
+
+def _tail(rest: List[str]) -> str:
+    return "\n".join(rest[-TAIL_MESSAGES:])
+
+
+class ReplayIndex:
+    """录制的 (agent, 对话) -> LLM 输出"""
+
+    def __init__(self, min_similarity: float = 0.6):
+        self.min_similarity = min_similarity
+        self._exact: Dict[str, str] = {}
+        self._by_tail: Dict[Tuple[str, str], str] = {}
+        self._records: Dict[str, List[Tuple[str, str]]] = {}  # agent -> [(tail, 输出)]
+        self._systems: Dict[str, str] = {}  # 系统提示词摘要 -> agent
+        self._resolved: Dict[str, Tuple[str, str]] = {}
+        self.counts = Counter()
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    def add(self, agent: str, messages: List[dict], output: str):
+        if not output:
+            return
+        system, rest = _split(messages)
+        if system:
+            self._exact.setdefault(_digest(system + "\n" + "\n".join(rest)), output)
+            self._systems.setdefault(_digest(system), agent)
+        tail = _tail(rest)
+        if (agent, tail) not in self._by_tail:
+            self._by_tail[(agent, tail)] = output
+            self._records.setdefault(agent, []).append((tail, output))
+
+    def load(self, data_dir: str = DEFAULT_DATA_DIR) -> "ReplayIndex":
+        for record in iter_node_records(data_dir, "app_node"):
+            if record.get("node_type") != "llm":
+                continue
+            try:
+                messages = json.loads(record.get("input") or "{}").get("arguments", {}).get("messages", [])
+            except (TypeError, ValueError):
+                continue
+            self.add(record.get("caller", ""), messages, record.get("output") or "")
+        for record in iter_node_records(data_dir, "app_history"):
+            try:
+                memory = json.loads(record.get("memory") or "{}")
+            except (TypeError, ValueError):
+                continue
+            agent = str(record.get("session_name", "")).split("__")[-1]
+            # 子会话中的每条 assistant 消息都是一次 LLM 输出，answer 是最后一次
+            conversation = [{"role": "user", "content": memory.get("query", "")}]
+            for message in memory.get("react_memory") or []:
+                if message.get("role") == "assistant":
+                    self.add(agent, conversation, message.get("content", ""))
+                conversation.append(message)
+            self.add(agent, conversation, memory.get("answer", ""))
+        logger.info(f"回放数据已加载: {len(self)} 条，涉及 {len(self._records)} 个 agent")
+        return self
+
+    def lookup(self, messages: List[dict], caller: Optional[str] = None) -> Tuple[str, str]:
+        """返回 (输出, 匹配方式)，匹配方式为 exact / tail / similar / fallback"""
+        system, rest = _split(messages)
+        key = _digest(f"{caller}\n{system}\n" + "\n".join(rest))
+        if key not in self._resolved:
+            self._resolved[key] = self._match(system, rest, caller)
+        output, kind = self._resolved[key]
+        self.counts[kind] += 1
+        return output, kind
+
+    def _match(self, system: str, rest: List[str], caller: Optional[str]) -> Tuple[str, str]:
+        output = self._exact.get(_digest(system + "\n" + "\n".join(rest)))
+        if output is not None:
+            return output, "exact"
+        agent = caller or self._systems.get(_digest(system))
+        tail = _tail(rest)
+        if agent and (agent, tail) in self._by_tail:
+            return self._by_tail[(agent, tail)], "tail"
+        # 不知道调用方时在全部记录中找
+        candidates = self._records.get(agent) if agent in self._records else [
+            record for records in self._records.values() for record in records
+        ]
+        best, best_ratio = None, self.min_similarity
+        for recorded_tail, recorded_output in candidates:
+            matcher = difflib.SequenceMatcher(None, tail[-2000:], recorded_tail[-2000:], autojunk=False)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = recorded_output, ratio
+        if best is not None:
+            return best, "similar"
+        return FALLBACK_ANSWER, "fallback"
+
+
+def create_app(index: ReplayIndex, latency: float = 0.0, jitter: float = 0.0, seconds_per_token: float = 0.0):
+    """创建 FastAPI 应用；延迟按请求内容确定，同一请求每次的延迟相同"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    from util.token_counter import estimate_tokens
+
+    app = FastAPI()
+    stats = {"requests": 0, "busy_seconds": 0.0}
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "replay", "object": "model", "owned_by": "local"}]}
+
+    @app.get("/replay/stats")
+    async def replay_stats():
+        return {**stats, "matches": dict(index.counts), "records": len(index)}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        output, kind = index.lookup(messages, request.headers.get(CALLER_HEADER))
+        rng = random.Random(_digest(json.dumps(messages, ensure_ascii=False, sort_keys=True, default=str)))
+        delay = max(latency + rng.uniform(-jitter, jitter), 0.0) + seconds_per_token * estimate_tokens(output)
+        stats["requests"] += 1
+        stats["busy_seconds"] += delay
+        if delay:
+            await asyncio.sleep(delay)
+        created, model = int(time.time()), body.get("model", "replay")
+        completion_id = f"chatcmpl-replay-{stats['requests']}"
+        headers = {"X-Replay-Match": kind}
+        if body.get("stream"):
+            def events():
+                for delta, finish in (({"role": "assistant", "content": output}, None), ({}, "stop")):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+        prompt_tokens = estimate_tokens(" ".join(str(m.get("content", "")) for m in messages))
+        completion_tokens = estimate_tokens(output)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }, headers=headers)
+
+    return app
+
+
+def enable_replay_headers(oxy_space: list) -> list:
+    """让 OpenAILLM 在请求头中带上调用方 agent，回放服务据此精确匹配。返回处理过的 LLM 名称"""
+    from oxygent.oxy.llms.openai_llm import OpenAILLM
+
+    wrapped = []
+    for llm in oxy_space:
+        if not isinstance(llm, OpenAILLM):
+            continue
+        inner_execute = llm.func_execute or llm._execute
+
+        def make(inner_execute=inner_execute):
+            async def tagged_execute(oxy_request):
+                # OpenAILLM 会把 messages 以外的参数原样传给 chat.completions.create
+                oxy_request.arguments["extra_headers"] = {CALLER_HEADER: oxy_request.caller or ""}
+                return await inner_execute(oxy_request)
+            return tagged_execute
+
+        object.__setattr__(llm, "func_execute", make())
+        wrapped.append(llm.name)
+    return wrapped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用 local_es_data 中录制的输出回放 OpenAI 兼容的 LLM 接口")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="local_es_data 目录")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--latency", type=float, default=0.0, help="每次调用的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机浮动范围（秒），按请求内容固定")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0, help="按输出 token 数追加的延迟")
+    parser.add_argument("--min-similarity", type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    index = ReplayIndex(min_similarity=args.min_similarity).load(args.data_dir)
+    app = create_app(index, args.latency, args.jitter, args.seconds_per_token)
+    print(f"✅ 回放服务: http://{args.host}:{args.port}/v1 （{len(index)} 条录制输出）")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
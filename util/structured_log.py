@@ -0,0 +1,256 @@
+"""
+异步结构化日志
+OxyGent 默认的 setup_logging 在事件循环里同步写 cache_dir/app.log：每个 agent 进出各写一行，每行带完整的
+site-packages 路径和整段 LLM 输出，几次运行就有上万行，批量并发时文件 I/O 出现在热路径上。这里改为：
+    - 业务代码只把日志记录放进有界队列（满了直接丢弃并计数，不阻塞事件循环），由后台线程格式化和写文件
+    - 每行一个 JSON：time / level / trace_id / node_id / callee / event（call / return）/ duration_ms / payload，
+      payload 截断到指定长度；payload_chars=0 时日志只记调用关系和耗时，完整的输入输出只保存在 trace 存储（ES 节点记录）中
+    - 按大小轮转，旧文件在后台线程中 gzip 压缩
+    - 按级别采样：有 trace_id 的记录按 trace 整体采样，同一个请求的日志要么全留要么全丢
+    - 终端输出同样经过队列，格式与 OxyGent 原来的一致
+
+用法（需在 MAS 创建之前调用）:
+    log_writer = enable_structured_logging(oxy_space, "cache_dir/app.jsonl", sample_rates={"INFO": 0.2})
+    log_writer.stats()
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from oxygent import Config
+
+# OxyGent 在 agent / 工具进出时记录的消息："a >>> b >>> c  : query" / "a <<< b <<< c  : output"
+CALL_PATTERN = re.compile(r"^(?P<stack>[^\n]*?(?P<arrow> >>> | <<< )[^\n]*?)  : (?P<payload>.*)$", re.DOTALL)
+# JSON 行中额外保留的 LogRecord 属性
+EXTRA_FIELDS = ("trace_id", "node_id")
+# 等待配对的调用：抛异常、超时或返回记录被丢弃 / 采样掉的调用永远等不到 <<<，按数量和时间淘汰
+MAX_PENDING_CALLS = 10000
+MAX_PENDING_SECONDS = 3600
+
+
+def parse_sample_rates(text: Optional[str]) -> Dict[str, float]:
+    """“INFO=0.2,DEBUG=0” -> {"INFO": 0.2, "DEBUG": 0.0}"""
+    rates = {}
+    for item in (text or "").split(","):
+        if "=" in item:
+            level, rate = item.split("=", 1)
+            rates[level.strip().upper()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class JsonLineFormatter(logging.Formatter):
+    """在后台线程中运行：解析调用 / 返回消息，按 node_id 配对计算耗时"""
+
+    def __init__(self, payload_chars: int = 300):
+        super().__init__()
+        self.payload_chars = payload_chars
+        self._started: "OrderedDict[str, float]" = OrderedDict()  # node_id -> 调用时间，按调用先后排列
+        self.expired = 0
+
+    def _track(self, node_id: str, created: float):
+        self._started[node_id] = created
+        self._started.move_to_end(node_id)
+        while self._started:
+            oldest, started = next(iter(self._started.items()))
+            if len(self._started) <= MAX_PENDING_CALLS and created - started <= MAX_PENDING_SECONDS:
+                break
+            del self._started[oldest]
+            self.expired += 1
+
+    def format(self, record: logging.LogRecord) -> str:
+        # RotatingFileHandler 判断是否轮转时会先格式化一次，配对计时只能做一次
+        cached = getattr(record, "_json_line", None)
+        if cached is not None:
+            return cached
+        record._json_line = self._format(record)
+        return record._json_line
+
+    def _format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value:
+                line[field] = value
+        message = record.getMessage()
+        match = CALL_PATTERN.match(message)
+        if match:
+            stack = match.group("stack").split(match.group("arrow"))
+            line["callee"] = stack[-1].strip()
+            line["depth"] = len(stack) - 1
+            node_id = getattr(record, "node_id", None)
+            if match.group("arrow") == " >>> ":
+                line["event"] = "call"
+                if node_id:
+                    self._track(node_id, record.created)
+            else:
+                line["event"] = "return"
+                started = self._started.pop(node_id, None) if node_id else None
+                if started is not None:
+                    line["duration_ms"] = round((record.created - started) * 1000, 1)
+            message = match.group("payload")
+        else:
+            line["src"] = f"{record.module}:{record.lineno}"
+        if self.payload_chars and message:
+            if len(message) > self.payload_chars:
+                message = f"{message[:self.payload_chars]}…(+{len(message) - self.payload_chars})"
+            line["payload" if match else "msg"] = message
+        elif not match:
+            line["msg"] = message
+        if record.exc_text:
+            line["exc"] = record.exc_text[-2000:]
+        return json.dumps(line, ensure_ascii=False)
+
+
+class SamplingQueueHandler(logging.handlers.QueueHandler):
+    """事件循环中只做采样判断和入队，队列满时丢弃"""
+
+    def __init__(self, log_queue: queue.Queue, sample_rates: Dict[str, float], max_message: int):
+        super().__init__(log_queue)
+        self.sample_rates = sample_rates
+        self.max_message = max_message
+        self.enqueued = 0
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def _keep(self, record: logging.LogRecord) -> bool:
+        rate = self.sample_rates.get(record.levelname, 1.0)
+        if rate >= 1.0:
+            return True
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            return (zlib.crc32(str(trace_id).encode()) % 10000) < rate * 10000
+        return random.random() < rate
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 不在这里格式化整条日志，只合并参数并截掉过长的消息，减少入队的内容
+        message = record.getMessage()
+        if len(message) > self.max_message:
+            message = f"{message[:self.max_message]}…(+{len(message) - self.max_message})"
+        copied = logging.makeLogRecord(record.__dict__)
+        if record.exc_info:
+            copied.exc_text = logging.Formatter().formatException(record.exc_info)
+        copied.msg, copied.args, copied.exc_info = message, None, None
+        return copied
+
+    def emit(self, record: logging.LogRecord):
+        if not self._keep(record):
+            self.sampled_out += 1
+            return
+        super().emit(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as fin, gzip.open(dest, "wb") as fout:
+        shutil.copyfileobj(fin, fout)
+    os.remove(source)
+
+
+class StructuredLogWriter:
+    def __init__(
+        self,
+        path: str,
+        level: int = logging.INFO,
+        max_bytes: int = 20 * 1024 * 1024,
+        backup_count: int = 5,
+        payload_chars: int = 300,
+        sample_rates: Optional[Dict[str, float]] = None,
+        queue_size: int = 10000,
+        console: bool = True,
+    ):
+        self.path = path
+        self.payload_chars = payload_chars
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.namer = lambda name: f"{name}.gz"
+        file_handler.rotator = _gzip_rotator
+        self.formatter = JsonLineFormatter(payload_chars)
+        file_handler.setFormatter(self.formatter)
+        handlers = [file_handler]
+        # OxyGent 的终端格式化会改写 record.trace_id，终端 handler 要排在 JSON 文件之后
+        if console:
+            from oxygent.log_setup import ColorFormatter, ColorMessageFormatter
+
+            stream_handler = logging.StreamHandler()
+            stream_handler.setLevel(Config.get_log_level_terminal())
+            formatter = ColorMessageFormatter if Config.get_log_only_message_color() else ColorFormatter
+            stream_handler.setFormatter(formatter("%(asctime)s - %(levelname)s%(trace_id)s%(node_id)s %(message)s"))
+            handlers.append(stream_handler)
+        # 终端里的 payload 同样截断，完整内容在 trace 存储中
+        max_message = max(payload_chars, 200) * 4 if payload_chars else 200
+        self.handler = SamplingQueueHandler(queue.Queue(maxsize=queue_size), sample_rates or {}, max_message)
+        self.handler.setLevel(level)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+        self.level = level
+        self._stopped = threading.Event()
+
+    def start(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        for name in ("mcp", "httpx", "elasticsearch"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        self.listener.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """写完队列中剩余的日志后退出后台线程"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.handler.enqueued,
+            "sampled_out": self.handler.sampled_out,
+            "dropped": self.handler.dropped,
+            "queued": self.handler.queue.qsize(),
+            "unmatched_calls": len(self.formatter._started),
+            "expired_calls": self.formatter.expired,
+        }
+
+
+def enable_structured_logging(oxy_space: list, path: str, **kwargs) -> StructuredLogWriter:
+    """替换 OxyGent 的 setup_logging：MAS 创建时不再挂同步写文件的 handler"""
+    import oxygent.mas
+
+    writer = StructuredLogWriter(path, **kwargs).start()
+    oxygent.mas.setup_logging = logging.getLogger
+    if not writer.payload_chars:
+        # 日志里不记 payload 时，连 query / output 的消息也不必拼接
+        Config.set_log_is_detailed_tool_call(False)
+        Config.set_log_is_detailed_observation(False)
+        for oxy in oxy_space:
+            object.__setattr__(oxy, "is_detailed_tool_call", False)
+            object.__setattr__(oxy, "is_detailed_observation", False)
+    logging.getLogger(__name__).info(f"结构化日志已开启: {path}")
+    return writer
@@ -1,29 +1,24 @@
 # -*- coding: utf-8 -*-
 import os
-import json
+import sys
 
-def process_jsonl(input_path, level, output_path):
-	with open(input_path, 'r', encoding='utf-8') as fin, open(output_path, 'w', encoding='utf-8') as fout:
-		for line in fin:
-			try:
-				obj = json.loads(line)
-			except Exception:
-				continue
-			if str(obj.get('level')) == str(level):
-				fout.write(json.dumps(obj, ensure_ascii=False) + '\n')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util.dataset import TaskDataset
 
-def main():
-	# 配置输入文件路径
-	train_path = os.path.join(os.path.dirname(__file__), '../data/初赛数据集/test/data.jsonl')
-	val_path = os.path.join(os.path.dirname(__file__), '../data/初赛数据集/valid/data.jsonl')
 
-	for level in [1, 2, 3]:
-		folder = os.path.join(os.path.dirname(__file__), f'task_level_{level}')
-		os.makedirs(folder, exist_ok=True)
-		train_out = os.path.join(folder, f'data_{level}_train.jsonl')
-		val_out = os.path.join(folder, f'data_{level}_val.jsonl')
-		process_jsonl(train_path, level, train_out)
-		process_jsonl(val_path, level, val_out)
+def process_split(split, suffix):
+	"""一遍扫描数据集，按 level 写出 task_level_{level}/data_{level}_{suffix}.jsonl"""
+	with TaskDataset.open(split) as dataset:
+		for bad in dataset.bad_lines:
+			print(f"⚠️  {dataset.path} 第 {bad['lineno']} 行已跳过: {bad['error']}")
+		pattern = os.path.join(os.path.dirname(__file__), 'task_level_{level}', 'data_{level}_' + suffix + '.jsonl')
+		counts = dataset.split_by_level(pattern)
+	print(f"{split}: " + ", ".join(f"level {level} {count} 条" for level, count in sorted(counts.items())))
+
+
+def main():
+	process_split('test', 'train')
+	process_split('valid', 'val')
 
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,49 @@
+"""
+本地 token 估算
+不依赖远程接口或额外的分词器：中日韩字符按 1 个 token 计，其余文本按约 4 个字符 1 个 token 计，
+与 qwen 系列分词结果的量级一致，用于预算控制和统计。
+"""
+import re
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    text = str(text)
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …[truncated]… ") -> str:
+    """把文本截断到大约 max_tokens 个 token，保留开头和结尾"""
+    text = str(text)
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    # 按比例换算成字符数，头部保留 2/3，尾部保留 1/3
+    keep_chars = max(int(len(text) * max_tokens / total), 1)
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    return text[:head] + marker + (text[-tail:] if tail else "")
+
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def content_tokens(content) -> int:
+    """估算单条消息内容的 token 数，多模态内容只计文本部分"""
+    if isinstance(content, list):
+        return sum(
+            estimate_tokens(item.get("text", "")) if isinstance(item, dict) else estimate_tokens(item)
+            for item in content
+        )
+    return estimate_tokens(content)
+
+
+def count_message_tokens(messages) -> int:
+    """估算一组 chat messages 的 prompt token 数"""
+    return sum(content_tokens(m.get("content")) + MESSAGE_OVERHEAD_TOKENS for m in messages or [])
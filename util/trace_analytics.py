@@ -0,0 +1,389 @@
+"""
+离线调用链分析
+逐条读取 local_es_data 中的 app_node 记录（优先读 sqlite 后端，否则增量解析 app_node.json / .bak，不整份载入内存），
+只保留耗时分析需要的字段，按 trace 还原调用树，输出：
+  - 每个 callee 的调用次数与耗时分位数
+  - 每个请求的 LLM 调用次数、总耗时与关键路径
+  - 火焰图数据：collapsed stack（flamegraph.pl / speedscope）与 Chrome trace（chrome://tracing / Perfetto）
+
+用法:
+    python -m util.trace_analytics
+    python -m util.trace_analytics --trace-id 7Dj7yyoGRHgRcHug --collapsed stacks.txt --chrome trace.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, "cache_dir", "local_es_data")
+
+
+def parse_time(value: str) -> Optional[float]:
+    """解析 OxyGent 的 "yyyy-MM-dd HH:mm:ss.SSSSSSSSS" 时间，返回秒级时间戳"""
+    if not value:
+        return None
+    date, _, frac = str(value).partition(".")
+    try:
+        ts = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+    return ts + (float("0." + frac) if frac.isdigit() else 0.0)
+
+
+class Span:
+    """一次 agent / tool / llm 调用"""
+
+    __slots__ = ("node_id", "trace_id", "father_id", "caller", "callee", "node_type",
+                 "start", "end", "query", "children")
+
+    def __init__(self, record: dict):
+        self.node_id = record.get("node_id", "")
+        self.trace_id = record.get("trace_id", "")
+        self.father_id = record.get("father_node_id", "")
+        self.caller = record.get("caller", "")
+        self.callee = record.get("callee", "")
+        self.node_type = record.get("node_type", "")
+        self.start = parse_time(record.get("create_time"))
+        self.end = parse_time(record.get("update_time"))
+        self.query = ""
+        if self.caller == "user":
+            try:
+                self.query = str(json.loads(record.get("shared_data") or "{}").get("query", ""))
+            except (TypeError, ValueError):
+                pass
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        if self.start is None or self.end is None:
+            return 0.0
+        return max(self.end - self.start, 0.0)
+
+    @property
+    def self_time(self) -> float:
+        """去掉子调用覆盖的时间段（并发的子调用按并集计算）"""
+        intervals = sorted((c.start, c.end) for c in self.children if c.start is not None and c.end is not None)
+        covered, cur_start, cur_end = 0.0, None, None
+        for s, e in intervals:
+            s, e = max(s, self.start or s), min(e, self.end or e)
+            if cur_end is None or s > cur_end:
+                if cur_end is not None:
+                    covered += cur_end - cur_start
+                cur_start, cur_end = s, e
+            else:
+                cur_end = max(cur_end, e)
+        if cur_end is not None:
+            covered += max(cur_end - cur_start, 0.0)
+        return max(self.duration - covered, 0.0)
+
+
+def iter_node_records(data_dir: str, index_name: str = "app_node") -> Iterator[dict]:
+    """逐条产出 app_node 记录"""
+    db_path = os.path.join(data_dir, "local_es.sqlite")
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            has_rows = conn.execute("SELECT 1 FROM docs WHERE index_name = ? LIMIT 1", (index_name,)).fetchone()
+            if has_rows:
+                for (body,) in conn.execute("SELECT body FROM docs WHERE index_name = ?", (index_name,)):
+                    yield json.loads(body)
+                return
+        except sqlite3.DatabaseError:
+            pass
+        finally:
+            conn.close()
+    seen = set()
+    for path in (os.path.join(data_dir, f"{index_name}.json"), os.path.join(data_dir, f"{index_name}.json.bak")):
+        if not os.path.exists(path):
+            continue
+        try:
+            for doc_id, record in iter_json_object(path):
+                # 主文件中途损坏时退回 .bak，已产出的记录不再重复
+                if doc_id not in seen and isinstance(record, dict):
+                    seen.add(doc_id)
+                    yield record
+        except (ValueError, UnicodeDecodeError):
+            continue
+        return
+
+
+def iter_json_object(path: str, chunk_size: int = 1 << 16) -> Iterator[tuple]:
+    """增量解析顶层为对象的 JSON 文件，逐个产出 (键, 值)；内存中只保留当前分块和正在解析的一条记录"""
+    with open(path, "r", encoding="utf-8") as fin:
+        yield from scan_json_object(fin, chunk_size)
+
+
+def scan_json_object(fin, chunk_size: int = 1 << 16, raw: bool = False) -> Iterator[tuple]:
+    """iter_json_object 的实现，直接读已打开的文本文件
+
+    raw=True 时额外带上原文，产出 (键, 值, 值之前的原文, 值的原文)，按顺序拼接即为原文件；
+    最后产出 (None, None, 结尾原文, "")，结尾原文为最后一个值之后到文件末尾的部分。
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, mark, eof = "", 0, 0, False  # mark 为 raw 模式下尚未产出的原文起点
+
+    def more() -> bool:
+        nonlocal buffer, pos, mark, eof
+        chunk = fin.read(chunk_size)
+        keep = min(pos, mark) if raw else pos
+        buffer, pos, mark, eof = buffer[keep:] + chunk, pos - keep, max(mark - keep, 0), not chunk
+        return bool(chunk)
+
+    def take() -> str:
+        nonlocal mark
+        text, mark = buffer[mark:pos], pos
+        return text
+
+    def skip(chars: str = " \t\r\n") -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or not more():
+                return buffer[pos] if pos < len(buffer) else ""
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or not more():
+                    raise
+                continue
+            # 数字可能被分块截断（"12" / "1.5e"），读完下一块再解析
+            if (isinstance(value, (int, float)) and not eof
+                    and (end == len(buffer) or buffer[end] in "0123456789+-.eE") and more()):
+                continue
+            pos = end
+            return value
+
+    name = getattr(fin, "name", "JSON")
+    if skip() != "{":
+        raise ValueError(f"{name} 顶层不是 JSON 对象")
+    pos += 1
+    while True:
+        token = skip(" \t\r\n,")
+        if token == "}":
+            if raw:
+                pos = len(buffer)
+                while more():
+                    pos = len(buffer)
+                yield None, None, take(), ""
+            return
+        if token != '"':
+            raise ValueError(f"{name} 格式错误")
+        key = decode()
+        if skip() != ":":
+            raise ValueError(f"{name} 格式错误")
+        pos += 1
+        skip()
+        if raw:
+            before = take()
+            value = decode()
+            yield key, value, before, take()
+        else:
+            yield key, decode()
+
+
+def build_traces(records, trace_id: Optional[str] = None) -> Dict[str, List[Span]]:
+    """按 trace 还原调用树，返回 trace_id -> 根节点列表"""
+    spans: Dict[str, Span] = {}
+    for record in records:
+        if trace_id and record.get("trace_id") != trace_id:
+            continue
+        span = Span(record)
+        spans[span.node_id] = span
+    traces: Dict[str, List[Span]] = {}
+    for span in spans.values():
+        father = spans.get(span.father_id)
+        if father is not None:
+            father.children.append(span)
+        else:
+            traces.setdefault(span.trace_id, []).append(span)
+    for span in spans.values():
+        span.children.sort(key=lambda c: c.start or 0.0)
+    for roots in traces.values():
+        roots.sort(key=lambda c: c.start or 0.0)
+    return traces
+
+
+def walk(span: Span, stack=()):
+    stack = stack + (span.callee,)
+    yield span, stack
+    for child in span.children:
+        yield from walk(child, stack)
+
+
+def critical_path(span: Span) -> List[Span]:
+    """决定端到端耗时的调用链
+
+    从父节点的结束时间往回找：先取最晚结束的子调用，再取在它开始之前结束的子调用中最晚的一个，
+    依此类推；链上的每个子调用再递归展开。返回按时间顺序排列的链上节点（含中间层 agent）。
+    """
+    chain, cursor = [], span.end
+    children = [c for c in span.children if c.start is not None and c.end is not None]
+    while cursor is not None:
+        candidates = [c for c in children if c.end <= cursor + 1e-6]
+        if not candidates:
+            break
+        child = max(candidates, key=lambda c: c.end)
+        chain.append(child)
+        children.remove(child)
+        cursor = child.start
+    path = [span]
+    for child in reversed(chain):
+        path.extend(critical_path(child))
+    return path
+
+
+def summarize_path(path: List[Span]) -> List[tuple]:
+    """按 callee 汇总关键路径上的自身耗时，返回 (callee, 次数, 秒数)，耗时多的在前"""
+    totals: Dict[str, List[float]] = {}
+    for span in path:
+        stat = totals.setdefault(span.callee, [0, 0.0])
+        stat[0] += 1
+        stat[1] += span.self_time
+    return sorted(((k, int(v[0]), v[1]) for k, v in totals.items()), key=lambda r: r[2], reverse=True)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    low, high = int(k), min(int(k) + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def callee_stats(traces: Dict[str, List[Span]]) -> List[dict]:
+    durations: Dict[str, List[float]] = {}
+    self_times: Dict[str, float] = {}
+    types: Dict[str, str] = {}
+    for roots in traces.values():
+        for root in roots:
+            for span, _ in walk(root):
+                durations.setdefault(span.callee, []).append(span.duration)
+                self_times[span.callee] = self_times.get(span.callee, 0.0) + span.self_time
+                types[span.callee] = span.node_type
+    rows = []
+    for callee, values in durations.items():
+        rows.append({
+            "callee": callee,
+            "type": types[callee],
+            "count": len(values),
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "max": max(values),
+            "total": sum(values),
+            "self_total": self_times[callee],
+        })
+    return sorted(rows, key=lambda r: r["self_total"], reverse=True)
+
+
+def trace_summaries(traces: Dict[str, List[Span]]) -> List[dict]:
+    rows = []
+    for trace_id, roots in traces.items():
+        spans = [span for root in roots for span, _ in walk(root)]
+        root = max(roots, key=lambda r: r.duration)
+        rows.append({
+            "trace_id": trace_id,
+            "query": next((r.query for r in roots if r.query), ""),
+            "duration": root.duration,
+            "llm_calls": sum(1 for s in spans if s.node_type == "llm"),
+            "nodes": len(spans),
+            "critical_path": summarize_path(critical_path(root)),
+        })
+    return sorted(rows, key=lambda r: r["duration"], reverse=True)
+
+
+def write_collapsed(traces: Dict[str, List[Span]], path: str):
+    """collapsed stack 格式：每行 "a;b;c 自身耗时(ms)"，相同栈合并"""
+    stacks: Dict[str, float] = {}
+    for roots in traces.values():
+        for root in roots:
+            for span, stack in walk(root):
+                key = ";".join(stack)
+                stacks[key] = stacks.get(key, 0.0) + span.self_time * 1000
+    with open(path, "w", encoding="utf-8") as fout:
+        for key, ms in sorted(stacks.items()):
+            if round(ms) > 0:
+                fout.write(f"{key} {round(ms)}\n")
+
+
+def write_chrome_trace(traces: Dict[str, List[Span]], path: str):
+    """Chrome trace 事件格式；每个 trace 一个进程，并发的兄弟调用分到不同的线程行"""
+    events = []
+    for pid, (trace_id, roots) in enumerate(traces.items(), 1):
+        events.append({"ph": "M", "name": "process_name", "pid": pid, "args": {"name": trace_id}})
+        lanes: List[List[Span]] = []  # 每行当前打开的调用栈
+        spans = sorted((s for root in roots for s, _ in walk(root) if s.start is not None),
+                       key=lambda s: (s.start, -(s.end or s.start)))
+        for span in spans:
+            tid = None
+            for i, lane in enumerate(lanes):
+                while lane and (lane[-1].end or 0.0) <= span.start and lane[-1].node_id != span.father_id:
+                    lane.pop()
+                if not lane or lane[-1].node_id == span.father_id:
+                    tid = i
+                    break
+            if tid is None:
+                lanes.append([])
+                tid = len(lanes) - 1
+            lanes[tid].append(span)
+            events.append({
+                "name": span.callee,
+                "cat": span.node_type,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {"caller": span.caller, "node_id": span.node_id},
+            })
+    with open(path, "w", encoding="utf-8") as fout:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fout, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析 app_node 调用记录的耗时分布与关键路径")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="local_es_data 目录")
+    parser.add_argument("--trace-id", help="只分析指定的 trace")
+    parser.add_argument("--top", type=int, default=10, help="输出最慢的前 N 个请求")
+    parser.add_argument("--collapsed", help="导出 collapsed stack 文件")
+    parser.add_argument("--chrome", help="导出 Chrome trace JSON 文件")
+    args = parser.parse_args(argv)
+
+    traces = build_traces(iter_node_records(args.data_dir), args.trace_id)
+    if not traces:
+        print(f"未找到调用记录: {args.data_dir}")
+        return
+
+    print(f"{'callee':<28}{'type':<7}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}{'self':>10}")
+    for row in callee_stats(traces):
+        print(f"{row['callee']:<28}{row['type']:<7}{row['count']:>7}{row['p50']:>8.2f}s{row['p95']:>8.2f}s"
+              f"{row['max']:>8.2f}s{row['self_total']:>9.2f}s")
+
+    summaries = trace_summaries(traces)
+    llm_calls = [s["llm_calls"] for s in summaries]
+    print(f"\n共 {len(summaries)} 个请求，每个请求 LLM 调用次数 p50={percentile(llm_calls, 0.5):.0f} "
+          f"p95={percentile(llm_calls, 0.95):.0f}")
+    for s in summaries[: args.top]:
+        print(f"\n[{s['trace_id']}] {s['duration']:.2f}s, {s['llm_calls']} 次 LLM 调用, {s['nodes']} 个节点  {s['query'][:60]}")
+        print("  关键路径耗时: " + ", ".join(
+            f"{callee} {seconds:.2f}s×{count}" for callee, count, seconds in s["critical_path"] if seconds >= 0.01
+        ))
+
+    if args.collapsed:
+        write_collapsed(traces, args.collapsed)
+        print(f"\n✅ collapsed stack 已写入: {args.collapsed}")
+    if args.chrome:
+        write_chrome_trace(traces, args.chrome)
+        print(f"✅ Chrome trace 已写入: {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+视频关键帧抽取
+multimodal_agent 把整段视频（或按固定间隔抽出的大量帧）交给 VLM，又慢又费 token。level-2 中的视频多是手机录屏：
+大部分时间画面静止，只在点击、翻页、滚动时变化，同一个页面还会反复出现。这里在本地用 OpenCV 抽出少量有序的关键帧：
+    - 按 sample_fps 解码，相邻采样帧在缩略灰度图上的平均差异超过 scene_threshold 视为画面切换；
+      两次切换之间保持了至少 min_stable 个采样点的一段取最清晰（拉普拉斯方差最大）的一帧，
+      滚动、转场过程中的帧跳过（整段视频都没有稳定画面时才从这些帧里挑）
+    - 用 64 位差值哈希（dHash）去重，与已保留的任一帧汉明距离不超过 hash_distance 的帧丢弃（回到同一页面）
+    - 可选：裁掉四周纯色边框；只保留疑似包含文字的帧（形态学梯度 + 横向闭运算找文本行，不依赖 OCR 引擎）
+    - 超过 max_frames 时按时间均匀保留，首尾两帧始终保留
+uniform_frames 给出同样采样率下的均匀抽帧，用于对比。
+
+用法:
+    frames, info = extract_keyframes("买iphone_副本.mp4", max_frames=12)
+    for f in frames: f.timestamp, f.image  # image 为 BGR 的 numpy 数组
+"""
+from typing import List, Optional, Tuple
+
+SAMPLE_FPS = 2.0
+SCENE_THRESHOLD = 0.04  # 缩略图平均差异（0~1），录屏中翻页 / 点击通常在 0.05 以上
+HASH_DISTANCE = 6
+MIN_STABLE = 2  # 画面至少连续保持的采样点数，用于跳过滚动、转场中的帧
+MAX_FRAMES = 12
+THUMB_SIZE = (64, 64)
+TEXT_MIN_SCORE = 0.005  # 文本行面积占比
+
+
+class Keyframe:
+    __slots__ = ("index", "timestamp", "image", "sharpness", "text_score", "hash")
+
+    def __init__(self, index: int, timestamp: float, image=None, sharpness: float = 0.0, text_score: float = 0.0,
+                 hash: int = 0):
+        self.index = index  # 在视频中的帧序号
+        self.timestamp = timestamp
+        self.image = image
+        self.sharpness = sharpness
+        self.text_score = text_score
+        self.hash = hash
+
+
+def _cv2():
+    try:
+        import cv2
+    except ImportError:
+        return None
+    return cv2
+
+
+def _thumbnail(cv2, frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def dhash(cv2, frame) -> int:
+    """差值哈希：9x8 灰度缩略图中每行相邻像素的大小关系"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def sharpness(cv2, frame) -> float:
+    """拉普拉斯方差，只在同一段画面内比较，缩小到长边 640 计算即可"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    scale = 640 / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def text_score(cv2, frame) -> float:
+    """疑似文本行的面积占比：形态学梯度 -> Otsu 二值化 -> 横向闭运算连成行 -> 取扁长的连通区域"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    scale = 800 / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(closed, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    area = 0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if 6 <= h <= 60 and w >= 2 * h and cv2.countNonZero(binary[y:y + h, x:x + w]) > 0.2 * w * h:
+            area += w * h
+    return area / float(gray.shape[0] * gray.shape[1])
+
+
+def crop_borders(cv2, frame, tolerance: float = 8.0):
+    """裁掉四周颜色一致的边（黑边、纯色背景），保留至少一半的画面"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    rows = gray.std(axis=1) > tolerance
+    cols = gray.std(axis=0) > tolerance
+    if not rows.any() or not cols.any():
+        return frame
+    top, bottom = rows.argmax(), len(rows) - rows[::-1].argmax()
+    left, right = cols.argmax(), len(cols) - cols[::-1].argmax()
+    if (bottom - top) < gray.shape[0] / 2 or (right - left) < gray.shape[1] / 2:
+        return frame
+    return frame[top:bottom, left:right]
+
+
+def _open(cv2, path: str):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"无法打开视频: {path}")
+    return capture, capture.get(cv2.CAP_PROP_FPS) or 25.0
+
+
+def _sample(cv2, path: str, sample_fps: float):
+    """按 sample_fps 逐帧产出 (帧序号, 时间戳, 帧)；不需要的帧只 grab 不解码成图像"""
+    capture, fps = _open(cv2, path)
+    step = max(int(round(fps / sample_fps)), 1)
+    index = 0
+    try:
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def _read_frames(cv2, path: str, indices):
+    """顺序读一遍视频，按序产出指定序号的 (帧序号, 帧)（seek 在部分编码下不准）"""
+    wanted = set(indices)
+    if not wanted:
+        return
+    capture, _ = _open(cv2, path)
+    last = max(wanted)
+    index = 0
+    try:
+        while index <= last and capture.grab():
+            if index in wanted:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def _limit(frames: List[Keyframe], max_frames: int) -> List[Keyframe]:
+    if len(frames) <= max_frames:
+        return frames
+    if max_frames <= 1:
+        return frames[:1]
+    step = (len(frames) - 1) / (max_frames - 1)
+    return [frames[round(i * step)] for i in range(max_frames)]
+
+
+def extract_keyframes(
+    path: str,
+    sample_fps: float = SAMPLE_FPS,
+    scene_threshold: float = SCENE_THRESHOLD,
+    hash_distance: int = HASH_DISTANCE,
+    max_frames: int = MAX_FRAMES,
+    min_stable: int = MIN_STABLE,
+    crop: bool = True,
+    require_text: bool = False,
+) -> Tuple[List[Keyframe], dict]:
+    """返回按时间排序的关键帧和统计信息"""
+    cv2 = _cv2()
+    if cv2 is None:
+        raise ImportError("需要安装 opencv-python")
+
+    # 扫描时每段只记帧序号、时间戳、清晰度和哈希，不保留图像；长录屏里滚动造成的片段可能有几百个
+    segments: List[Keyframe] = []  # 每段稳定画面中最清晰的一帧
+    transient: List[Keyframe] = []  # 滚动、转场中只停留一个采样点的画面
+    best: Optional[Keyframe] = None
+    length = 0
+    previous = None
+    sampled = 0
+    duration = 0.0
+
+    def close_segment():
+        if best is not None:
+            (segments if length >= min_stable else transient).append(best)
+
+    for index, timestamp, frame in _sample(cv2, path, sample_fps):
+        sampled += 1
+        duration = timestamp
+        thumb = _thumbnail(cv2, frame)
+        current = thumb.astype("int16")
+        changed = previous is None or float(abs(current - previous).mean()) / 255 > scene_threshold
+        previous = current
+        if changed:
+            close_segment()
+            best, length = None, 0
+        length += 1
+        score = sharpness(cv2, frame)
+        if best is None or score > best.sharpness:
+            best = Keyframe(index, timestamp, sharpness=score, hash=dhash(cv2, thumb))
+    close_segment()
+    if not segments:
+        # 画面一直在动（实拍、动画），没有稳定的段落，只能从变化的帧里挑
+        segments = transient
+
+    kept: List[Keyframe] = []
+    duplicates = without_text = 0
+    for candidate in segments:
+        if any(hamming(candidate.hash, k.hash) <= hash_distance for k in kept):
+            duplicates += 1
+            continue
+        kept.append(candidate)
+    if require_text and kept:
+        # 再读一遍视频，候选帧打分后立即释放图像
+        candidates, kept = kept, []
+        scores = {index: text_score(cv2, image)
+                  for index, image in _read_frames(cv2, path, [c.index for c in candidates])}
+        for candidate in candidates:
+            candidate.text_score = scores.get(candidate.index, 0.0)
+            if candidate.text_score < TEXT_MIN_SCORE:
+                without_text += 1
+            else:
+                kept.append(candidate)
+        if not kept:
+            kept = [max(candidates, key=lambda k: k.sharpness)]  # 全部被过滤时至少保留一帧
+    frames = _limit(kept, max_frames)
+    images = dict(_read_frames(cv2, path, [f.index for f in frames]))
+    frames = [f for f in frames if f.index in images]
+    for frame in frames:
+        frame.image = crop_borders(cv2, images[frame.index]) if crop else images[frame.index]
+
+    info = {
+        "duration": round(duration, 2),
+        "sampled": sampled,
+        "segments": len(segments),
+        "transient": len(transient),
+        "duplicates": duplicates,
+        "without_text": without_text,
+        "frames": len(frames),
+    }
+    return frames, info
+
+
+def uniform_frames(path: str, sample_fps: float = 1.0) -> List[Keyframe]:
+    """固定间隔抽帧（对比用）"""
+    cv2 = _cv2()
+    if cv2 is None:
+        raise ImportError("需要安装 opencv-python")
+    return [Keyframe(index, timestamp, frame) for index, timestamp, frame in _sample(cv2, path, sample_fps)]
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:04.1f}"